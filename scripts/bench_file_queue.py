@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""
+FileQueue 性能基准
+构建 N 个文件项（每项若干备份并选中第一个），再更新/删除一部分并取统计，
+输出构建耗时、操作耗时和每项内存占用（tracemalloc）
+
+用法:
+    python scripts/bench_file_queue.py --items 20000
+    # 与某个（或多个）git 版本的 file_queue.py 对比（如优化前的基线提交）
+    python scripts/bench_file_queue.py --items 20000 --baseline <rev> [--baseline <rev2>]
+    # 复现按 id 索引（O(1) 查找和状态计数，提交 daa373c）说明中的数据（不带备份）：
+    # 2 万项时对比基线 76cecd1（平方复杂度，约需 40 秒）与 daa373c，再跑 100 万项
+    #   76cecd1  2 万项: 构建约 33s、操作约 7s
+    #   daa373c  2 万项: 构建约 0.16s、操作约 0.01s；100 万项: 构建约 10s、操作约 0.6s
+    python scripts/bench_file_queue.py --preset index
+    # 等价于
+    python scripts/bench_file_queue.py --items 20000 --backups 0 --baseline 76cecd1 --baseline daa373c
+    python scripts/bench_file_queue.py --items 1000000 --backups 0 --baseline daa373c
+    # 之后的版本按路径分段驻留保存备份路径，带备份时每项内存约减半，但构建时间高于 daa373c
+"""
+import argparse
+import gc
+import importlib.util
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+# 预设：[(项数, 每项备份数, [对比的 git 版本])]，每组最后都测当前工作区版本
+PRESETS = {
+    "index": [(20000, 0, ["76cecd1", "daa373c"]), (1000000, 0, ["daa373c"])],
+}
+sys.path.insert(0, str(ROOT / "src"))
+
+from loguru import logger  # noqa: E402
+
+
+def load_revision(rev: str):
+    """从 git 版本中载入 src/baku/core/file_queue.py 作为独立模块"""
+    source = subprocess.run(
+        ["git", "show", f"{rev}:src/baku/core/file_queue.py"],
+        cwd=ROOT, check=True, capture_output=True,
+    ).stdout
+    path = Path(tempfile.mkdtemp()) / "file_queue_baseline.py"
+    path.write_bytes(source)
+    spec = importlib.util.spec_from_file_location("file_queue_baseline", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def build_queue(mod, items: int, backups: int):
+    queue = mod.FileQueue()
+    for i in range(items):
+        directory = f"/home/user/project/dir{i // 1000}"
+        item = mod.FileQueueItem(id=f"f{i}", name=f"f{i}.txt", path=Path(f"{directory}/f{i}.txt"),
+                                 size=i, status=mod.FileStatus.PENDING)
+        queue.add_item(item)
+        for k in range(backups):
+            item.add_backup(mod.BackupInfo(
+                path=Path(f"{directory}/f{i}.txt.bak{k}"), name=f"f{i}.txt.bak{k}", size=i,
+                size_str="", modified=datetime.fromtimestamp(1.7e9 + i),
+                similarity=0.9, file_type=".bak",
+            ))
+        if backups:
+            item.set_selected_backup(Path(f"{directory}/f{i}.txt.bak0"))
+    return queue
+
+
+def run_ops(mod, queue, items: int):
+    """按 id 更新每第 7 项的状态、删除每第 11 项，最后取统计"""
+    for i in range(0, items, 7):
+        queue.get_item(f"f{i}").update_status(mod.FileStatus.COMPLETED)
+    for i in range(0, items, 11):
+        queue.remove_item(f"f{i}")
+    return queue.get_stats()
+
+
+def bench(label: str, mod, items: int, backups: int):
+    gc.collect()
+    start = time.perf_counter()
+    queue = build_queue(mod, items, backups)
+    built = time.perf_counter()
+    stats = run_ops(mod, queue, items)
+    done = time.perf_counter()
+    del queue
+    gc.collect()
+
+    tracemalloc.start()
+    queue = build_queue(mod, items, backups)
+    gc.collect()
+    current, _peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del queue
+
+    print(f"{label:>10}: 构建 {built - start:8.3f}s  操作 {done - built:8.3f}s  "
+          f"内存 {current / items:7.0f} B/项  统计 {stats}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="FileQueue 性能基准")
+    parser.add_argument("--items", type=int, default=20000, help="文件项数量")
+    parser.add_argument("--backups", type=int, default=2, help="每项的备份数量")
+    parser.add_argument("--baseline", action="append", default=[],
+                        help="对比的 git 版本（载入该版本的 file_queue.py），可重复指定")
+    parser.add_argument("--preset", choices=sorted(PRESETS),
+                        help="按预设的项数、备份数和基线依次运行（忽略 --items / --backups / --baseline）")
+    args = parser.parse_args()
+    logger.remove()
+
+    from baku.core import file_queue
+    runs = PRESETS[args.preset] if args.preset else [(args.items, args.backups, args.baseline)]
+    for items, backups, baselines in runs:
+        print(f"Python {sys.version.split()[0]}，{items} 项，每项 {backups} 个备份")
+        for baseline in baselines:
+            bench(baseline[:10], load_revision(baseline), items, backups)
+        bench("当前", file_queue, items, backups)
+
+
+if __name__ == "__main__":
+    main()
@@ -26,6 +26,7 @@ from baku.core.backup_finder import BackupFinder
 from baku.core.backup_restorer import BackupRestorer
 from baku.core.file_queue import FileQueue, FileQueueItem, FileStatus
 from baku.core.multi_file_manager import MultiFileManager
+from baku.cli.commands import run_command
 from loguru import logger   
 
 class bakuCLI:
@@ -214,7 +215,7 @@ class bakuCLI:
         # 显示可恢复文件
         self.console.print(f"\n[bold]找到 {len(restorable_items)} 个可恢复文件:[/bold]")
         for i, item in enumerate(restorable_items, 1):
-            self.console.print(f"{i}. {item.name} (1 个备份)")
+            self.console.print(f"{i}. {item.name} ({len(item.backup_files)} 个备份)")
         
         # 选择恢复方式
         self.console.print("\n[cyan]恢复选项:[/cyan]")
@@ -245,10 +246,12 @@ class bakuCLI:
         table.add_column("回溯层级", style="dim", justify="right")
         table.add_column("大小", style="white", justify="right")
         table.add_column("修改时间", style="white")
-        for item in restorable_items:
-            backup_path = item.selected_backup
-            if not backup_path:
-                continue
+        items = [item for item in restorable_items if item.selected_backup]
+        plan = self.file_manager.backup_restorer.preview_many(
+            (item.path, item.selected_backup) for item in items
+        )
+        for item, entry in zip(items, plan.entries):
+            backup_path = entry.backup
             # 判断类型和回溯层级
             try:
                 orig_dir = item.path.parent.resolve()
@@ -262,12 +265,11 @@ class bakuCLI:
             except Exception:
                 bak_type = "?"
                 level = "?"
-            try:
-                size = backup_path.stat().st_size
-                mtime = backup_path.stat().st_mtime
+            if entry.backup_exists:
+                size = entry.backup_size
                 import datetime
-                mtime_str = datetime.datetime.fromtimestamp(mtime).strftime("%Y-%m-%d %H:%M:%S")
-            except Exception:
+                mtime_str = datetime.datetime.fromtimestamp(entry.backup_mtime).strftime("%Y-%m-%d %H:%M:%S")
+            else:
                 size = "?"
                 mtime_str = "?"
             table.add_row(
@@ -280,6 +282,19 @@ class bakuCLI:
                 mtime_str
             )
         self.console.print(table)
+        conflict_names = {
+            "duplicate_target": "多个文件恢复到同一目标",
+            "new_file_collision": ".new 路径与其他文件冲突",
+            "backup_is_target": "备份同时是另一项的目标",
+            "shared_backup": "多个文件共用同一备份",
+        }
+        for conflict in plan.conflicts:
+            names = ", ".join(items[index].name for index in conflict.indexes)
+            self.console.print(
+                f"[red]⚠ {conflict_names.get(conflict.kind, conflict.kind)}: {conflict.path}（{names}）[/red]"
+            )
+        for entry in plan.missing_backups:
+            self.console.print(f"[red]⚠ 备份文件不存在: {entry.backup}[/red]")
         return True
 
     def batch_restore_files(self):
@@ -303,6 +318,12 @@ class bakuCLI:
             success = self.file_manager.batch_restore_files()
         if success:
             self.console.print("[green]✓ 批量恢复完成[/green]")
+            stats = self.file_manager.last_batch_stats
+            if stats:
+                self.console.print(
+                    f"[dim]成功 {stats['success']}/{stats['processed']}，耗时 {stats['elapsed']:.2f}s，"
+                    f"{stats['files_per_sec']:.1f} 文件/s，{stats['mb_per_sec']:.1f} MB/s[/dim]"
+                )
         else:
             self.console.print(f"[red]✗ 批量恢复失败，详细日志见: {config_info['log_file']}[/red]")
     
@@ -319,7 +340,29 @@ class bakuCLI:
             # 显示备份信息
             self.console.print(f"\n[bold]{item.name} 的备份信息:[/bold]")
             if item.backup_files:
-                backup = item.backup_files[0]  # 使用第一个备份
+                backup = item.backup_files[0]  # 默认使用评分最高的备份
+                if len(item.backup_files) > 1:
+                    table = Table(show_header=True, header_style="bold magenta")
+                    table.add_column("#", style="dim", width=3)
+                    table.add_column("备份文件", style="green")
+                    table.add_column("相似度", justify="right")
+                    table.add_column("大小", justify="right")
+                    table.add_column("修改时间")
+                    for i, candidate in enumerate(item.backup_files, 1):
+                        table.add_row(
+                            str(i),
+                            str(candidate.path),
+                            f"{candidate.similarity * 100:.1f}%",
+                            candidate.size_str,
+                            candidate.modified.strftime("%Y-%m-%d %H:%M:%S")
+                        )
+                    self.console.print(table)
+                    backup_choice = IntPrompt.ask(
+                        f"[cyan]选择要使用的备份[/cyan] (1-{len(item.backup_files)})",
+                        default=1
+                    ) - 1
+                    if 0 <= backup_choice < len(item.backup_files):
+                        backup = item.backup_files[backup_choice]
                 
                 self.console.print(f"备份文件: {backup.path}")
                 self.console.print(f"相似度: {backup.similarity * 100:.1f}%")
@@ -494,6 +537,11 @@ class bakuCLI:
 
 def main():
     """主函数"""
+    # 维护子命令（如 index build）
+    exit_code = run_command(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
+    
     parser = argparse.ArgumentParser(description='baku - 智能备份文件恢复工具')
     parser.add_argument('files', nargs='*', help='要处理的文件路径')
     parser.add_argument('-i', '--interactive', action='store_true', 
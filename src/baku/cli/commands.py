@@ -0,0 +1,162 @@
+"""
+baku 维护子命令
+例如: baku index build <root>、baku recover、baku dedup gc
+"""
+import argparse
+import time
+from pathlib import Path
+from typing import List, Optional
+
+from rich.console import Console
+
+from baku.core.backup_index import BackupIndex, default_index_path
+from baku.core.index_watcher import IndexWatcher
+from baku.core.restore_journal import JournalRecovery, default_journal_dir, list_journals, load_journal
+from baku.core.safety_store import SafetyStore
+
+
+COMMANDS = ("index", "recover", "dedup")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    """构建子命令解析器"""
+    parser = argparse.ArgumentParser(prog="baku", description="baku - 维护命令")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    index_parser = subparsers.add_parser("index", help="管理备份文件索引")
+    index_parser.add_argument("--db", type=Path, default=None,
+                              help="索引数据库路径（默认使用配置中的 index_path）")
+    index_sub = index_parser.add_subparsers(dest="action", required=True)
+    build_parser_ = index_sub.add_parser("build", help="遍历目录树并建立备份文件索引")
+    build_parser_.add_argument("roots", nargs="+", type=Path, help="要建立索引的根目录")
+    index_sub.add_parser("stats", help="显示索引统计信息")
+    watch_parser = index_sub.add_parser("watch", help="通过 inotify 持续更新备份文件索引")
+    watch_parser.add_argument("roots", nargs="+", type=Path, help="要监听的根目录")
+
+    recover_parser = subparsers.add_parser("recover", help="处理中断的批量恢复（预写日志）")
+    recover_parser.add_argument("--dir", type=Path, default=None,
+                                help="日志目录（默认使用配置中的 journal_dir）")
+    recover_parser.add_argument("--rollback", action="store_true",
+                                help="撤销中断的批次（默认继续完成）")
+    recover_parser.add_argument("--list", action="store_true", help="只列出残留日志，不做处理")
+
+    dedup_parser = subparsers.add_parser("dedup", help="管理 .new 安全副本去重存储")
+    dedup_parser.add_argument("--dir", type=Path, default=None,
+                              help="存储目录（默认使用配置中的 safety_store）")
+    dedup_sub = dedup_parser.add_subparsers(dest="action", required=True)
+    gc_parser = dedup_sub.add_parser("gc", help="删除不再被任何 .new 引用的对象")
+    gc_parser.add_argument("--dry-run", action="store_true", help="只统计，不删除")
+    dedup_sub.add_parser("stats", help="显示存储统计信息")
+    return parser
+
+
+def run_index(args: argparse.Namespace, console: Console) -> int:
+    """执行 index 子命令"""
+    db_path = args.db or default_index_path()
+    index = BackupIndex(db_path)
+    try:
+        if args.action == "build":
+            for root in args.roots:
+                if not root.is_dir():
+                    console.print(f"[red]目录不存在: {root}[/red]")
+                    return 1
+                with console.status(f"正在建立索引: {root}"):
+                    stats = index.build(root)
+                console.print(
+                    f"[green]✓ {root}: 目录 {stats['dirs']} 个，备份文件 {stats['backups']} 个[/green]"
+                )
+            console.print(f"[dim]索引文件: {db_path}[/dim]")
+        elif args.action == "watch":
+            if not IndexWatcher.is_supported():
+                console.print("[red]当前平台不支持 inotify[/red]")
+                return 1
+            watcher = IndexWatcher(index, args.roots)
+            watcher.start()
+            console.print(f"[green]正在监听 {', '.join(watcher.roots)}，按 Ctrl+C 停止[/green]")
+            try:
+                while watcher.is_running():
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                pass
+            finally:
+                watcher.stop()
+        elif args.action == "stats":
+            stats = index.get_stats()
+            console.print(f"索引文件: {db_path}")
+            console.print(f"根目录: {', '.join(index.get_roots()) or '无'}")
+            console.print(f"目录: {stats['dirs']}  备份文件: {stats['backups']}")
+        return 0
+    finally:
+        index.close()
+
+
+def run_recover(args: argparse.Namespace, console: Console) -> int:
+    """执行 recover 子命令"""
+    journals = list_journals(args.dir)
+    if not journals:
+        console.print(f"[green]没有中断的批量恢复[/green] [dim]({args.dir or default_journal_dir()})[/dim]")
+        return 0
+    if args.list:
+        for path in journals:
+            plans, outcomes = load_journal(path)
+            console.print(f"{path.name}: 计划 {len(plans)} 个，已记录结果 {len(outcomes)} 个")
+        return 0
+    recovery = JournalRecovery()
+    exit_code = 0
+    for path in journals:
+        with console.status(f"正在{'撤销' if args.rollback else '继续'}: {path.name}"):
+            stats = recovery.recover(path, rollback=args.rollback)
+        done = f"已撤销 {stats['reverted']}" if args.rollback else f"已完成 {stats['completed']}"
+        color = "red" if stats['errors'] else "green"
+        console.print(
+            f"[{color}]{path.name}: 计划 {stats['planned']} 个，{done} 个，"
+            f"跳过 {stats['skipped']} 个，失败 {stats['errors']} 个[/{color}]"
+        )
+        if stats['errors']:
+            console.print(f"[dim]日志已保留: {path}[/dim]")
+            exit_code = 1
+    return exit_code
+
+
+def run_dedup(args: argparse.Namespace, console: Console) -> int:
+    """执行 dedup 子命令"""
+    if args.dir:
+        store = SafetyStore(args.dir)
+    else:
+        store = SafetyStore.from_config()
+        if store is None:
+            console.print("[red]未配置 safety_store，也未通过 --dir 指定存储目录[/red]")
+            return 1
+    if args.action == "gc":
+        with console.status(f"正在清理: {store.root}"):
+            stats = store.gc(dry_run=args.dry_run)
+        verb = "可删除" if args.dry_run else "已删除"
+        console.print(
+            f"[green]对象 {stats['objects']} 个，{verb} {stats['removed']} 个"
+            f"（{stats['freed_bytes'] / (1024 * 1024):.1f} MB），保留 {stats['kept']} 个[/green]"
+        )
+    elif args.action == "stats":
+        stats = store.get_stats()
+        console.print(f"存储目录: {store.root}")
+        console.print(
+            f"对象: {stats['objects']}  占用: {stats['bytes'] / (1024 * 1024):.1f} MB  "
+            f"硬链接引用: {stats['links']}"
+        )
+    return 0
+
+
+def run_command(argv: List[str]) -> Optional[int]:
+    """
+    如果 argv 是维护子命令则执行并返回退出码，否则返回 None
+    """
+    if not argv or argv[0] not in COMMANDS:
+        return None
+    args = build_parser().parse_args(argv)
+    console = Console()
+    if args.command == "index":
+        return run_index(args, console)
+    if args.command == "recover":
+        return run_recover(args, console)
+    if args.command == "dedup":
+        return run_dedup(args, console)
+    return None
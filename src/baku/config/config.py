@@ -79,5 +79,28 @@ def load_baku_config():
     return {
         'bak_extensions': ['.bak', '.backup', '.old'],
         'max_recurse_level': 5,
+        'dir_cache_size': 1024,
+        'negative_cache_size': 4096,
+        'index_path': None,
+        'watch_roots': [],
+        'max_candidates': 10,
+        'ranking_weights': {'name': 0.6, 'depth': 0.25, 'time': 0.15},
+        'content_similarity': False,
+        'content_max_bytes': 64 * 1024 * 1024,
+        'content_weight': 0.5,
+        'max_workers': 8,
+        'restore_concurrency': {'default': 4},
+        'restore_mode': 'full',
+        'restore_journal': False,
+        'journal_dir': None,
+        'journal_group_size': 64,
+        'journal_group_window': 0.5,
+        'safety_store': None,
+        'queue_journal': False,
+        'queue_journal_compact_records': 10000,
+        'queue_db': None,
+        'backup_locations': [],
+        'file_patterns': ['*'],
+        'store_refresh_interval': 300,
         'new_file_suffix': '.new',
     }
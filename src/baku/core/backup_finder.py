@@ -4,9 +4,14 @@
 """
 import os
 from pathlib import Path
-from typing import Optional, List
+from typing import Any, Optional, List, Dict, Iterable, Tuple
 from loguru import logger
 from baku.config.config import load_baku_config
+from baku.core.dir_cache import DirListing, DirListingCache, NegativeCache
+from baku.core.backup_index import BackupIndex, default_index_path
+from baku.core.backup_ranker import BackupCandidate, BackupRanker, NgramIndex
+from baku.core.content_similarity import DEFAULT_MAX_BYTES, ContentSimilarity
+from baku.core.backup_store import BackupStore, build_stores
 
 
 class BackupFinder:
@@ -16,6 +21,113 @@ class BackupFinder:
         config = load_baku_config()
         self.search_extensions = config.get('bak_extensions', ['.bak', '.backup', '.old'])
         self.max_recurse_level = config.get('max_recurse_level', 5)
+        # 候选备份排序器
+        self.ranker = BackupRanker(
+            self.search_extensions,
+            weights=config.get('ranking_weights'),
+            max_candidates=config.get('max_candidates', 10)
+        )
+        # 可选的内容相似度（MinHash），默认关闭
+        self.content_similarity = None
+        self.content_weight = min(1.0, max(0.0, float(config.get('content_weight', 0.5))))
+        if config.get('content_similarity', False):
+            self.content_similarity = ContentSimilarity(
+                max_bytes=config.get('content_max_bytes', DEFAULT_MAX_BYTES)
+            )
+        # 持久化备份索引（通过 baku index build 生成），不存在时直接查文件系统
+        self.index = BackupIndex.open_existing(extensions=self.search_extensions)
+        # 目录列表缓存，同一批次内的多次查找共享
+        self.dir_cache = DirListingCache(
+            self.search_extensions,
+            max_entries=config.get('dir_cache_size', 1024),
+            index=self.index
+        )
+        # 未找到备份的结果缓存，重复查找只需校验回溯目录的 mtime
+        self.negative_cache = NegativeCache(config.get('negative_cache_size', 4096))
+        self.watcher = None
+        # 集中备份库（镜像源目录树的独立备份目录）
+        self.store_refresh_interval = config.get('store_refresh_interval', 300)
+        self._file_patterns = list(config.get('file_patterns') or ['*'])
+        self._backup_locations = list(config.get('backup_locations') or [])
+        self.stores: List[BackupStore] = build_stores(
+            self._backup_locations, self.search_extensions, self._file_patterns
+        )
+    
+    @property
+    def backup_locations(self) -> List[Any]:
+        """集中备份库配置：字符串为绝对路径镜像，字典为 {"source": ..., "store": ...}"""
+        return self._backup_locations
+    
+    @backup_locations.setter
+    def backup_locations(self, locations: List[Any]):
+        self._backup_locations = list(locations or [])
+        self.stores = build_stores(self._backup_locations, self.search_extensions, self._file_patterns)
+    
+    @property
+    def file_patterns(self) -> List[str]:
+        """备份库中视为备份版本的文件名通配符"""
+        return self._file_patterns
+    
+    @file_patterns.setter
+    def file_patterns(self, patterns: List[str]):
+        self._file_patterns = list(patterns or ['*'])
+        self.stores = build_stores(self._backup_locations, self.search_extensions, self._file_patterns)
+    
+    @property
+    def max_depth(self) -> int:
+        """回溯查找的最大层级（max_recurse_level 的别名）"""
+        return self.max_recurse_level
+    
+    @max_depth.setter
+    def max_depth(self, depth: int):
+        self.max_recurse_level = max(1, int(depth))
+        self.negative_cache.invalidate()
+    
+    def find_backups(self, target_file) -> List[Dict[str, Any]]:
+        """
+        查找目标文件的所有备份版本（本地备份 + 集中备份库）
+        每项包含 path、timestamp、size、source（'local' 或 'store'）
+        """
+        return self.find_backups_many([Path(target_file)])[Path(target_file)]
+    
+    def find_backups_many(self, target_files: Iterable[Path]) -> Dict[Path, List[Dict[str, Any]]]:
+        """批量查找所有备份版本，本地候选按目录共享列表，备份库按相对路径直接查映射"""
+        target_files = [Path(target_file) for target_file in target_files]
+        local = self.find_candidates_many(target_files)
+        results: Dict[Path, List[Dict[str, Any]]] = {}
+        for target_file in target_files:
+            versions = [
+                version.to_dict()
+                for store in self.stores
+                for version in store.lookup(target_file, self.store_refresh_interval)
+            ]
+            versions.extend(self._local_versions(local.get(target_file, [])))
+            versions.sort(key=lambda version: version['timestamp'], reverse=True)
+            results[target_file] = versions
+        return results
+    
+    @staticmethod
+    def _local_versions(candidates: List[BackupCandidate]) -> List[Dict[str, Any]]:
+        """
+        本地候选转换为版本列表
+        名称完全匹配的候选都视为该文件的版本；没有时只取评分最高的候选，避免"取最新"误选无关文件
+        """
+        same_name = [c for c in candidates if c.name_score >= 1.0]
+        return [
+            {
+                'path': str(candidate.path),
+                'timestamp': candidate.mtime or 0.0,
+                'size': candidate.size or 0,
+                'source': 'local',
+                'score': candidate.score,
+            }
+            for candidate in (same_name or candidates[:1])
+        ]
+    
+    def refresh_stores(self):
+        """使所有备份库映射失效，下次查找时重新遍历"""
+        for store in self.stores:
+            store.invalidate()
     
     def find_nearest_backup(self, target_file: Path) -> Optional[Path]:
         """
@@ -24,29 +136,187 @@ class BackupFinder:
         """
         target_name = target_file.name
         current_dir = target_file.parent
+        if self.negative_cache.check(current_dir):
+            logger.warning(f"未找到备份文件（目录未变化，使用缓存结果）: {target_file}")
+            return None
         tried_paths = []
         # Step 1: 同目录同名
+        listing = self.dir_cache.get(current_dir)
+        for ext in self.search_extensions:
+            tried_paths.append(str(current_dir / f"{target_name}{ext}"))
+        path = self._match_same_name(current_dir, target_name, listing)
+        if path:
+            logger.info(f"同目录同名备份命中: {path}")
+            logger.debug(f"查找路径: {tried_paths}")
+            return path
+        # Step 2: 回溯向上，在所有候选中选评分最高的bak
+        path = self._find_upward(target_file, tried_paths)
+        if path:
+            return path
+        logger.warning(f"未找到备份文件，已查找路径: {tried_paths}")
+        return None
+    
+    def _match_same_name(self, directory: Path, target_name: str,
+                         listing: Optional[DirListing]) -> Optional[Path]:
+        """从目录列表中解析同名备份"""
+        if listing is None or not listing.names:
+            return None
         for ext in self.search_extensions:
-            path = current_dir / f"{target_name}{ext}"
-            tried_paths.append(str(path))
-            if path.exists():
-                logger.info(f"同目录同名备份命中: {path}")
-                logger.debug(f"查找路径: {tried_paths}")
-                return path
-        # Step 2: 回溯向上找任意bak
-        parent = current_dir
-        for level in range(self.max_recurse_level):
-            for file in parent.iterdir():
-                if file.is_file() and file.suffix in self.search_extensions:
-                    tried_paths.append(str(file))
-                    logger.info(f"回溯模式命中: {file} (level={level+1})")
-                    logger.debug(f"查找路径: {tried_paths}")
-                    return file
+            name = f"{target_name}{ext}"
+            if name in listing:
+                return directory / name
+        return None
+    
+    def find_candidates(self, target_file: Path) -> List[BackupCandidate]:
+        """
+        收集 max_recurse_level 层以内的所有候选备份，按评分从高到低排序
+        评分综合名称相似度、回溯层级和修改时间接近程度
+        """
+        groups = self._collect_groups_cached(target_file.parent)
+        if not groups:
+            return []
+        candidates = self.ranker.rank(target_file, groups, self._target_mtime(target_file))
+        return self._apply_content_scores(target_file, candidates)
+    
+    def find_many(self, target_files: Iterable[Path]) -> Dict[Path, Optional[Path]]:
+        """批量查找备份文件，返回每个文件评分最高的备份（未找到为 None）"""
+        found = self.find_candidates_many(target_files)
+        return {
+            target_file: candidates[0].path if candidates else None
+            for target_file, candidates in found.items()
+        }
+    
+    def find_candidates_many(self, target_files: Iterable[Path]) -> Dict[Path, List[BackupCandidate]]:
+        """批量收集候选备份，同一目录下的文件共享目录列表和 n-gram 索引"""
+        groups: Dict[Path, List[Path]] = {}
+        for target_file in target_files:
+            groups.setdefault(target_file.parent, []).append(target_file)
+        results: Dict[Path, List[BackupCandidate]] = {}
+        for directory, files in groups.items():
+            dir_groups = self._collect_groups_cached(directory)
+            if not dir_groups:
+                for target_file in files:
+                    results[target_file] = []
+                continue
+            for target_file in files:
+                candidates = self.ranker.rank(
+                    target_file, dir_groups, self._target_mtime(target_file)
+                )
+                results[target_file] = self._apply_content_scores(target_file, candidates)
+        return results
+    
+    def _apply_content_scores(self, target_file: Path,
+                              candidates: List[BackupCandidate]) -> List[BackupCandidate]:
+        """
+        启用内容相似度时，为候选计算 MinHash 相似度，并按 content_weight 与原有评分混合后重新排序
+        没有内容相似度的候选（不可读或文件过小）内容部分按 0 计
+        """
+        if self.content_similarity is None or not candidates:
+            return candidates
+        scores = self.content_similarity.similarities(
+            target_file, [candidate.path for candidate in candidates]
+        )
+        if all(score is None for score in scores):
+            return candidates
+        weight = self.content_weight
+        for candidate, score in zip(candidates, scores):
+            candidate.content_score = score
+            candidate.score = (1 - weight) * candidate.score + weight * (score or 0.0)
+        # 稳定排序：混合评分相同的候选保持原有顺序
+        candidates.sort(key=lambda c: c.score, reverse=True)
+        return candidates
+    
+    def _find_upward(self, target_file: Path, tried_paths: List[str]) -> Optional[Path]:
+        """从目标所在目录开始回溯向上，返回评分最高的bak文件"""
+        candidates = self.find_candidates(target_file)
+        if not candidates:
+            return None
+        best = candidates[0]
+        tried_paths.append(str(best.path))
+        logger.info(f"回溯模式命中: {best.path} (level={best.depth + 1}, score={best.score:.2f})")
+        logger.debug(f"查找路径: {tried_paths}")
+        return best.path
+    
+    def _collect_groups_cached(self, start_dir: Path) -> List[Tuple[Path, int, Tuple[str, ...], NgramIndex]]:
+        """带未找到缓存的 _collect_groups：缓存仍有效时直接返回空列表"""
+        if self.negative_cache.check(start_dir):
+            return []
+        searched: List[Tuple[str, Optional[int]]] = []
+        groups = self._collect_groups(start_dir, searched)
+        if not groups:
+            self.negative_cache.add(start_dir, searched)
+        return groups
+    
+    def _collect_groups(self, start_dir: Path, searched: Optional[List[Tuple[str, Optional[int]]]] = None
+                        ) -> List[Tuple[Path, int, Tuple[str, ...], NgramIndex]]:
+        """
+        收集 start_dir 及其上级目录（max_recurse_level 层以内）中的备份文件
+        searched 不为 None 时追加每个查找过的 (目录, mtime_ns)
+        """
+        groups = []
+        parent = start_dir
+        for depth in range(self.max_recurse_level):
+            listing = self.dir_cache.get(parent)
+            if searched is not None:
+                searched.append((str(parent), listing.mtime_ns if listing is not None else None))
+            if listing is not None and listing.names:
+                if listing.ngram_index is None:
+                    listing.ngram_index = self.ranker.build_index(listing.names)
+                groups.append((parent, depth, listing.names, listing.ngram_index))
             if parent == parent.parent:
                 break
             parent = parent.parent
-        logger.warning(f"未找到备份文件，已查找路径: {tried_paths}")
-        return None
+        return groups
+    
+    @staticmethod
+    def _target_mtime(target_file: Path) -> Optional[float]:
+        """目标文件的修改时间，用于时间接近度评分"""
+        try:
+            return os.stat(target_file).st_mtime
+        except OSError:
+            return None
+    
+    def attach_watcher(self, roots: Iterable[Path]):
+        """
+        为 roots 启动 inotify 实时监听并由其维护索引
+        监听线程完成初始索引后，这些目录下的查找直接由内存缓存和索引回答，不再访问磁盘；
+        监听线程退出（出错）时自动恢复按目录 mtime 校验
+        """
+        from baku.core.index_watcher import IndexWatcher
+        self.detach_watcher()
+        if self.index is None:
+            self.index = BackupIndex(default_index_path(), self.search_extensions)
+            self.dir_cache.index = self.index
+        watcher = IndexWatcher(self.index, roots)
+        watcher.add_listener(self.dir_cache.invalidate_many)
+        watcher.add_listener(self.negative_cache.invalidate_many)
+        watcher.add_state_listener(lambda live: self._on_watcher_state(watcher, live))
+        self.watcher = watcher
+        try:
+            watcher.start()
+        except OSError:
+            self.watcher = None
+            raise
+        return watcher
+    
+    def _on_watcher_state(self, watcher, live: bool):
+        """监听线程就绪时信任索引，退出时恢复按目录 mtime 校验"""
+        if watcher is not self.watcher:
+            return
+        self.dir_cache.live_roots = watcher.roots if live else ()
+        self.dir_cache.invalidate()
+        self.negative_cache.invalidate()
+    
+    def detach_watcher(self):
+        """停止实时监听，恢复按目录 mtime 校验索引"""
+        if self.watcher is None:
+            return
+        watcher = self.watcher
+        self.watcher = None
+        self.dir_cache.live_roots = ()
+        watcher.stop()
+        self.dir_cache.invalidate()
+        self.negative_cache.invalidate()
     
     def get_search_info(self, target_file: Path) -> dict:
         """获取搜索信息，用于前端显示"""
@@ -56,23 +326,26 @@ class BackupFinder:
         search_paths = []
         
         # 同级目录
+        listing = self.dir_cache.get(current_dir)
         for ext in self.search_extensions:
+            name = f"{target_name}{ext}"
             search_paths.append({
-                "path": str(current_dir / f"{target_name}{ext}"),
+                "path": str(current_dir / name),
                 "level": "同级目录",
-                "exists": (current_dir / f"{target_name}{ext}").exists()
+                "exists": listing is not None and name in listing
             })
         
         # 上级目录
         parent = current_dir.parent
         level = 1
         while parent != parent.parent and level <= 5:  # 最多查找5级
+            listing = self.dir_cache.get(parent)
             for ext in self.search_extensions:
-                backup_path = parent / f"{target_name}{ext}"
+                name = f"{target_name}{ext}"
                 search_paths.append({
-                    "path": str(backup_path),
+                    "path": str(parent / name),
                     "level": f"上级目录 {level}",
-                    "exists": backup_path.exists()
+                    "exists": listing is not None and name in listing
                 })
             parent = parent.parent
             level += 1
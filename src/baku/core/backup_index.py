@@ -0,0 +1,204 @@
+"""
+备份文件索引模块
+将目录树中的备份文件记录到 SQLite 索引，供 BackupFinder 优先查询
+"""
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from baku.config.config import load_baku_config
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS dirs (
+    path TEXT PRIMARY KEY,
+    root TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL
+);
+CREATE TABLE IF NOT EXISTS backups (
+    path TEXT PRIMARY KEY,
+    parent TEXT NOT NULL,
+    name TEXT NOT NULL,
+    stem TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime REAL NOT NULL,
+    depth INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_backups_parent ON backups(parent);
+CREATE INDEX IF NOT EXISTS idx_backups_stem ON backups(stem);
+CREATE INDEX IF NOT EXISTS idx_dirs_root ON dirs(root);
+"""
+
+
+def default_index_path() -> Path:
+    """获取索引数据库路径（配置项 index_path，默认 ~/.baku/backup_index.db）"""
+    config = load_baku_config()
+    index_path = config.get('index_path')
+    if index_path:
+        return Path(index_path).expanduser()
+    return Path.home() / ".baku" / "backup_index.db"
+
+
+class BackupIndex:
+    """
+    备份文件 SQLite 索引
+    - backups 表记录每个备份文件的 path/parent/stem/size/mtime/depth
+    - dirs 表记录建索引时每个目录的 mtime，目录 mtime 变化后该目录的索引视为过期
+    """
+
+    def __init__(self, db_path: Path, extensions: Optional[Iterable[str]] = None):
+        if extensions is None:
+            extensions = load_baku_config().get('bak_extensions', ['.bak', '.backup', '.old'])
+        self.db_path = Path(db_path)
+        self.extensions = tuple(extensions)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    @classmethod
+    def open_existing(cls, db_path: Optional[Path] = None,
+                      extensions: Optional[Iterable[str]] = None) -> Optional['BackupIndex']:
+        """打开已存在的索引，不存在或无法打开时返回 None（不会新建数据库）"""
+        db_path = Path(db_path) if db_path else default_index_path()
+        if not db_path.exists():
+            return None
+        try:
+            return cls(db_path, extensions)
+        except sqlite3.Error as e:
+            logger.warning(f"无法打开备份索引 {db_path}: {e}")
+            return None
+
+    def build(self, root: Path) -> Dict[str, int]:
+        """遍历 root 目录树，重建该根目录下的索引"""
+        root_str = os.path.abspath(str(root))
+        started = time.perf_counter()
+        dirs, backups = self._scan_tree(root_str, root_str, 0)
+        with self._lock, self._conn:
+            self._delete_tree(root_str)
+            self._insert_rows(dirs, backups)
+        elapsed = time.perf_counter() - started
+        logger.info(
+            f"索引构建完成: {root_str}，目录 {len(dirs)} 个，备份文件 {len(backups)} 个，"
+            f"耗时 {elapsed:.2f}s"
+        )
+        return {'dirs': len(dirs), 'backups': len(backups)}
+
+    def apply_changes(self, upserts: Iterable[Tuple] = (), deletes: Iterable[str] = (),
+                      dir_rows: Iterable[Tuple[str, str, int]] = (),
+                      removed_trees: Iterable[str] = (),
+                      rescans: Iterable[Tuple[str, str, int]] = ()):
+        """
+        在一个事务中批量应用增量变更（供实时监听使用）
+        - upserts: 备份文件记录 (path, parent, name, stem, size, mtime, depth)
+        - deletes: 已删除的备份文件路径
+        - dir_rows: 需要刷新 mtime 的目录 (path, root, mtime_ns)
+        - removed_trees: 已删除/移出的目录，连同子目录一起移除
+        - rescans: 需要重新遍历的目录 (path, root, depth)
+        """
+        scanned = [(path, self._scan_tree(path, root, depth)) for path, root, depth in rescans]
+        with self._lock, self._conn:
+            for path in removed_trees:
+                self._delete_tree(path)
+            for path, (dirs, backups) in scanned:
+                self._delete_tree(path)
+                self._insert_rows(dirs, backups)
+            self._conn.executemany("DELETE FROM backups WHERE path = ?", ((p,) for p in deletes))
+            self._insert_rows(dir_rows, upserts)
+
+    def _scan_tree(self, start: str, root_str: str,
+                   base_depth: int) -> Tuple[List[Tuple], List[Tuple]]:
+        """遍历 start 目录树，返回目录记录和备份文件记录"""
+        dirs: List[Tuple[str, str, int]] = []
+        backups: List[Tuple[str, str, str, str, int, float, int]] = []
+        extensions = self.extensions
+        stack = [(start, base_depth)]
+        while stack:
+            directory, depth = stack.pop()
+            try:
+                mtime_ns = os.stat(directory).st_mtime_ns
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                stack.append((entry.path, depth + 1))
+                                continue
+                            if not name.endswith(extensions) or name.rfind('.') <= 0:
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        backups.append((
+                            entry.path, directory, name, os.path.splitext(name)[0],
+                            stat.st_size, stat.st_mtime, depth
+                        ))
+            except OSError as e:
+                logger.debug(f"跳过无法读取的目录 {directory}: {e}")
+                continue
+            dirs.append((directory, root_str, mtime_ns))
+        return dirs, backups
+
+    def _insert_rows(self, dirs: Iterable[Tuple], backups: Iterable[Tuple]):
+        """写入目录和备份文件记录（调用方负责事务和加锁）"""
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO dirs (path, root, mtime_ns) VALUES (?, ?, ?)", dirs
+        )
+        self._conn.executemany(
+            "INSERT OR REPLACE INTO backups (path, parent, name, stem, size, mtime, depth) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)", backups
+        )
+
+    def _delete_tree(self, root_str: str):
+        """删除某个目录（含子目录）下的所有索引记录"""
+        prefix = root_str.rstrip(os.sep) + os.sep
+        like = prefix.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        self._conn.execute(
+            "DELETE FROM backups WHERE parent = ? OR parent LIKE ? ESCAPE '\\'", (root_str, like)
+        )
+        self._conn.execute(
+            "DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (root_str, like)
+        )
+
+    def get_listing(self, directory: str,
+                    mtime_ns: Optional[int] = None) -> Optional[Tuple[str, ...]]:
+        """
+        获取目录中的备份文件名
+        目录未被索引或 mtime 与建索引时不一致时返回 None，由调用方回退到实时文件系统；
+        mtime_ns 为 None 时表示索引由实时监听维护，直接信任索引内容
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)
+            ).fetchone()
+            if row is None or (mtime_ns is not None and row[0] != mtime_ns):
+                return None
+            rows = self._conn.execute(
+                "SELECT name FROM backups WHERE parent = ? ORDER BY name", (directory,)
+            ).fetchall()
+        return tuple(name for (name,) in rows)
+
+    def get_roots(self) -> List[str]:
+        """获取已建立索引的根目录"""
+        with self._lock:
+            rows = self._conn.execute("SELECT DISTINCT root FROM dirs ORDER BY root").fetchall()
+        return [root for (root,) in rows]
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取索引统计信息"""
+        with self._lock:
+            dirs = self._conn.execute("SELECT COUNT(*) FROM dirs").fetchone()[0]
+            backups = self._conn.execute("SELECT COUNT(*) FROM backups").fetchone()[0]
+        return {'dirs': dirs, 'backups': backups}
+
+    def close(self):
+        """关闭数据库连接"""
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,145 @@
+"""
+备份候选排序模块
+按文件名相似度、回溯层级和修改时间接近程度为候选备份打分
+"""
+import heapq
+import os
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+
+NGRAM_SIZE = 3
+
+
+@lru_cache(maxsize=65536)
+def name_ngrams(name: str) -> FrozenSet[str]:
+    """计算文件名（小写，带首尾标记）的 n-gram 集合"""
+    padded = f"\x02{name.lower()}\x03"
+    if len(padded) <= NGRAM_SIZE:
+        return frozenset((padded,))
+    return frozenset(padded[i:i + NGRAM_SIZE] for i in range(len(padded) - NGRAM_SIZE + 1))
+
+
+def strip_backup_extension(name: str, extensions: Sequence[str]) -> str:
+    """去掉备份扩展名，得到用于比较的原始文件名"""
+    for ext in extensions:
+        if name.endswith(ext) and len(name) > len(ext):
+            return name[:-len(ext)]
+    return name
+
+
+class NgramIndex:
+    """
+    一组候选文件名的 n-gram 倒排索引
+    对同一目录建一次，之后每个目标文件只需遍历自身 n-gram 的倒排表即可得到所有候选的重叠数
+    """
+
+    __slots__ = ("keys", "sizes", "postings")
+
+    def __init__(self, keys: Sequence[str]):
+        self.keys = tuple(keys)
+        self.sizes = [len(name_ngrams(key)) for key in self.keys]
+        postings: Dict[str, List[int]] = {}
+        for i, key in enumerate(self.keys):
+            for gram in name_ngrams(key):
+                postings.setdefault(gram, []).append(i)
+        self.postings = postings
+
+    def similarities(self, target_name: str) -> List[float]:
+        """返回目标文件名与每个候选的 Dice 相似度"""
+        target_grams = name_ngrams(target_name)
+        overlaps = [0] * len(self.keys)
+        for gram in target_grams:
+            for i in self.postings.get(gram, ()):
+                overlaps[i] += 1
+        target_size = len(target_grams)
+        return [
+            2.0 * overlap / (target_size + size) if overlap else 0.0
+            for overlap, size in zip(overlaps, self.sizes)
+        ]
+
+
+class BackupCandidate:
+    """候选备份及其评分"""
+
+    __slots__ = ("path", "name", "depth", "name_score", "score", "size", "mtime", "content_score")
+
+    def __init__(self, path: Path, depth: int, name_score: float):
+        self.path = path
+        self.name = path.name
+        self.depth = depth
+        self.name_score = name_score
+        self.score = 0.0
+        self.size: Optional[int] = None
+        self.mtime: Optional[float] = None
+        # 启用内容相似度时由 BackupFinder 填入
+        self.content_score: Optional[float] = None
+
+    def __repr__(self) -> str:
+        return f"BackupCandidate({self.path!s}, score={self.score:.3f}, depth={self.depth})"
+
+
+class BackupRanker:
+    """
+    候选备份排序器
+    总分 = 名称相似度 * name + 层级得分 * depth + 时间接近度 * time（权重之和为 1）
+    只对名称和层级预排序后的前 max_candidates 个候选 stat 获取修改时间
+    """
+
+    def __init__(self, extensions: Sequence[str], weights: Optional[Dict[str, float]] = None,
+                 max_candidates: int = 10):
+        self.extensions = tuple(extensions)
+        weights = weights or {}
+        self.name_weight = float(weights.get('name', 0.6))
+        self.depth_weight = float(weights.get('depth', 0.25))
+        self.time_weight = float(weights.get('time', 0.15))
+        self.max_candidates = max(1, int(max_candidates))
+
+    def build_index(self, names: Sequence[str]) -> NgramIndex:
+        """为一个目录的备份文件名建立 n-gram 索引"""
+        return NgramIndex([strip_backup_extension(name, self.extensions) for name in names])
+
+    def rank(self, target_file: Path,
+             groups: Sequence[Tuple[Path, int, Sequence[str], NgramIndex]],
+             target_mtime: Optional[float] = None) -> List[BackupCandidate]:
+        """
+        对候选备份排序
+        groups 为 (目录, 回溯层级, 备份文件名, 该目录的 n-gram 索引) 列表
+        """
+        target_name = target_file.name
+        name_weight = self.name_weight
+        scored = []
+        order = 0
+        for directory, depth, names, index in groups:
+            depth_part = self.depth_weight / (1 + depth)
+            for name, similarity in zip(names, index.similarities(target_name)):
+                scored.append((-(name_weight * similarity + depth_part), order,
+                               directory, name, depth, similarity))
+                order += 1
+        if not scored:
+            return []
+        # 先按名称和层级取前 max_candidates 个，只为这些候选构造对象并读取修改时间
+        top = heapq.nsmallest(self.max_candidates, scored)
+        results = []
+        for neg_partial, order, directory, name, depth, similarity in top:
+            candidate = BackupCandidate(directory / name, depth, similarity)
+            try:
+                stat = os.stat(candidate.path)
+            except OSError:
+                continue
+            candidate.size = stat.st_size
+            candidate.mtime = stat.st_mtime
+            candidate.score = -neg_partial + self.time_weight * self._time_score(
+                stat.st_mtime, target_mtime
+            )
+            results.append((order, candidate))
+        results.sort(key=lambda entry: (-entry[1].score, entry[0]))
+        return [candidate for _, candidate in results]
+
+    @staticmethod
+    def _time_score(mtime: float, target_mtime: Optional[float]) -> float:
+        """修改时间接近度，相差一天得 0.5 分"""
+        if target_mtime is None:
+            return 0.0
+        return 1.0 / (1.0 + abs(target_mtime - mtime) / 86400.0)
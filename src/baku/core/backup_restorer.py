@@ -2,56 +2,163 @@
 备份恢复器模块
 负责执行备份恢复操作
 """
+import errno
+import mmap
+import os
 import shutil
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import Tuple, Optional, Dict, Any
+from typing import Tuple, Optional, Dict, Any, Iterable, List, Set, Union
 from datetime import datetime
 from loguru import logger
-from send2trash import send2trash
+from baku.config.config import load_baku_config
+from baku.core.copy_engine import CopyEngine, ProgressCallback, ProgressThrottle
+from baku.core.restore_plan import RestorePlan, RestorePlanEntry, detect_conflicts
+from baku.core.safety_store import SafetyStore
+from baku.core.trash_queue import TrashQueue, get_trash_queue
 
 
 class BackupRestorer:
     """备份恢复操作类"""
     
-    def restore_backup(self, target_file: Path, backup_file: Path) -> Dict[str, Any]:
+    # 内容比较：首尾块大小、流式比较块大小、使用 mmap 的文件大小阈值
+    COMPARE_BLOCK_SIZE = 64 * 1024
+    COMPARE_CHUNK_SIZE = 8 * 1024 * 1024
+    MMAP_THRESHOLD = 64 * 1024 * 1024
+    # 增量恢复：比较块大小
+    DELTA_BLOCK_SIZE = 128 * 1024
+    # 恢复模式：full 整文件复制；delta 只改写与原文件不同的块；auto 在文件足够大时使用 delta
+    # （delta 需要 reflink 克隆原文件，不支持时改用整文件复制）
+    RESTORE_MODES = ("full", "delta", "auto")
+    # 批量预览：需要 stat 的路径数超过该值时并行 stat
+    PREVIEW_PARALLEL_THRESHOLD = 256
+    # 自动选择的 .new 名称被占用时的重试次数
+    NEW_FILE_ATTEMPTS = 8
+    
+    def __init__(self, copy_engine: Optional[CopyEngine] = None,
+                 trash_queue: Optional[TrashQueue] = None,
+                 mode: Optional[str] = None, delta_min_size: int = 64 * 1024 * 1024,
+                 safety_store: Optional[SafetyStore] = None):
+        if mode is None:
+            mode = load_baku_config().get('restore_mode', 'full')
+        if mode not in self.RESTORE_MODES:
+            raise ValueError(f"未知的恢复模式: {mode}")
+        self.mode = mode
+        self.delta_min_size = delta_min_size
+        # 无法 reflink、增量恢复不可用的 (原文件设备, 目标目录设备)，只提示一次
+        self._no_delta: Set[Tuple[int, int]] = set()
+        # 复制引擎：reflink → copy_file_range → sendfile → 缓冲复制
+        self.copy_engine = copy_engine or CopyEngine()
+        # 后台回收站队列，send2trash 不计入恢复耗时
+        self.trash_queue = trash_queue or get_trash_queue()
+        # .new 去重存储（配置项 safety_store），未配置时为 None
+        self.safety_store = safety_store or SafetyStore.from_config(self.copy_engine)
+    
+    def flush_trash(self, timeout: Optional[float] = None) -> bool:
+        """等待回收站队列处理完毕"""
+        return self.trash_queue.flush(timeout)
+    
+    def restore_backup(self, target_file: Path, backup_file: Path,
+                       trash_backup: bool = True, skip_identical: bool = True,
+                       progress: Optional[ProgressCallback] = None,
+                       mode: Optional[str] = None,
+                       new_file: Optional[Path] = None) -> Dict[str, Any]:
         """
         恢复备份文件
-        1. 将原文件重命名为 .new
-        2. 将备份文件复制到原位置
+        progress 为 (已复制字节数, 总字节数) 回调（已节流），不复制数据时直接回报完成
+        mode 覆盖实例的恢复模式（full / delta / auto），结果 details 中 bytes_written 为实际写入的字节数
+        new_file 指定 .new 文件路径（批量恢复时预先写入日志），默认自动选择
+        0. skip_identical 为 True 时先比较目标与备份，内容相同则直接返回（不创建 .new、不复制）；
+           将增量恢复时只比较首尾块，由增量恢复逐块比较时判断是否相同，不重复读取整个文件
+        1. 为原文件保留 .new 副本（同目录硬链接或重命名，不复制数据）
+        2. 将备份文件放到原位置（同文件系统且备份无需保留时直接重命名，增量恢复时替换为改写后的克隆，
+           否则复制到临时文件后 os.replace）
+        3. trash_backup 为 True 时将备份文件移入回收站（集中备份库中的版本应保留）
         """
         logger.debug(f"[restore_backup] target_file={target_file}, backup_file={backup_file}")
         try:
             # 检查文件是否存在
-            if not backup_file.exists():
+            try:
+                backup_stat = os.stat(backup_file)
+            except OSError:
                 logger.error(f"备份文件不存在: {backup_file}")
                 return {
                     "success": False,
                     "message": f"备份文件不存在: {backup_file}",
                     "details": {}
                 }
+            target_stat = self._stat_or_none(target_file)
+            method = self._restore_method(target_file, backup_stat, trash_backup)
+            use_delta = (method == "copy" and target_stat is not None
+                         and self._use_delta(mode, backup_stat))
+            if skip_identical and target_stat is not None and self._is_identical(
+                target_file, target_stat, backup_file, backup_stat, full_compare=not use_delta
+            ):
+                if progress is not None:
+                    progress(backup_stat.st_size, backup_stat.st_size)
+                return self._identical_result(target_file, backup_file, trash_backup)
+            delta_file = None
+            if use_delta:
+                patched = self._prepare_delta(target_file, backup_file, progress)
+                if patched is None:
+                    # 无法增量恢复，补做完整比较
+                    if skip_identical and self._is_identical(
+                        target_file, target_stat, backup_file, backup_stat
+                    ):
+                        return self._identical_result(target_file, backup_file, trash_backup)
+                else:
+                    delta_file, bytes_written = patched
+                    if (skip_identical and bytes_written == 0
+                            and target_stat.st_size == backup_stat.st_size):
+                        # 没有不同的块：内容与备份相同
+                        os.unlink(delta_file)
+                        return self._identical_result(target_file, backup_file, trash_backup)
+                    method = "delta"
             new_file_path = None
-            # 如果目标文件存在，先备份为 .new
-            if target_file.exists():
+            new_file_method = None
+            # 如果目标文件存在，先保留为 .new
+            if target_stat is not None:
                 logger.info(f"目标文件存在，准备创建 .new 备份: {target_file}")
-                new_file_path = self._create_new_backup(target_file)
+                new_file_path, new_file_method = self._create_new_backup(target_file, new_file)
                 if not new_file_path:
                     logger.error(f"无法创建 .new 备份文件: {target_file}")
+                    self._discard_temp(delta_file)
                     return {
                         "success": False,
                         "message": "无法创建 .new 备份文件",
                         "details": {}
                     }
                 logger.info(f"已创建 .new 备份文件: {new_file_path}")
-            # 复制备份文件到目标位置
-            logger.info(f"复制备份文件 {backup_file} 到 {target_file}")
-            shutil.copy2(backup_file, target_file)
-            logger.success(f"成功恢复 {backup_file.name} 到 {target_file.name}")
-            # 恢复成功后将bak文件移入回收站
             try:
-                send2trash(str(backup_file))
-                logger.info(f"已将备份文件移入回收站: {backup_file}")
-            except Exception as e:
-                logger.warning(f"备份文件移入回收站失败: {backup_file}, 错误: {e}")
+                if method == "delta":
+                    # 克隆在创建 .new 之前完成，.new 仍指向原文件内容
+                    os.replace(delta_file, target_file)
+                    copy_method = "reflink"
+                else:
+                    try:
+                        copy_method = self._place_backup(target_file, backup_file, method, progress)
+                    except OSError as e:
+                        # st_dev 相同但实际跨挂载点（bind mount、overlay 等）时 rename 返回 EXDEV
+                        if method != "rename" or e.errno != errno.EXDEV:
+                            raise
+                        logger.info(f"无法跨挂载点重命名，改为复制: {backup_file}")
+                        method = "copy"
+                        copy_method = self._place_backup(target_file, backup_file, method, progress)
+                    bytes_written = backup_stat.st_size if method == "copy" else 0
+            except Exception:
+                self._discard_temp(delta_file)
+                # 原文件已被重命名时还原，保证目标路径不丢失
+                if new_file_method == "rename" and not target_file.exists():
+                    os.replace(new_file_path, target_file)
+                elif new_file_method == "dedup-link":
+                    self.safety_store.release(target_file, new_file_path)
+                raise
+            logger.success(f"成功恢复 {backup_file.name} 到 {target_file.name}（{method}）")
+            # 恢复成功后将bak文件移入回收站（已被重命名到目标位置时无需处理）
+            if trash_backup and method != "rename":
+                self.trash_queue.put(backup_file)
+                logger.info(f"备份文件已加入回收站队列: {backup_file}")
             return {
                 "success": True,
                 "message": f"成功恢复 {backup_file.name} 到 {target_file.name}",
@@ -59,6 +166,10 @@ class BackupRestorer:
                     "target_file": str(target_file),
                     "backup_file": str(backup_file),
                     "new_file": str(new_file_path) if new_file_path else None,
+                    "method": method,
+                    "copy_method": copy_method,
+                    "new_file_method": new_file_method,
+                    "bytes_written": bytes_written,
                     "timestamp": datetime.now().isoformat()
                 }
             }
@@ -70,50 +181,392 @@ class BackupRestorer:
                 "details": {"error": str(e)}
             }
     
-    def _create_new_backup(self, target_file: Path) -> Optional[Path]:
-        """创建 .new 备份文件"""
+    def _identical_result(self, target_file: Path, backup_file: Path,
+                          trash_backup: bool) -> Dict[str, Any]:
+        """目标与备份内容相同：跳过复制，结果与正常恢复一致（备份按设置移入回收站）"""
+        logger.info(f"目标文件与备份内容相同，跳过恢复: {target_file}")
+        if trash_backup:
+            self.trash_queue.put(backup_file)
+            logger.info(f"备份文件已加入回收站队列: {backup_file}")
+        return {
+            "success": True,
+            "message": f"{target_file.name} 已与备份 {backup_file.name} 相同，无需恢复",
+            "details": {
+                "target_file": str(target_file),
+                "backup_file": str(backup_file),
+                "new_file": None,
+                "method": "identical",
+                "identical": True,
+                "bytes_written": 0,
+                "timestamp": datetime.now().isoformat()
+            }
+        }
+    
+    def _is_identical(self, target_file: Path, target_stat: os.stat_result,
+                      backup_file: Path, backup_stat: os.stat_result,
+                      full_compare: bool = True) -> bool:
+        """
+        分阶段比较两个文件内容，尽早排除不同的文件
+        1. 同一 inode 或大小不同直接得出结论
+        2. 比较首尾块
+        3. 流式比较全部内容（大文件使用 mmap）；full_compare 为 False 时跳过，首尾块相同也返回 False
+        """
+        if (target_stat.st_dev, target_stat.st_ino) == (backup_stat.st_dev, backup_stat.st_ino):
+            return True
+        size = target_stat.st_size
+        if size != backup_stat.st_size:
+            return False
+        if size == 0:
+            return True
+        try:
+            with open(target_file, 'rb') as f1, open(backup_file, 'rb') as f2:
+                block = self.COMPARE_BLOCK_SIZE
+                if f1.read(block) != f2.read(block):
+                    return False
+                if size > block:
+                    f1.seek(max(size - block, block))
+                    f2.seek(max(size - block, block))
+                    if f1.read(block) != f2.read(block):
+                        return False
+                if size <= 2 * block:
+                    return True
+                if not full_compare:
+                    return False
+                return self._compare_contents(f1, f2, size)
+        except OSError as e:
+            logger.debug(f"比较文件内容失败，按不同处理: {e}")
+            return False
+    
+    def _compare_contents(self, f1, f2, size: int) -> bool:
+        """流式比较两个已打开文件的全部内容，发现差异即返回"""
+        chunk = self.COMPARE_CHUNK_SIZE
+        if size >= self.MMAP_THRESHOLD:
+            with mmap.mmap(f1.fileno(), 0, access=mmap.ACCESS_READ) as m1, \
+                    mmap.mmap(f2.fileno(), 0, access=mmap.ACCESS_READ) as m2:
+                for offset in range(0, size, chunk):
+                    if m1[offset:offset + chunk] != m2[offset:offset + chunk]:
+                        return False
+                return True
+        f1.seek(0)
+        f2.seek(0)
+        while True:
+            data = f1.read(chunk)
+            if data != f2.read(chunk):
+                return False
+            if not data:
+                return True
+    
+    def _use_delta(self, mode: Optional[str], backup_stat: os.stat_result) -> bool:
+        """是否尝试增量恢复（auto 模式下还要求文件足够大；放置时还要求能 reflink 克隆原文件）"""
+        mode = mode or self.mode
+        if mode not in self.RESTORE_MODES:
+            raise ValueError(f"未知的恢复模式: {mode}")
+        if mode == "delta":
+            return True
+        return mode == "auto" and backup_stat.st_size >= self.delta_min_size
+    
+    def _prepare_delta(self, target_file: Path, backup_file: Path,
+                       progress: Optional[ProgressCallback]) -> Optional[Tuple[Path, int]]:
+        """
+        增量恢复：把原文件 reflink 克隆到目标目录的临时文件，只改写与备份不同的块
+        返回 (临时文件, 实际写入字节数)，由调用方创建 .new 后原子替换目标；
+        无法 reflink 时返回 None，由调用方整文件复制（先整文件复制再改写的写入量比直接复制更多）
+        """
+        devices = (os.stat(target_file).st_dev, os.stat(target_file.parent).st_dev)
+        if devices in self._no_delta:
+            return None
+        temp_file = self._temp_file_path(target_file)
+        try:
+            if not self.copy_engine.clone(target_file, temp_file):
+                # mkstemp 已创建临时文件，clone 未必会删除
+                self._discard_temp(temp_file)
+                self._no_delta.add(devices)
+                logger.info(f"设备 {devices[0]} → {devices[1]} 不支持 reflink，增量恢复不可用，改用整文件复制")
+                return None
+            bytes_written = self._patch_blocks(temp_file, backup_file, progress)
+            shutil.copystat(backup_file, temp_file)
+        except BaseException:
+            self._discard_temp(temp_file)
+            raise
+        logger.info(f"增量恢复 {target_file.name}: 写入 {bytes_written} 字节（克隆方式 reflink）")
+        return temp_file, bytes_written
+    
+    @staticmethod
+    def _discard_temp(temp_file: Optional[Path]):
+        """删除未使用的临时文件（不存在时忽略）"""
+        if temp_file is None:
+            return
+        try:
+            os.unlink(temp_file)
+        except OSError:
+            pass
+    
+    def _patch_blocks(self, dest_file: Path, backup_file: Path,
+                      progress: Optional[ProgressCallback] = None) -> int:
+        """逐块比较 dest_file 与备份，只写入不同的块（相邻的脏块合并写入），返回写入字节数"""
+        block = self.DELTA_BLOCK_SIZE
+        chunk = max(block, self.COMPARE_CHUNK_SIZE // block * block)
+        written = 0
+        with open(backup_file, 'rb') as src, open(dest_file, 'r+b') as dst:
+            total = os.fstat(src.fileno()).st_size
+            throttle = ProgressThrottle(progress, total) if progress is not None else None
+
+            def write_at(position: int, data) -> int:
+                dst.seek(position)
+                return dst.write(data)
+
+            offset = 0
+            while True:
+                new_data = src.read(chunk)
+                if not new_data:
+                    break
+                dst.seek(offset)
+                old_data = dst.read(len(new_data))
+                if new_data != old_data:
+                    new_view = memoryview(new_data)
+                    run_start = None
+                    for start in range(0, len(new_data), block):
+                        end = start + block
+                        dirty = new_view[start:end] != old_data[start:end]
+                        if dirty and run_start is None:
+                            run_start = start
+                        elif not dirty and run_start is not None:
+                            written += write_at(offset + run_start, new_view[run_start:start])
+                            run_start = None
+                    if run_start is not None:
+                        written += write_at(offset + run_start, new_view[run_start:])
+                offset += len(new_data)
+                if throttle is not None:
+                    throttle.update(offset)
+            dst.truncate(total)
+        if throttle is not None:
+            throttle.finish(total)
+        return written
+    
+    @staticmethod
+    def _restore_method(target_file: Path, backup_stat: os.stat_result, trash_backup: bool) -> str:
+        """
+        选择恢复方式
+        - rename: 备份与目标在同一文件系统且恢复后不保留备份，直接重命名，不复制数据
+          （重命名返回 EXDEV 时由 restore_backup 改为 copy）
+        - copy: 复制到目标目录的临时文件后 os.replace
+        """
+        if not trash_backup:
+            return "copy"
+        try:
+            target_dev = os.stat(target_file.parent).st_dev
+        except OSError:
+            return "copy"
+        return "rename" if target_dev == backup_stat.st_dev else "copy"
+    
+    def _place_backup(self, target_file: Path, backup_file: Path, method: str,
+                      progress: Optional[ProgressCallback] = None) -> Optional[str]:
+        """把备份文件原子地放到目标位置，复制时返回复制引擎使用的方式"""
+        if method == "rename":
+            logger.info(f"重命名备份文件 {backup_file} 到 {target_file}")
+            size = os.stat(backup_file).st_size if progress is not None else 0
+            os.replace(backup_file, target_file)
+            if progress is not None:
+                progress(size, size)
+            return None
+        logger.info(f"复制备份文件 {backup_file} 到 {target_file}")
+        temp_file = self._temp_file_path(target_file)
         try:
+            copy_method = self.copy_engine.copy(backup_file, temp_file, progress)
+            os.replace(temp_file, target_file)
+            logger.debug(f"复制方式: {copy_method}")
+            return copy_method
+        except BaseException:
+            try:
+                os.unlink(temp_file)
+            except OSError:
+                pass
+            raise
+    
+    @staticmethod
+    def _temp_file_path(target_file: Path) -> Path:
+        """
+        在目标目录创建本次调用独占的临时文件，并发恢复或重试时互不覆盖
+        前缀 .<文件名>.baku-tmp- 供 restore_journal 清理崩溃残留时匹配
+        """
+        fd, name = tempfile.mkstemp(dir=target_file.parent, prefix=f".{target_file.name}.baku-tmp-")
+        os.close(fd)
+        return Path(name)
+    
+    def planned_new_file(self, target_file: Path) -> Optional[Path]:
+        """目标文件存在时恢复将创建的 .new 路径，不存在时返回 None（批量恢复写日志用）"""
+        if not os.path.lexists(target_file):
+            return None
+        return self._new_file_path(target_file)
+    
+    @staticmethod
+    def _base_new_file_path(target_file: Path) -> Path:
+        return target_file.with_suffix(f"{target_file.suffix}.new")
+    
+    @staticmethod
+    def _new_file_path(target_file: Path) -> Path:
+        """.new 备份文件路径，已存在时添加时间戳（同一秒内重复时再加序号）"""
+        new_file = BackupRestorer._base_new_file_path(target_file)
+        if os.path.lexists(new_file):
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_file = target_file.with_suffix(f"{target_file.suffix}.new")
-            # 如果 .new 文件已存在，添加时间戳
-            if new_file.exists():
-                logger.warning(f".new 文件已存在，添加时间戳: {new_file}")
-                new_file = target_file.with_suffix(f"{target_file.suffix}.new.{timestamp}")
-            shutil.copy2(target_file, new_file)
-            logger.info(f"已创建 .new 备份文件: {new_file}")
-            return new_file
+            new_file = target_file.with_suffix(f"{target_file.suffix}.new.{timestamp}")
+            counter = 1
+            while os.path.lexists(new_file):
+                new_file = target_file.with_suffix(f"{target_file.suffix}.new.{timestamp}_{counter}")
+                counter += 1
+        return new_file
+    
+    def _create_new_backup(self, target_file: Path,
+                           new_file: Optional[Path] = None) -> Tuple[Optional[Path], Optional[str]]:
+        """
+        创建 .new 备份文件，返回 (路径, 方式)
+        配置了去重存储时 .new 链接到存储中的内容对象（dedup-link / dedup-reflink），
+        否则与原文件在同一目录，优先硬链接（原文件保持在位，随后被原子替换），
+        文件系统不支持硬链接时重命名，最后才复制
+        """
+        try:
+            choose = new_file is None
+            for attempt in range(self.NEW_FILE_ATTEMPTS):
+                if choose:
+                    new_file = self._new_file_path(target_file)
+                if new_file.name.startswith(f"{target_file.name}.new."):
+                    logger.warning(f".new 文件已存在，添加时间戳: {new_file}")
+                try:
+                    method = None
+                    if self.safety_store is not None:
+                        method = self.safety_store.link_new_file(target_file, new_file)
+                    if method is None:
+                        method = self._link_or_move(target_file, new_file)
+                except FileExistsError:
+                    # 并发恢复同一目标时名称可能刚被其他线程占用，自动选择的名称重新选择
+                    if not choose or attempt == self.NEW_FILE_ATTEMPTS - 1:
+                        raise
+                    continue
+                logger.info(f"已创建 .new 备份文件: {new_file}（{method}）")
+                return new_file, method
         except Exception as e:
             logger.exception(f"创建 .new 备份文件失败: {e}")
-            return None
+            return None, None
     
-    def preview_restore(self, target_file: Path, backup_file: Path) -> Dict[str, Any]:
+    def _link_or_move(self, target_file: Path, new_file: Path) -> str:
+        """在原文件旁创建 .new：硬链接 → 重命名 → 复制，返回使用的方式"""
+        try:
+            os.link(target_file, new_file)
+            return "link"
+        except FileExistsError:
+            # 不覆盖已有的 .new
+            raise
+        except OSError:
+            pass
+        try:
+            os.rename(target_file, new_file)
+            return "rename"
+        except OSError:
+            self.copy_engine.copy(target_file, new_file)
+            return "copy"
+    
+    def preview_restore(self, target_file: Path, backup_file: Path,
+                        trash_backup: bool = True) -> Dict[str, Any]:
         """预览恢复操作，不实际执行"""
-        target_exists = target_file.exists()
-        backup_exists = backup_file.exists()
+        target_stat = self._stat_or_none(target_file)
+        backup_stat = self._stat_or_none(backup_file)
+        target_exists = target_stat is not None
+        backup_exists = backup_stat is not None
         
-        new_file_path = None
-        if target_exists:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            new_file_path = target_file.with_suffix(f"{target_file.suffix}.new")
-            if new_file_path.exists():
-                new_file_path = target_file.with_suffix(f"{target_file.suffix}.new.{timestamp}")
+        new_file_path = self._new_file_path(target_file) if target_exists else None
+        method = self._restore_method(target_file, backup_stat, trash_backup) if backup_exists else None
         
         return {
             "target_file": {
                 "path": str(target_file),
                 "exists": target_exists,
-                "size": target_file.stat().st_size if target_exists else 0,
-                "modified": datetime.fromtimestamp(target_file.stat().st_mtime).isoformat() if target_exists else None
+                "size": target_stat.st_size if target_exists else 0,
+                "modified": datetime.fromtimestamp(target_stat.st_mtime).isoformat() if target_exists else None
             },
             "backup_file": {
                 "path": str(backup_file),
                 "exists": backup_exists,
-                "size": backup_file.stat().st_size if backup_exists else 0,
-                "modified": datetime.fromtimestamp(backup_file.stat().st_mtime).isoformat() if backup_exists else None
+                "size": backup_stat.st_size if backup_exists else 0,
+                "modified": datetime.fromtimestamp(backup_stat.st_mtime).isoformat() if backup_exists else None
             },
             "new_file": {
                 "path": str(new_file_path) if new_file_path else None,
                 "will_create": target_exists
             },
+            # rename: 同文件系统直接重命名（不复制数据）；copy: 复制到临时文件后原子替换
+            "restore_method": method,
             "can_restore": backup_exists
         }
+    
+    def preview_many(self, items: Iterable[Union[Tuple[Path, Path], Tuple[Path, Path, bool]]],
+                     max_workers: Optional[int] = None) -> RestorePlan:
+        """
+        批量预览恢复操作，不实际执行
+        items 为 (目标, 备份) 或 (目标, 备份, trash_backup)
+        每个路径（目标、备份、目标目录、.new）只 stat 一次，路径较多时并行 stat；
+        重复目标、.new 路径碰撞等冲突在整个计划范围内一次检测
+        """
+        items = [(Path(item[0]), Path(item[1]), item[2] if len(item) > 2 else True) for item in items]
+        stat_paths = set()
+        lstat_paths = set()
+        for target, backup, _ in items:
+            stat_paths.update((str(target), str(backup), str(target.parent)))
+            lstat_paths.add(str(self._base_new_file_path(target)))
+        stats = self._stat_many(stat_paths, lstat_paths, max_workers)
+        now = datetime.now().strftime("%Y%m%d_%H%M%S")
+        entries: List[RestorePlanEntry] = []
+        for index, (target, backup, trash_backup) in enumerate(items):
+            target_stat = stats[(str(target), True)]
+            backup_stat = stats[(str(backup), True)]
+            new_file = None
+            if target_stat is not None:
+                new_file = self._base_new_file_path(target)
+                if stats[(str(new_file), False)] is not None:
+                    new_file = target.with_suffix(f"{target.suffix}.new.{now}")
+            method = None
+            if backup_stat is not None:
+                parent_stat = stats[(str(target.parent), True)]
+                if (trash_backup and parent_stat is not None
+                        and parent_stat.st_dev == backup_stat.st_dev):
+                    method = "rename"
+                else:
+                    method = "copy"
+            entries.append(RestorePlanEntry(
+                index=index,
+                target=target,
+                backup=backup,
+                target_exists=target_stat is not None,
+                target_size=target_stat.st_size if target_stat is not None else 0,
+                backup_exists=backup_stat is not None,
+                backup_size=backup_stat.st_size if backup_stat is not None else 0,
+                backup_mtime=backup_stat.st_mtime if backup_stat is not None else None,
+                new_file=new_file,
+                method=method,
+            ))
+        return RestorePlan(entries=entries, conflicts=detect_conflicts(entries))
+    
+    def _stat_many(self, stat_paths: Iterable[str], lstat_paths: Iterable[str],
+                   max_workers: Optional[int] = None) -> Dict[Tuple[str, bool], Optional[os.stat_result]]:
+        """stat 一组去重后的路径，返回 (路径, 是否跟随链接) -> stat 结果（不存在为 None）"""
+        keys = [(path, True) for path in stat_paths] + [(path, False) for path in lstat_paths]
+        
+        def stat_one(key: Tuple[str, bool]) -> Optional[os.stat_result]:
+            try:
+                return os.stat(key[0], follow_symlinks=key[1])
+            except (OSError, ValueError):
+                return None
+        
+        if len(keys) < self.PREVIEW_PARALLEL_THRESHOLD:
+            return {key: stat_one(key) for key in keys}
+        if max_workers is None:
+            max_workers = load_baku_config().get('max_workers', 8)
+        with ThreadPoolExecutor(max_workers=max(1, max_workers),
+                                thread_name_prefix="baku-preview") as executor:
+            return dict(zip(keys, executor.map(stat_one, keys, chunksize=64)))
+    
+    @staticmethod
+    def _stat_or_none(path: Path) -> Optional[os.stat_result]:
+        try:
+            return os.stat(path)
+        except OSError:
+            return None
@@ -0,0 +1,191 @@
+"""
+集中备份库模块
+支持把源目录树镜像到独立备份目录（可带时间戳版本或快照子目录），
+首次查找时遍历一次备份目录，建立"相对路径 -> 版本列表"映射，之后按相对路径 O(1) 查找
+"""
+import fnmatch
+import os
+import re
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Union
+from loguru import logger
+
+
+# 支持的时间戳格式：20240101_120000 / 20240101120000 / 2024-01-01_12-00-00 / 2024-01-01T12-00-00
+_TIMESTAMP_PATTERN = r"\d{8}_\d{6}|\d{14}|\d{4}-\d{2}-\d{2}[_T]\d{2}-\d{2}-\d{2}"
+_TIMESTAMP_RE = re.compile(rf"^(?:{_TIMESTAMP_PATTERN})$")
+_VERSIONED_NAME_RE = re.compile(rf"^(?P<name>.+)\.(?P<ts>{_TIMESTAMP_PATTERN})$")
+
+
+def parse_timestamp(text: str) -> Optional[float]:
+    """解析版本时间戳，无法解析时返回 None"""
+    digits = re.sub(r"\D", "", text)
+    if len(digits) != 14:
+        return None
+    try:
+        return datetime.strptime(digits, "%Y%m%d%H%M%S").timestamp()
+    except ValueError:
+        return None
+
+
+class BackupVersion:
+    """备份库中某个文件的一个版本"""
+
+    __slots__ = ("path", "timestamp", "size", "location")
+
+    def __init__(self, path: str, timestamp: float, size: int, location: str):
+        self.path = path
+        self.timestamp = timestamp
+        self.size = size
+        self.location = location
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'path': self.path,
+            'timestamp': self.timestamp,
+            'size': self.size,
+            'source': 'store',
+            'location': self.location,
+        }
+
+
+class BackupStore:
+    """
+    单个集中备份目录
+    - source 为 None 时按绝对路径镜像（如 /mnt/backup/home/user/proj/a.txt）
+    - source 不为 None 时 store 镜像 source 目录树
+    备份目录中以下文件都视为原文件的一个版本（可叠加备份扩展名）：
+      a.txt、a.txt.bak、a.txt.20240101_120000、<store>/20240101_120000/a.txt
+    """
+
+    def __init__(self, store: Union[str, Path], source: Optional[Union[str, Path]] = None,
+                 extensions: Sequence[str] = ('.bak', '.backup', '.old'),
+                 patterns: Sequence[str] = ('*',)):
+        self.store = os.path.abspath(os.path.expanduser(str(store)))
+        self.source = os.path.abspath(os.path.expanduser(str(source))) if source else None
+        self.extensions = tuple(extensions)
+        self.patterns = tuple(patterns) or ('*',)
+        self._map: Optional[Dict[str, List[BackupVersion]]] = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, entry: Union[str, Dict[str, Any]], extensions: Sequence[str],
+                    patterns: Sequence[str]) -> 'BackupStore':
+        """从配置项创建：字符串为绝对路径镜像，字典为 {"source": ..., "store": ...}"""
+        if isinstance(entry, dict):
+            return cls(entry['store'], entry.get('source'), extensions, patterns)
+        return cls(entry, None, extensions, patterns)
+
+    def relative_key(self, file_path: Union[str, Path]) -> Optional[str]:
+        """计算文件在备份库中的相对路径键，不属于该备份库时返回 None"""
+        abs_path = os.path.abspath(str(file_path))
+        if self.source is not None:
+            try:
+                relative = os.path.relpath(abs_path, self.source)
+            except ValueError:
+                return None
+            if relative == os.curdir or relative.startswith(os.pardir):
+                return None
+        else:
+            drive, rest = os.path.splitdrive(abs_path)
+            relative = rest.lstrip("\\/")
+            if drive:
+                relative = os.path.join(drive.rstrip(":"), relative)
+        return os.path.normcase(relative).replace(os.sep, "/")
+
+    def lookup(self, file_path: Union[str, Path], max_age: Optional[float] = None) -> List[BackupVersion]:
+        """查找文件在备份库中的所有版本（按时间从新到旧）"""
+        key = self.relative_key(file_path)
+        if key is None:
+            return []
+        self.ensure_built(max_age)
+        return list(self._map.get(key, ()))
+
+    def ensure_built(self, max_age: Optional[float] = None):
+        """映射尚未建立或超过 max_age 秒时重新遍历备份目录"""
+        if self._map is not None and (max_age is None or time.time() - self._built_at < max_age):
+            return
+        with self._lock:
+            if self._map is not None and (max_age is None or time.time() - self._built_at < max_age):
+                return
+            self._map = self._build_map()
+            self._built_at = time.time()
+
+    def invalidate(self):
+        """使映射失效，下次查找时重建"""
+        with self._lock:
+            self._map = None
+
+    def _build_map(self) -> Dict[str, List[BackupVersion]]:
+        """遍历备份目录，建立相对路径到版本列表的映射"""
+        started = time.perf_counter()
+        mapping: Dict[str, List[BackupVersion]] = {}
+        count = 0
+        stack = [(self.store, "", None)]
+        while stack:
+            directory, rel_dir, snapshot_ts = stack.pop()
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        name = entry.name
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                # 顶层时间戳目录视为快照
+                                if not rel_dir and snapshot_ts is None and _TIMESTAMP_RE.match(name):
+                                    stack.append((entry.path, "", parse_timestamp(name)))
+                                else:
+                                    stack.append((entry.path, f"{rel_dir}{name}/", snapshot_ts))
+                                continue
+                            if not entry.is_file(follow_symlinks=False):
+                                continue
+                            if not any(fnmatch.fnmatch(name, pattern) for pattern in self.patterns):
+                                continue
+                            stat = entry.stat(follow_symlinks=False)
+                        except OSError:
+                            continue
+                        original, name_ts = self._split_version_name(name)
+                        timestamp = name_ts or snapshot_ts or stat.st_mtime
+                        key = os.path.normcase(f"{rel_dir}{original}")
+                        mapping.setdefault(key, []).append(
+                            BackupVersion(entry.path, timestamp, stat.st_size, self.store)
+                        )
+                        count += 1
+            except OSError as e:
+                logger.debug(f"跳过无法读取的备份目录 {directory}: {e}")
+        for versions in mapping.values():
+            versions.sort(key=lambda version: version.timestamp, reverse=True)
+        logger.info(
+            f"备份库映射已建立: {self.store}，{len(mapping)} 个文件 / {count} 个版本，"
+            f"耗时 {time.perf_counter() - started:.2f}s"
+        )
+        return mapping
+
+    def _split_version_name(self, name: str):
+        """拆分版本文件名，返回 (原文件名, 文件名中的时间戳)"""
+        for ext in self.extensions:
+            if name.endswith(ext) and len(name) > len(ext):
+                name = name[:-len(ext)]
+                break
+        match = _VERSIONED_NAME_RE.match(name)
+        if match:
+            timestamp = parse_timestamp(match.group('ts'))
+            if timestamp is not None:
+                return match.group('name'), timestamp
+        return name, None
+
+
+def build_stores(entries: Iterable[Union[str, Dict[str, Any]]], extensions: Sequence[str],
+                 patterns: Sequence[str]) -> List[BackupStore]:
+    """根据配置项列表创建备份库，忽略无效配置"""
+    stores = []
+    for entry in entries or ():
+        try:
+            stores.append(BackupStore.from_config(entry, extensions, patterns))
+        except (KeyError, TypeError) as e:
+            logger.warning(f"无效的备份库配置 {entry!r}: {e}")
+    return stores
@@ -0,0 +1,194 @@
+"""
+内容相似度模块
+流式读取文件计算 MinHash 签名，用于在多个候选备份中按内容挑选最接近目标的备份
+安装了 NumPy 时使用向量化实现，否则退回按行分片的纯 Python 实现
+"""
+import hashlib
+import heapq
+import os
+import random
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+from loguru import logger
+
+try:
+    import numpy as np
+except ImportError:  # NumPy 为可选依赖
+    np = None
+
+
+_MASK64 = (1 << 64) - 1
+# 64 位乘法散列常数（黄金分割）
+_MIX = 0x9E3779B97F4A7C15
+# 默认最多读取的字节数，大文件只按开头部分计算签名
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+# 纯 Python 实现最多读取的字节数和保留的分片数（逐分片计算散列较慢）
+PYTHON_MAX_BYTES = 4 * 1024 * 1024
+PYTHON_MAX_SHINGLES = 2048
+# 缓存中表示"文件没有任何分片"的标记
+_NO_SHINGLES = object()
+
+
+class ContentSimilarity:
+    """
+    基于 MinHash 的内容相似度计算器
+    - 分片: NumPy 可用时为 8 字节滑动窗口，否则为按行分片
+    - 采样: 字节窗口分片只保留散列值高 sample_bits 位为 0 的分片（按内容采样，对所有文件一致）；
+      按行分片最多读取 PYTHON_MAX_BYTES 字节，只保留散列值最小的 max_shingles 个分片（bottom-k，对所有文件一致）
+    - 签名按 (path, size, mtime) 缓存，重复扫描时不再读文件
+    - 没有任何分片的文件（过小或未采样到分片）没有签名，不参与内容比较
+    """
+
+    def __init__(self, num_perm: int = 128, sample_bits: int = 3,
+                 chunk_size: int = 1024 * 1024, cache_size: int = 4096,
+                 max_bytes: Optional[int] = DEFAULT_MAX_BYTES,
+                 max_shingles: int = PYTHON_MAX_SHINGLES, seed: int = 1):
+        self.num_perm = num_perm
+        self.sample_bits = sample_bits
+        self.chunk_size = chunk_size
+        self.max_bytes = max_bytes
+        self.max_shingles = max_shingles
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[Tuple[str, int, int], object]" = OrderedDict()
+        # 批量扫描时多个线程共享签名缓存
+        self._lock = threading.Lock()
+        rng = random.Random(seed)
+        # multiply-shift 散列参数，a 取奇数
+        self._a = [rng.getrandbits(64) | 1 for _ in range(num_perm)]
+        self._b = [rng.getrandbits(64) for _ in range(num_perm)]
+        if np is not None:
+            self._np_a = np.array(self._a, dtype=np.uint64)
+            self._np_b = np.array(self._b, dtype=np.uint64)
+
+    @staticmethod
+    def is_vectorized() -> bool:
+        """是否使用 NumPy 向量化实现"""
+        return np is not None
+
+    def signature(self, path: Path):
+        """获取文件的 MinHash 签名，文件不可读或没有分片时返回 None"""
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return None
+        key = (str(path), stat.st_size, stat.st_mtime_ns)
+        with self._lock:
+            cached = self._cache.get(key)
+            if cached is not None:
+                self._cache.move_to_end(key)
+                return None if cached is _NO_SHINGLES else cached
+        try:
+            if np is not None:
+                sig = self._signature_numpy(path)
+            else:
+                sig = self._signature_python(path)
+        except OSError as e:
+            logger.warning(f"计算内容签名失败: {path}, 错误: {e}")
+            return None
+        with self._lock:
+            self._cache[key] = _NO_SHINGLES if sig is None else sig
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return sig
+
+    def similarities(self, target: Path, candidates: Sequence[Path]) -> List[Optional[float]]:
+        """计算目标文件与每个候选文件的内容相似度（MinHash 估计的 Jaccard 系数）"""
+        target_sig = self.signature(target)
+        if target_sig is None:
+            return [None] * len(candidates)
+        sigs = [self.signature(path) for path in candidates]
+        valid = [i for i, sig in enumerate(sigs) if sig is not None]
+        results: List[Optional[float]] = [None] * len(candidates)
+        if not valid:
+            return results
+        if np is not None:
+            matrix = np.vstack([sigs[i] for i in valid])
+            scores = (matrix == target_sig).mean(axis=1)
+            for i, score in zip(valid, scores.tolist()):
+                results[i] = score
+        else:
+            for i in valid:
+                matches = sum(1 for x, y in zip(sigs[i], target_sig) if x == y)
+                results[i] = matches / self.num_perm
+        return results
+
+    def _iter_chunks(self, path: Path, max_bytes: Optional[int] = None):
+        """按块流式读取文件，最多读取 max_bytes 字节（默认为 self.max_bytes）"""
+        remaining = self.max_bytes if max_bytes is None else max_bytes
+        with open(path, 'rb') as f:
+            while remaining is None or remaining > 0:
+                size = self.chunk_size if remaining is None else min(self.chunk_size, remaining)
+                chunk = f.read(size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def _signature_numpy(self, path: Path):
+        """NumPy 实现：8 字节滑动窗口分片，按块向量化计算最小散列，没有分片时返回 None"""
+        sig = np.full(self.num_perm, np.iinfo(np.uint64).max, dtype=np.uint64)
+        seen = False
+        shift = np.uint64(64 - self.sample_bits)
+        tail = b""
+        for chunk in self._iter_chunks(path):
+            data = tail + chunk
+            tail = data[-7:]
+            if len(data) < 8:
+                continue
+            arr = np.frombuffer(data, dtype=np.uint8)
+            windows = np.lib.stride_tricks.sliding_window_view(arr, 8)
+            shingles = np.ascontiguousarray(windows).view('<u8').ravel()
+            with np.errstate(over='ignore'):
+                hashed = shingles * np.uint64(_MIX)
+            if self.sample_bits:
+                hashed = hashed[(hashed >> shift) == 0]
+            if hashed.size == 0:
+                continue
+            hashed = np.unique(hashed)
+            seen = True
+            # 分批计算，避免 (分片数 x num_perm) 矩阵过大
+            for start in range(0, hashed.size, 8192):
+                block = hashed[start:start + 8192, None]
+                with np.errstate(over='ignore'):
+                    permuted = block * self._np_a + self._np_b
+                np.minimum(sig, permuted.min(axis=0), out=sig)
+        return sig if seen else None
+
+    def _signature_python(self, path: Path) -> Optional[Tuple[int, ...]]:
+        """纯 Python 实现：按行分片（行本身已足够粗，不再按位采样），对保留的分片计算最小散列，空文件返回 None"""
+        sampled = self._line_hashes(path)
+        if not sampled:
+            return None
+        sig = [_MASK64] * self.num_perm
+        for i, (a, b) in enumerate(zip(self._a, self._b)):
+            for x in sampled:
+                value = (a * x + b) & _MASK64
+                if value < sig[i]:
+                    sig[i] = value
+        return tuple(sig)
+
+    def _line_hashes(self, path: Path) -> List[int]:
+        """读取文件开头至多 PYTHON_MAX_BYTES 字节，返回散列值最小的 max_shingles 个行分片散列"""
+        max_bytes = PYTHON_MAX_BYTES if self.max_bytes is None else min(self.max_bytes, PYTHON_MAX_BYTES)
+        sampled = set()
+        tail = b""
+
+        def add_lines(lines):
+            for line in lines:
+                sampled.add(int.from_bytes(hashlib.blake2b(line, digest_size=8).digest(), "little"))
+            # 集合超过上限的两倍时裁剪，摊销排序开销
+            if len(sampled) > 2 * self.max_shingles:
+                kept = heapq.nsmallest(self.max_shingles, sampled)
+                sampled.clear()
+                sampled.update(kept)
+
+        for chunk in self._iter_chunks(path, max_bytes):
+            lines = (tail + chunk).split(b"\n")
+            tail = lines.pop()
+            add_lines(lines)
+        if tail:
+            add_lines([tail])
+        return heapq.nsmallest(self.max_shingles, sampled)
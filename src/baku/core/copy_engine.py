@@ -0,0 +1,244 @@
+"""
+文件复制引擎模块
+按 reflink（FICLONE）→ copy_file_range → sendfile → 用户态缓冲复制的顺序尝试，
+尽量让数据留在内核中，不经过 Python 缓冲区
+"""
+import errno
+import os
+import shutil
+import sys
+import threading
+import time
+from pathlib import Path
+from typing import Callable, Optional, Set, Tuple, Union
+from loguru import logger
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+
+# <linux/fs.h>: #define FICLONE _IOW(0x94, 9, int)
+FICLONE = 0x40049409
+
+# 这些错误表示当前方式不适用于这对文件（文件系统/内核不支持），换下一种方式
+_UNSUPPORTED_ERRNOS = {
+    errno.EXDEV, errno.EINVAL, errno.ENOSYS, errno.EOPNOTSUPP, errno.ENOTTY,
+    errno.EBADF, errno.EPERM,
+}
+if hasattr(errno, "ENOTSUP"):
+    _UNSUPPORTED_ERRNOS.add(errno.ENOTSUP)
+
+_IS_LINUX = sys.platform.startswith("linux")
+
+# 进度回调: (已复制字节数, 总字节数)
+ProgressCallback = Callable[[int, int], None]
+
+
+class ProgressThrottle:
+    """
+    字节进度节流器
+    距上次回报至少 min_interval 秒且至少新增 min_bytes 字节时才调用回调，结束时总会回报一次
+    """
+
+    def __init__(self, callback: ProgressCallback, total: int,
+                 min_interval: float = 0.1, min_bytes: int = 4 * 1024 * 1024):
+        self.callback = callback
+        self.total = total
+        self.min_interval = min_interval
+        self.min_bytes = min_bytes
+        self._last_time = time.monotonic()
+        self._last_bytes = 0
+
+    def update(self, copied: int):
+        if copied - self._last_bytes < self.min_bytes:
+            return
+        now = time.monotonic()
+        if now - self._last_time < self.min_interval:
+            return
+        self._last_time = now
+        self._last_bytes = copied
+        self.callback(copied, self.total)
+
+    def finish(self, copied: int):
+        if copied != self._last_bytes or copied == 0:
+            self._last_bytes = copied
+            self.callback(copied, self.total)
+
+
+class CopyEngine:
+    """
+    文件复制引擎
+    - reflink: btrfs/XFS 等支持写时复制的文件系统上只复制元数据
+    - copy_file_range: 内核内复制，部分文件系统（NFS 4.2、XFS 等）可在服务端完成
+    - sendfile: 内核内复制（仅 Linux）
+    - buffer: 以可复用的大缓冲区 readinto/write
+    某个设备组合不支持 reflink 时会记住结果，后续复制不再尝试
+    传入 progress 时内核复制按 chunk_size 分段，以便回报字节进度
+    """
+
+    def __init__(self, buffer_size: int = 8 * 1024 * 1024, chunk_size: int = 64 * 1024 * 1024):
+        self.buffer_size = buffer_size
+        self.chunk_size = chunk_size
+        self._local = threading.local()
+        # 已知不支持 reflink / copy_file_range 的 (源设备, 目标设备)
+        self._no_reflink: Set[Tuple[int, int]] = set()
+        self._no_copy_range: Set[Tuple[int, int]] = set()
+
+    def copy(self, src: Union[str, Path], dst: Union[str, Path],
+             progress: Optional[ProgressCallback] = None) -> str:
+        """
+        复制文件内容和元数据（同 shutil.copy2），返回使用的方式：
+        reflink / copy_file_range / sendfile / buffer
+        progress 为 (已复制字节数, 总字节数) 回调，已节流
+        """
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            size = os.fstat(fsrc.fileno()).st_size
+            throttle = ProgressThrottle(progress, size) if progress is not None else None
+            method = self._copy_fds(fsrc, fdst, size, throttle)
+        if throttle is not None:
+            throttle.finish(size)
+        shutil.copystat(src, dst)
+        return method
+
+    def clone(self, src: Union[str, Path], dst: Union[str, Path]) -> bool:
+        """
+        仅尝试 reflink 克隆（不复制数据），成功时复制元数据并返回 True
+        不支持时删除已创建的 dst 并返回 False
+        """
+        if fcntl is None or not _IS_LINUX:
+            return False
+        with open(src, 'rb') as fsrc, open(dst, 'wb') as fdst:
+            devices = (os.fstat(fsrc.fileno()).st_dev, os.fstat(fdst.fileno()).st_dev)
+            cloned = False
+            if devices not in self._no_reflink:
+                try:
+                    fcntl.ioctl(fdst.fileno(), FICLONE, fsrc.fileno())
+                    cloned = True
+                except OSError as e:
+                    if e.errno not in _UNSUPPORTED_ERRNOS:
+                        raise
+                    self._no_reflink.add(devices)
+        if not cloned:
+            os.unlink(dst)
+            return False
+        shutil.copystat(src, dst)
+        return True
+
+    def _copy_fds(self, fsrc, fdst, size: int, throttle: Optional[ProgressThrottle]) -> str:
+        src_fd = fsrc.fileno()
+        dst_fd = fdst.fileno()
+        devices = (os.fstat(src_fd).st_dev, os.fstat(dst_fd).st_dev)
+
+        if fcntl is not None and _IS_LINUX and devices not in self._no_reflink:
+            try:
+                fcntl.ioctl(dst_fd, FICLONE, src_fd)
+                return "reflink"
+            except OSError as e:
+                if e.errno not in _UNSUPPORTED_ERRNOS:
+                    raise
+                self._no_reflink.add(devices)
+
+        if size > 0 and hasattr(os, "copy_file_range") and devices not in self._no_copy_range:
+            copied = self._copy_range(src_fd, dst_fd, size, throttle)
+            if copied:
+                self._finish_short_copy(fsrc, fdst, copied, size, throttle)
+                return "copy_file_range"
+            self._no_copy_range.add(devices)
+
+        if size > 0 and _IS_LINUX and hasattr(os, "sendfile"):
+            copied = self._sendfile(src_fd, dst_fd, size, throttle)
+            if copied:
+                self._finish_short_copy(fsrc, fdst, copied, size, throttle)
+                return "sendfile"
+
+        self._copy_buffer(fsrc, fdst, throttle)
+        return "buffer"
+
+    @staticmethod
+    def _reset(src_fd: int, dst_fd: int):
+        """回退到下一种方式前，清空已写入的部分"""
+        os.lseek(src_fd, 0, os.SEEK_SET)
+        os.lseek(dst_fd, 0, os.SEEK_SET)
+        os.ftruncate(dst_fd, 0)
+
+    def _finish_short_copy(self, fsrc, fdst, copied: int, size: int,
+                           throttle: Optional[ProgressThrottle]):
+        """内核复制提前返回 0（未到 size）时，从已复制的位置起用缓冲复制补完，避免目标被截断"""
+        if copied >= size:
+            return
+        logger.debug(f"内核复制在 {copied}/{size} 字节处提前结束，改用缓冲复制补完")
+        fsrc.seek(copied)
+        fdst.seek(copied)
+        self._copy_buffer(fsrc, fdst, throttle, copied)
+
+    def _copy_range(self, src_fd: int, dst_fd: int, size: int,
+                    throttle: Optional[ProgressThrottle] = None) -> int:
+        """copy_file_range 复制，返回已复制字节数；不支持（或未复制任何数据）时返回 0"""
+        offset = 0
+        step = self.chunk_size if throttle is not None else size
+        try:
+            while offset < size:
+                copied = os.copy_file_range(src_fd, dst_fd, min(size - offset, step), offset, offset)
+                if copied == 0:
+                    break
+                offset += copied
+                if throttle is not None:
+                    throttle.update(offset)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug(f"copy_file_range 不可用，改用下一种方式: {e}")
+            self._reset(src_fd, dst_fd)
+            return 0
+        if offset == 0:
+            # 某些文件系统（如 procfs 类）返回 0 而不复制
+            self._reset(src_fd, dst_fd)
+        return offset
+
+    def _sendfile(self, src_fd: int, dst_fd: int, size: int,
+                  throttle: Optional[ProgressThrottle] = None) -> int:
+        """sendfile 复制，返回已复制字节数；不支持（或未复制任何数据）时返回 0"""
+        offset = 0
+        step = self.chunk_size if throttle is not None else 1 << 30
+        try:
+            while offset < size:
+                sent = os.sendfile(dst_fd, src_fd, offset, min(size - offset, step))
+                if sent == 0:
+                    break
+                offset += sent
+                if throttle is not None:
+                    throttle.update(offset)
+        except OSError as e:
+            if e.errno not in _UNSUPPORTED_ERRNOS:
+                raise
+            logger.debug(f"sendfile 不可用，改用缓冲复制: {e}")
+            self._reset(src_fd, dst_fd)
+            return 0
+        if offset == 0:
+            self._reset(src_fd, dst_fd)
+        return offset
+
+    def _buffer(self) -> memoryview:
+        """线程内复用的复制缓冲区"""
+        buf = getattr(self._local, "buffer", None)
+        if buf is None or len(buf) != self.buffer_size:
+            buf = memoryview(bytearray(self.buffer_size))
+            self._local.buffer = buf
+        return buf
+
+    def _copy_buffer(self, fsrc, fdst, throttle: Optional[ProgressThrottle] = None,
+                     copied: int = 0):
+        """用户态缓冲复制（从两个文件的当前位置开始，copied 为已复制的字节数，用于进度）"""
+        buf = self._buffer()
+        readinto = fsrc.readinto
+        write = fdst.write
+        while True:
+            n = readinto(buf)
+            if not n:
+                break
+            write(buf[:n])
+            if throttle is not None:
+                copied += n
+                throttle.update(copied)
@@ -0,0 +1,254 @@
+"""
+目录列表缓存模块
+为 BackupFinder 缓存目录中的备份文件列表，避免批量查找时重复列目录
+"""
+import os
+import threading
+from collections import OrderedDict
+from pathlib import Path
+from typing import TYPE_CHECKING, FrozenSet, Iterable, List, Optional, Sequence, Set, Tuple
+
+if TYPE_CHECKING:
+    from baku.core.backup_index import BackupIndex
+
+
+# 实时监听模式下缓存条目不依赖目录 mtime，用该值标记
+_LIVE_MTIME = -1
+
+
+class DirListing:
+    """单个目录的备份文件列表快照"""
+
+    __slots__ = ("mtime_ns", "names", "name_set", "ngram_index")
+
+    def __init__(self, mtime_ns: int, names: Tuple[str, ...]):
+        self.mtime_ns = mtime_ns
+        # 按目录遍历顺序保存的备份文件名
+        self.names = names
+        self.name_set: FrozenSet[str] = frozenset(names)
+        # 由 BackupRanker 按需建立的文件名 n-gram 索引
+        self.ngram_index = None
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.name_set
+
+
+class DirListingCache:
+    """
+    目录列表 LRU 缓存
+    - 以目录路径为键
+    - 以目录 mtime 判断是否失效
+    - 超过 max_entries 时淘汰最久未使用的目录
+    - 设置了 index 时，未命中缓存的目录先查持久化索引，索引过期再列目录
+    """
+
+    def __init__(self, extensions: Iterable[str], max_entries: int = 1024,
+                 index: Optional["BackupIndex"] = None):
+        self.extensions = tuple(extensions)
+        self.max_entries = max(1, int(max_entries))
+        self.index = index
+        # 由实时监听维护的根目录，这些目录下直接信任索引，不再 stat 校验
+        self.live_roots: Tuple[str, ...] = ()
+        self._entries: "OrderedDict[str, DirListing]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, directory: Path) -> Optional[DirListing]:
+        """获取目录的备份文件列表，目录不存在或不可读时返回 None"""
+        key = str(directory)
+        if self.live_roots and self.index is not None:
+            listing = self._get_live(key)
+            if listing is not None:
+                return listing
+        try:
+            mtime_ns = os.stat(key).st_mtime_ns
+        except OSError:
+            self.invalidate(directory)
+            return None
+        with self._lock:
+            listing = self._entries.get(key)
+            if listing is not None and listing.mtime_ns == mtime_ns:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return listing
+            self.misses += 1
+        names = None
+        if self.index is not None:
+            names = self.index.get_listing(os.path.abspath(key), mtime_ns)
+        if names is None:
+            names = self._list_backup_names(directory)
+        if names is None:
+            self.invalidate(directory)
+            return None
+        listing = DirListing(mtime_ns, names)
+        self._store(key, listing)
+        return listing
+
+    def _get_live(self, key: str) -> Optional[DirListing]:
+        """
+        实时监听模式：监听根目录下的目录直接从内存缓存或索引回答，不访问磁盘
+        目录尚未进入索引时返回 None，由调用方走常规路径
+        """
+        abs_key = os.path.abspath(key)
+        if not any(abs_key == root or abs_key.startswith(root + os.sep)
+                   for root in self.live_roots):
+            return None
+        with self._lock:
+            listing = self._entries.get(key)
+            if listing is not None and listing.mtime_ns == _LIVE_MTIME:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return listing
+            self.misses += 1
+        names = self.index.get_listing(abs_key)
+        if names is None:
+            return None
+        listing = DirListing(_LIVE_MTIME, names)
+        self._store(key, listing)
+        return listing
+
+    def _store(self, key: str, listing: DirListing):
+        """写入缓存并按 LRU 淘汰"""
+        with self._lock:
+            self._entries[key] = listing
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, directory: Optional[Path] = None):
+        """使指定目录（或全部）缓存失效"""
+        with self._lock:
+            if directory is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(str(directory), None)
+
+    def invalidate_many(self, directories: Iterable[str], trees: Iterable[str] = ()):
+        """
+        批量使目录缓存失效（按绝对路径匹配）
+        trees 中的目录（被移动、删除或重新扫描的目录树）连同其下所有子目录一起失效
+        """
+        targets = {os.path.abspath(directory) for directory in directories}
+        tree_roots = {os.path.abspath(tree) for tree in trees}
+        if not targets and not tree_roots:
+            return
+        with self._lock:
+            stale = []
+            for key in self._entries:
+                path = os.path.abspath(key)
+                if path in targets or _is_under(path, tree_roots):
+                    stale.append(key)
+            for key in stale:
+                del self._entries[key]
+
+    def _list_backup_names(self, directory: Path) -> Optional[Tuple[str, ...]]:
+        """
+        列出目录中后缀属于备份扩展名的文件（单次 scandir）
+        直接在原始文件名字符串上判断后缀，并复用 DirEntry 自带的类型信息，
+        非备份条目不会构造 Path 也不会额外 stat
+        """
+        extensions = self.extensions
+        names = []
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    name = entry.name
+                    # rfind > 0 排除 ".bak" 这类只有前导点的隐藏文件，与 Path.suffix 语义一致
+                    if not name.endswith(extensions) or name.rfind('.') <= 0:
+                        continue
+                    try:
+                        if entry.is_file(follow_symlinks=False):
+                            names.append(name)
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        return tuple(names)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class NegativeCache:
+    """
+    未找到备份的查找结果缓存
+    - 以起始目录为键（同一目录下的文件回溯的是同一组目录，结果相同）
+    - 记录回溯查找过的每个目录及其 mtime，再次查找时只需逐个 stat 校验
+    - 任一目录 mtime 变化（或目录出现/消失）即失效
+    - 实时监听模式下的目录不 stat，由监听回调 invalidate_many 失效
+    """
+
+    def __init__(self, max_entries: int = 4096):
+        self.max_entries = max(1, int(max_entries))
+        self._entries: "OrderedDict[str, Tuple[Tuple[str, Optional[int]], ...]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+
+    def check(self, start_dir: Path) -> bool:
+        """起始目录是否有仍然有效的"未找到"记录"""
+        key = str(start_dir)
+        with self._lock:
+            searched = self._entries.get(key)
+        if searched is None:
+            return False
+        for directory, mtime_ns in searched:
+            if mtime_ns == _LIVE_MTIME:
+                continue
+            try:
+                current = os.stat(directory).st_mtime_ns
+            except OSError:
+                current = None
+            if current != mtime_ns:
+                with self._lock:
+                    self._entries.pop(key, None)
+                return False
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+            self.hits += 1
+        return True
+
+    def add(self, start_dir: Path, searched: Sequence[Tuple[str, Optional[int]]]):
+        """记录一次未找到备份的查找，searched 为 (目录, mtime_ns) 列表，目录不存在时 mtime_ns 为 None"""
+        with self._lock:
+            self._entries[str(start_dir)] = tuple(searched)
+            self._entries.move_to_end(str(start_dir))
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def invalidate(self):
+        """清空缓存"""
+        with self._lock:
+            self._entries.clear()
+
+    def invalidate_many(self, directories: Iterable[str], trees: Iterable[str] = ()):
+        """
+        移除查找路径中包含任一变化目录的记录（按绝对路径匹配）
+        trees 中的目录按前缀匹配，其下任一子目录出现在查找路径中的记录都会移除
+        """
+        changed = {os.path.abspath(directory) for directory in directories}
+        tree_roots = {os.path.abspath(tree) for tree in trees}
+        if not changed and not tree_roots:
+            return
+        with self._lock:
+            stale: List[str] = [
+                key for key, searched in self._entries.items()
+                if any(path in changed or _is_under(path, tree_roots)
+                       for path in (os.path.abspath(directory) for directory, _ in searched))
+            ]
+            for key in stale:
+                del self._entries[key]
+
+
+def _is_under(path: str, roots: Set[str]) -> bool:
+    """path 是否为 roots 中某个目录本身或其子孙（path 须为绝对路径）"""
+    if not roots:
+        return False
+    while True:
+        if path in roots:
+            return True
+        parent = os.path.dirname(path)
+        if parent == path:
+            return False
+        path = parent
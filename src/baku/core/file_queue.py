@@ -1,14 +1,24 @@
 """
 文件队列核心数据结构
 CLI和Web界面共用的文件队列管理
+文件项和备份信息使用 __slots__ 紧凑表示：路径拆成驻留的父目录字符串和文件名，
+时间以浮点时间戳保存，Path / datetime / size_str 在访问时生成
 """
+import math
+import os
+import sys
+import threading
+import time
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Iterator, Optional, Tuple, Union
 from datetime import datetime
-from dataclasses import dataclass, field
 from enum import Enum
 import json
 from loguru import logger
+from baku.config.config import load_baku_config
+from baku.core.queue_journal import QueueJournal
+from baku.core import queue_snapshot
+from baku.core.queue_snapshot import BinarySnapshot
 
 
 class FileStatus(Enum):
@@ -20,16 +30,90 @@ class FileStatus(Enum):
     CANCELLED = "cancelled"
 
 
-@dataclass
+PathLike = Union[str, Path]
+TimeLike = Union[datetime, float, int]
+
+
+def format_file_size(size_bytes: int) -> str:
+    """格式化文件大小"""
+    if size_bytes == 0:
+        return "0 B"
+    
+    size_names = ["B", "KB", "MB", "GB", "TB"]
+    i = int(math.floor(math.log(size_bytes, 1024)))
+    p = math.pow(1024, i)
+    s = round(size_bytes / p, 2)
+    return f"{s} {size_names[i]}"
+
+
+def _split_path(path: Optional[PathLike]) -> Tuple[Optional[str], Optional[str]]:
+    """拆分为 (驻留的父目录, 文件名)，同一目录下的大量文件共享一个父目录字符串"""
+    if path is None:
+        return None, None
+    directory, base = os.path.split(os.fspath(path))
+    return sys.intern(directory), base
+
+
+def _join_path(directory: Optional[str], base: Optional[str]) -> Optional[Path]:
+    if base is None:
+        return None
+    return Path(directory, base) if directory else Path(base)
+
+
+def _to_timestamp(value: Optional[TimeLike]) -> Optional[float]:
+    if value is None:
+        return None
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value)
+
+
+def _to_datetime(timestamp: Optional[float]) -> Optional[datetime]:
+    return datetime.fromtimestamp(timestamp) if timestamp is not None else None
+
+
 class BackupInfo:
     """备份文件信息"""
-    path: Path
-    name: str
-    size: int
-    size_str: str
-    modified: datetime
-    similarity: float
-    file_type: str
+    
+    __slots__ = ("_dir", "_base", "name", "size", "_modified", "similarity", "file_type")
+    
+    def __init__(self, path: PathLike, name: str, size: int, modified: TimeLike,
+                 similarity: float, file_type: str, size_str: Optional[str] = None):
+        # size_str 由 size 按需生成，参数仅为兼容旧调用保留
+        self._dir, self._base = _split_path(path)
+        # 名称通常就是文件名，共用同一个字符串
+        self.name = self._base if name == self._base else name
+        self.size = size
+        self._modified = _to_timestamp(modified)
+        self.similarity = similarity
+        self.file_type = file_type
+    
+    @property
+    def path(self) -> Path:
+        return _join_path(self._dir, self._base)
+    
+    @path.setter
+    def path(self, value: PathLike):
+        self._dir, self._base = _split_path(value)
+    
+    @property
+    def size_str(self) -> str:
+        return format_file_size(self.size)
+    
+    @property
+    def modified(self) -> datetime:
+        return _to_datetime(self._modified)
+    
+    @modified.setter
+    def modified(self, value: TimeLike):
+        self._modified = _to_timestamp(value)
+    
+    @property
+    def modified_timestamp(self) -> float:
+        return self._modified
+    
+    def __repr__(self) -> str:
+        return f"BackupInfo(path={self.path!r}, size={self.size}, similarity={self.similarity})"
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
@@ -47,170 +131,447 @@ class BackupInfo:
     def from_dict(cls, data: Dict[str, Any]) -> 'BackupInfo':
         """从字典创建"""
         return cls(
-            path=Path(data['path']),
+            path=data['path'],
             name=data['name'],
             size=data['size'],
-            size_str=data['size_str'],
             modified=datetime.fromisoformat(data['modified']),
             similarity=data['similarity'],
             file_type=data['file_type']
         )
 
 
-@dataclass
 class FileQueueItem:
-    """文件队列项"""
-    id: str
-    name: str
-    path: Optional[Path]
-    size: int
-    status: FileStatus
-    progress: float = 0.0
-    message: str = ""
-    backup_files: List[BackupInfo] = field(default_factory=list)
-    selected_backup: Optional[Path] = None
-    added_time: Optional[datetime] = None
-    last_modified: Optional[datetime] = None
-    
-    def __post_init__(self):
-        if self.added_time is None:
-            self.added_time = datetime.now()
-        if self.last_modified is None:
-            self.last_modified = self.added_time
+    """
+    文件队列项
+    状态变化（update_status 或直接给 status 赋值）时通知所属队列更新计数，
+    message、路径和备份信息变化时通知队列记录变更
+    """
+    
+    __slots__ = ("id", "name", "_dir", "_base", "size", "_status", "progress", "_message",
+                 "_backup_files", "_selected_dir", "_selected_base",
+                 "_added_time", "_last_modified", "_queue", "__weakref__")
+    
+    def __init__(self, id: str, name: str, path: Optional[PathLike], size: int,
+                 status: FileStatus, progress: float = 0.0, message: str = "",
+                 backup_files: Optional[List[BackupInfo]] = None,
+                 selected_backup: Optional[PathLike] = None,
+                 added_time: Optional[TimeLike] = None,
+                 last_modified: Optional[TimeLike] = None):
+        self._queue = None
+        self.id = id
+        self._dir, self._base = _split_path(path)
+        self.name = self._base if name == self._base else name
+        self.size = size
+        self._status = status
+        self.progress = progress
+        self.message = message
+        # 没有备份时不分配列表
+        self._backup_files = backup_files or None
+        self._selected_dir, self._selected_base = _split_path(selected_backup)
+        self._added_time = _to_timestamp(added_time)
+        if self._added_time is None:
+            self._added_time = time.time()
+        self._last_modified = _to_timestamp(last_modified)
+        if self._last_modified is None:
+            self._last_modified = self._added_time
+    
+    @property
+    def path(self) -> Optional[Path]:
+        return _join_path(self._dir, self._base)
+    
+    @path.setter
+    def path(self, value: Optional[PathLike]):
+        self._dir, self._base = _split_path(value)
+        if self._queue is not None:
+            self._queue._mark(self.id, 'path')
+    
+    @property
+    def status(self) -> FileStatus:
+        return self._status
+    
+    @status.setter
+    def status(self, status: FileStatus):
+        if self._queue is not None:
+            self._queue._set_status(self, status)
+        else:
+            self._status = status
+    
+    @property
+    def message(self) -> str:
+        return self._message
+    
+    @message.setter
+    def message(self, message: str):
+        self._message = message
+        if self._queue is not None:
+            self._queue._mark(self.id, 'status')
+    
+    @property
+    def backup_files(self) -> List[BackupInfo]:
+        if self._backup_files is None:
+            self._backup_files = []
+        return self._backup_files
+    
+    @backup_files.setter
+    def backup_files(self, backups: List[BackupInfo]):
+        self._backup_files = backups
+        if self._queue is not None:
+            self._queue._mark(self.id, 'backups')
+    
+    @property
+    def has_backups(self) -> bool:
+        """是否有备份（不分配空列表）"""
+        return bool(self._backup_files)
+    
+    @property
+    def selected_backup(self) -> Optional[Path]:
+        return _join_path(self._selected_dir, self._selected_base)
+    
+    @selected_backup.setter
+    def selected_backup(self, value: Optional[PathLike]):
+        self._selected_dir, self._selected_base = _split_path(value)
+        # 选中的通常是备份列表中的某一项，共用其文件名字符串
+        for backup in self._backup_files or ():
+            if backup._base == self._selected_base and backup._dir == self._selected_dir:
+                self._selected_base = backup._base
+                break
+        if self._queue is not None:
+            self._queue._mark(self.id, 'select')
+    
+    @property
+    def added_time(self) -> datetime:
+        return _to_datetime(self._added_time)
+    
+    @added_time.setter
+    def added_time(self, value: Optional[TimeLike]):
+        self._added_time = _to_timestamp(value)
+    
+    @property
+    def last_modified(self) -> datetime:
+        return _to_datetime(self._last_modified)
+    
+    @last_modified.setter
+    def last_modified(self, value: Optional[TimeLike]):
+        self._last_modified = _to_timestamp(value)
+    
+    def __repr__(self) -> str:
+        return f"FileQueueItem(id={self.id!r}, path={self.path!r}, status={self._status})"
     
     def update_status(self, status: FileStatus, message: str = ""):
         """更新状态"""
         self.status = status
         self.message = message
-        self.last_modified = datetime.now()
+        self._last_modified = time.time()
     
     def add_backup(self, backup_info: BackupInfo):
         """添加备份信息"""
         self.backup_files.append(backup_info)
-        self.last_modified = datetime.now()
+        self._last_modified = time.time()
+        if self._queue is not None:
+            self._queue._mark(self.id, 'backups')
     
     def set_selected_backup(self, backup_path: Path):
         """设置选中的备份"""
         self.selected_backup = backup_path
-        self.last_modified = datetime.now()
+        self._last_modified = time.time()
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典（用于序列化）"""
         return {
             'id': self.id,
             'name': self.name,
-            'path': str(self.path) if self.path else None,
+            'path': str(self.path) if self._base is not None else None,
             'size': self.size,
-            'status': self.status.value,
+            'status': self._status.value,
             'progress': self.progress,
-            'message': self.message,
-            'backup_files': [backup.to_dict() for backup in self.backup_files],
-            'selected_backup': str(self.selected_backup) if self.selected_backup else None,
-            'added_time': self.added_time.isoformat() if self.added_time else None,
-            'last_modified': self.last_modified.isoformat() if self.last_modified else None
+            'message': self._message,
+            'backup_files': [backup.to_dict() for backup in self._backup_files or ()],
+            'selected_backup': str(self.selected_backup) if self._selected_base is not None else None,
+            'added_time': self.added_time.isoformat() if self._added_time is not None else None,
+            'last_modified': self.last_modified.isoformat() if self._last_modified is not None else None
         }
     
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'FileQueueItem':
         """从字典创建（用于反序列化）"""
-        item = cls(
+        return cls(
             id=data['id'],
             name=data['name'],
-            path=Path(data['path']) if data['path'] else None,
+            path=data['path'],
             size=data['size'],
             status=FileStatus(data['status']),
             progress=data.get('progress', 0.0),
             message=data.get('message', ''),
-            selected_backup=Path(data['selected_backup']) if data['selected_backup'] else None,
+            backup_files=[
+                BackupInfo.from_dict(backup_data)
+                for backup_data in data.get('backup_files', [])
+            ],
+            selected_backup=data['selected_backup'],
             added_time=datetime.fromisoformat(data['added_time']) if data['added_time'] else None,
             last_modified=datetime.fromisoformat(data['last_modified']) if data['last_modified'] else None
         )
-        
-        # 恢复备份文件列表
-        item.backup_files = [
-            BackupInfo.from_dict(backup_data) 
-            for backup_data in data.get('backup_files', [])
-        ]
-        
-        return item
 
 
 class FileQueue:
-    """文件队列管理器"""
-    
-    def __init__(self):
-        self.items: List[FileQueueItem] = []
-        self._stats = {
-            'total': 0,
-            'pending': 0,
-            'processing': 0,
-            'completed': 0,
-            'error': 0,
-            'cancelled': 0
-        }
+    """
+    文件队列管理器
+    以按插入顺序排列的 id -> 文件项字典保存队列，并维护各状态计数：
+    add_item / get_item / remove_item / get_stats 均为 O(1)，
+    文件项状态变化（update_status 或直接赋值）时由文件项通知队列更新计数；
+    状态可能在工作线程中修改，计数和变更记录在 _lock 内更新
+    journal 为 True（默认取配置项 queue_journal）时使用日志持久化：
+    save_to_file 只追加自上次保存以来的变更（NDJSON），日志过长时重新写快照
+    文件名以 .bakq 结尾时快照使用二进制格式（见 queue_snapshot），加载时 mmap 文件：
+    统计直接取自快照头部，id 索引在第一次按 id 访问时建立，文件项在第一次访问时解码
+    """
+    
+    # iter_item_pages 默认每页的文件项数
+    PAGE_SIZE = 1000
+    
+    def __init__(self, journal: Optional[bool] = None):
+        # 值为尚未解码的快照记录序号（int）或已解码的文件项
+        self._index: Dict[str, Union[FileQueueItem, int]] = {}
+        self._counts: Dict[FileStatus, int] = {status: 0 for status in FileStatus}
+        self._lock = threading.RLock()
+        config = load_baku_config()
+        self.journal_mode = config.get('queue_journal', False) if journal is None else journal
+        self.journal_compact_records = config.get('queue_journal_compact_records', 10000)
+        # 当前绑定的日志（第一次保存或加载后才有），以及自上次保存以来变化的文件项
+        self._journal: Optional[QueueJournal] = None
+        self._dirty: Dict[str, set] = {}
+        self._needs_snapshot = False
+        # 懒加载的二进制快照；_index_pending 为 True 时 _index 尚未建立
+        self._snapshot: Optional[BinarySnapshot] = None
+        self._index_pending = False
+    
+    @property
+    def items(self) -> List[FileQueueItem]:
+        """按加入顺序排列的文件项列表（快照）"""
+        if self._snapshot is None:
+            return list(self._index.values())
+        return self._select(lambda flags: True)
+    
+    @items.setter
+    def items(self, items: List[FileQueueItem]):
+        self.clear()
+        for item in items:
+            self.add_item(item)
+    
+    def __len__(self) -> int:
+        if self._index_pending:
+            return self._snapshot.count
+        return len(self._index)
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self._ensure_index()
+    
+    def _ensure_index(self) -> Dict[str, Union[FileQueueItem, int]]:
+        """第一次需要 id 索引时由快照的 id 列建立（不解码记录）"""
+        if self._index_pending:
+            self._index = dict(zip(self._snapshot.ids(), range(self._snapshot.count)))
+            self._index_pending = False
+        return self._index
+    
+    def _resolve(self, item_id: str, value: Union[FileQueueItem, int]) -> FileQueueItem:
+        """解码快照中的第 value 条记录并替换索引中的序号"""
+        if value.__class__ is not int:
+            return value
+        item = FileQueueItem.from_dict(self._snapshot.decode(value))
+        item._queue = self
+        self._index[item_id] = item
+        return item
+    
+    def _select(self, match) -> List[FileQueueItem]:
+        """
+        按顺序返回满足条件的文件项，match 接收 flags（见 _item_flags）
+        未解码的记录先用快照的 flags 列过滤，只解码匹配的记录
+        """
+        index = self._ensure_index()
+        if self._snapshot is None:
+            return [item for item in index.values() if match(_item_flags(item))]
+        flags_of = self._snapshot.flags
+        result = []
+        for item_id, value in list(index.items()):
+            if value.__class__ is int:
+                if match(flags_of(value)):
+                    result.append(self._resolve(item_id, value))
+            elif match(_item_flags(value)):
+                result.append(value)
+        return result
     
     def add_item(self, item: FileQueueItem) -> bool:
         """添加文件项"""
-        # 检查是否已存在
-        if self.get_item(item.id):
-            return False
-        
-        self.items.append(item)
-        self._update_stats()
-        return True
+        with self._lock:
+            # 检查是否已存在
+            if item.id in self._ensure_index():
+                return False
+            
+            self._index[item.id] = item
+            self._counts[item.status] += 1
+            item._queue = self
+            self._mark(item.id, 'add')
+            return True
     
     def get_item(self, item_id: str) -> Optional[FileQueueItem]:
         """获取文件项"""
-        for item in self.items:
-            if item.id == item_id:
-                return item
-        return None
+        with self._lock:
+            value = self._ensure_index().get(item_id)
+            if value is None:
+                return None
+            return self._resolve(item_id, value)
     
     def remove_item(self, item_id: str) -> bool:
         """移除文件项"""
-        original_count = len(self.items)
-        self.items = [item for item in self.items if item.id != item_id]
-        
-        if len(self.items) < original_count:
-            self._update_stats()
+        with self._lock:
+            item = self._ensure_index().pop(item_id, None)
+            if item is None:
+                return False
+            if item.__class__ is int:
+                # 未解码的记录按 flags 列更新计数
+                self._counts[_STATUSES[self._snapshot.flags(item) & queue_snapshot.STATUS_MASK]] -= 1
+            else:
+                self._counts[item.status] -= 1
+                item._queue = None
+            self._mark(item_id, 'remove')
             return True
-        return False
     
     def clear(self):
         """清空队列"""
-        self.items.clear()
-        self._update_stats()
+        with self._lock:
+            for item in self._index.values():
+                if item.__class__ is not int:
+                    item._queue = None
+            self._index = {}
+            self._close_snapshot()
+            self._counts = {status: 0 for status in FileStatus}
+            if self._journal is not None:
+                # 清空后重写快照比逐条记录更省
+                self._needs_snapshot = True
+                self._dirty = {}
+    
+    def _set_status(self, item: FileQueueItem, status: FileStatus):
+        """在队列锁内切换文件项状态，读取旧状态、更新计数和记录变更不会与其他线程交错"""
+        with self._lock:
+            old = item._status
+            item._status = status
+            self._on_status_change(item.id, old, status)
+    
+    def _on_status_change(self, item_id: str, old: Optional[FileStatus], new: FileStatus):
+        """文件项状态变化时更新计数（调用方持有 _lock）"""
+        if old is new:
+            return
+        if old is not None:
+            self._counts[old] -= 1
+        self._counts[new] += 1
+        self._mark(item_id, 'status')
+    
+    def _mark(self, item_id: str, kind: str):
+        """
+        记录文件项变化（仅日志模式）
+        kind: add / remove / status / select / backups / path；
+        add、remove 覆盖之前的变化并移到末尾，保证重放后的顺序与队列一致
+        """
+        if self._journal is None or self._needs_snapshot:
+            return
+        with self._lock:
+            if kind in ('add', 'remove'):
+                self._dirty.pop(item_id, None)
+                self._dirty[item_id] = {kind}
+                return
+            kinds = self._dirty.get(item_id)
+            if kinds is None:
+                self._dirty[item_id] = {kind}
+            elif 'add' not in kinds:
+                kinds.add(kind)
+    
+    def _journal_records(self) -> List[Dict[str, Any]]:
+        """按当前状态生成自上次保存以来的变更记录"""
+        records = []
+        for item_id, kinds in self._dirty.items():
+            if 'remove' in kinds:
+                records.append({'op': 'remove', 'id': item_id})
+                continue
+            item = self.get_item(item_id)
+            if item is None:
+                continue
+            if 'add' in kinds:
+                records.append({'op': 'add', 'item': item.to_dict()})
+                continue
+            if 'path' in kinds:
+                path = item.path
+                records.append({'op': 'path', 'id': item_id, 'path': str(path) if path else None})
+            if 'backups' in kinds:
+                records.append({'op': 'backups', 'id': item_id,
+                                'backups': [backup.to_dict() for backup in item.backup_files]})
+            if 'select' in kinds:
+                backup = item.selected_backup
+                records.append({'op': 'select', 'id': item_id, 'backup': str(backup) if backup else None})
+            if 'status' in kinds:
+                records.append({'op': 'status', 'id': item_id, 'status': item.status.value,
+                                'message': item.message, 'last_modified': item._last_modified})
+        return records
+    
+    def _apply_record(self, record: Dict[str, Any]):
+        """重放一条日志记录"""
+        op = record.get('op')
+        if op == 'add':
+            item = FileQueueItem.from_dict(record['item'])
+            self.remove_item(item.id)
+            self.add_item(item)
+            return
+        if op == 'remove':
+            self.remove_item(record['id'])
+            return
+        item = self.get_item(record.get('id'))
+        if item is None:
+            return
+        if op == 'status':
+            item.status = FileStatus(record['status'])
+            item.message = record.get('message', '')
+            item.last_modified = record.get('last_modified')
+        elif op == 'select':
+            item.selected_backup = record.get('backup')
+        elif op == 'backups':
+            item.backup_files = [BackupInfo.from_dict(backup) for backup in record.get('backups', [])]
+        elif op == 'path':
+            item.path = record.get('path')
     
     def get_items_by_status(self, status: FileStatus) -> List[FileQueueItem]:
         """按状态获取文件项"""
-        return [item for item in self.items if item.status == status]
+        if not self._counts[status]:
+            return []
+        code = _STATUS_CODES[status]
+        return self._select(lambda flags: flags & queue_snapshot.STATUS_MASK == code)
+    
+    def iter_item_pages(self, status: Optional[FileStatus] = None,
+                        page_size: Optional[int] = None) -> Iterator[List[FileQueueItem]]:
+        """
+        按加入顺序分页产出文件项（status 不为 None 时只包含该状态的项）
+        批量处理时逐页取用，SQLiteFileQueue 只在内存中保留当前页
+        """
+        page_size = page_size or self.PAGE_SIZE
+        items = self.items if status is None else self.get_items_by_status(status)
+        for start in range(0, len(items), page_size):
+            yield items[start:start + page_size]
     
     def get_items_with_backups(self) -> List[FileQueueItem]:
         """获取有备份文件的项"""
-        return [item for item in self.items if item.backup_files]
+        return self._select(lambda flags: flags & queue_snapshot.FLAG_BACKUPS)
     
     def get_restorable_items(self) -> List[FileQueueItem]:
         """获取可恢复的文件项"""
-        return [
-            item for item in self.items 
-            if item.backup_files and item.selected_backup
-        ]
-    
-    def _update_stats(self):
-        """更新统计信息"""
-        self._stats = {
-            'total': len(self.items),
-            'pending': len(self.get_items_by_status(FileStatus.PENDING)),
-            'processing': len(self.get_items_by_status(FileStatus.PROCESSING)),
-            'completed': len(self.get_items_by_status(FileStatus.COMPLETED)),
-            'error': len(self.get_items_by_status(FileStatus.ERROR)),
-            'cancelled': len(self.get_items_by_status(FileStatus.CANCELLED))
-        }
+        restorable = queue_snapshot.FLAG_BACKUPS | queue_snapshot.FLAG_SELECTED
+        return self._select(lambda flags: flags & restorable == restorable)
     
     def get_stats(self) -> Dict[str, int]:
         """获取统计信息"""
-        self._update_stats()
-        return self._stats.copy()
+        stats = {'total': len(self)}
+        for status in FileStatus:
+            stats[status.value] = self._counts[status]
+        return stats
     
     def get_total_size(self) -> int:
         """获取总文件大小"""
@@ -229,37 +590,119 @@ class FileQueue:
         """从JSON导入"""
         try:
             data = json.loads(json_str)
-            self.items = [
+            items = [
                 FileQueueItem.from_dict(item_data) 
                 for item_data in data.get('items', [])
             ]
-            self._update_stats()
+            self.items = items
             return True
         except Exception:
             return False
     
     def save_to_file(self, file_path: Path) -> bool:
-        """保存到文件"""
+        """
+        保存到文件
+        日志模式下第一次保存（或换了文件、清空过队列）写完整快照，
+        之后只向 <file>.log 追加变更，日志记录数超过阈值时重写快照
+        """
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(self.to_json())
+            if not self.journal_mode:
+                if queue_snapshot.is_binary_path(file_path):
+                    self.write_binary_snapshot(Path(file_path), {})
+                else:
+                    with open(file_path, 'w', encoding='utf-8') as f:
+                        f.write(self.to_json())
+                return True
+            # 保存期间工作线程的状态变化等待写完，避免漏记或记在已写出的快照之后
+            with self._lock:
+                journal = self._journal
+                if (journal is None or self._needs_snapshot
+                        or os.path.abspath(journal.path) != os.path.abspath(file_path)):
+                    journal = QueueJournal(Path(file_path), self.journal_compact_records)
+                    journal.write_snapshot(self)
+                    self._journal = journal
+                else:
+                    journal.append(self._journal_records())
+                    if journal.needs_compaction(len(self)):
+                        logger.debug(f"队列日志已有 {journal.log_records} 条记录，重写快照")
+                        journal.write_snapshot(self)
+                self._dirty = {}
+                self._needs_snapshot = False
             return True
-        except Exception:
+        except Exception as e:
+            logger.error(f"保存队列失败: {file_path}, 错误: {e}")
             return False
     
+    def write_binary_snapshot(self, file_path: Path, header: Dict[str, Any]):
+        """
+        写入二进制快照，header 为附加的头部字段
+        未解码的记录按原始字节复制，不经过解码和重新编码
+        """
+        snapshot = self._snapshot
+        if snapshot is not None and os.name == 'nt' and os.path.abspath(snapshot.path) == os.path.abspath(file_path):
+            # Windows 下不能替换仍被映射的文件：先全部解码再关闭映射
+            self._select(lambda flags: True)
+            self._close_snapshot()
+            snapshot = None
+        index = self._ensure_index()
+        
+        def rows():
+            for item_id, value in index.items():
+                if value.__class__ is int:
+                    yield item_id, snapshot.flags(value), snapshot.record(value)
+                else:
+                    record = json.dumps(value.to_dict(), ensure_ascii=False, separators=(',', ':'))
+                    yield item_id, _item_flags(value), record.encode('utf-8')
+        
+        header = dict(header, stats=self.get_stats(), exported_at=datetime.now().isoformat())
+        queue_snapshot.write_snapshot(file_path, header, rows())
+    
+    def _load_binary_snapshot(self, snapshot: BinarySnapshot):
+        """以懒加载方式载入二进制快照：只读取头部中的统计"""
+        self.clear()
+        self._snapshot = snapshot
+        self._index_pending = True
+        stats = snapshot.header.get('stats', {})
+        self._counts = {status: stats.get(status.value, 0) for status in FileStatus}
+    
+    def _close_snapshot(self):
+        """关闭快照映射（调用前未解码的记录须已不再需要）"""
+        if self._snapshot is not None:
+            self._snapshot.close()
+            self._snapshot = None
+        self._index_pending = False
+    
     def load_from_file(self, file_path: Path) -> bool:
-        """从文件加载"""
+        """从文件加载（快照存在对应的 .log 日志时一并重放）"""
         try:
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return self.from_json(f.read())
-        except Exception:
+            self._journal = None
+            snapshot = queue_snapshot.open_snapshot(file_path)
+            if snapshot is not None:
+                data = snapshot.header
+                self._load_binary_snapshot(snapshot)
+            else:
+                with open(file_path, 'r', encoding='utf-8') as f:
+                    data = json.load(f)
+                self.items = [FileQueueItem.from_dict(item_data) for item_data in data.get('items', [])]
+            journal = QueueJournal(Path(file_path), self.journal_compact_records)
+            replayed = journal.load(self, data)
+            if replayed:
+                logger.debug(f"已重放队列日志 {replayed} 条记录: {journal.log_path}")
+            if self.journal_mode:
+                self._journal = journal
+                # 旧格式（无 journal_id）的文件下次保存时写成快照
+                self._needs_snapshot = journal.journal_id is None
+            self._dirty = {}
+            return True
+        except Exception as e:
+            logger.error(f"加载队列失败: {file_path}, 错误: {e}")
             return False
     
     def export_status_report(self) -> str:
         """导出状态报告"""
         lines = ["baku 文件队列状态报告", "=" * 40, ""]
         lines.append(f"生成时间: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-        lines.append(f"总文件数: {len(self.items)}")
+        lines.append(f"总文件数: {len(self)}")
         
         stats = self.get_stats()
         lines.append("")
@@ -290,20 +733,23 @@ class FileQueue:
     
     def _format_file_size(self, size_bytes: int) -> str:
         """格式化文件大小"""
-        import math
-        
-        if size_bytes == 0:
-            return "0 B"
-        
-        size_names = ["B", "KB", "MB", "GB", "TB"]
-        i = int(math.floor(math.log(size_bytes, 1024)))
-        p = math.pow(1024, i)
-        s = round(size_bytes / p, 2)
-        return f"{s} {size_names[i]}"
+        return format_file_size(size_bytes)
     
     def get_status_stats(self) -> Dict[FileStatus, int]:
         """获取状态统计 - 返回每个状态的文件数量"""
-        stats = {}
-        for status in FileStatus:
-            stats[status] = len([item for item in self.items if item.status == status])
-        return stats
+        return dict(self._counts)
+
+
+# 二进制快照 flags 列中的状态序号
+_STATUSES = list(FileStatus)
+_STATUS_CODES = {status: code for code, status in enumerate(_STATUSES)}
+
+
+def _item_flags(item: FileQueueItem) -> int:
+    """已解码文件项的 flags（与快照 flags 列的编码相同）"""
+    flags = _STATUS_CODES[item.status]
+    if item.has_backups:
+        flags |= queue_snapshot.FLAG_BACKUPS
+    if item._selected_base is not None:
+        flags |= queue_snapshot.FLAG_SELECTED
+    return flags
@@ -0,0 +1,365 @@
+"""
+备份索引实时监听模块
+基于 Linux inotify（ctypes 调用 libc）监听备份文件的创建、重命名和删除，
+合并短时间内的大量事件后批量写入 BackupIndex
+"""
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import struct
+import sys
+import threading
+import time
+from stat import S_ISREG
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, Optional, Set, Tuple
+from loguru import logger
+from baku.config.config import load_baku_config
+from baku.core.backup_index import BackupIndex
+
+
+# inotify 常量（见 <sys/inotify.h>）
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_DONT_FOLLOW = 0x02000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_CLOSE_WRITE | IN_ATTRIB | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR | IN_DONT_FOLLOW
+)
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class _Inotify:
+    """libc inotify 的最小 ctypes 封装"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c") or "libc.so.6"
+        self._libc = ctypes.CDLL(libc_name, use_errno=True)
+        self._libc.inotify_init1.argtypes = [ctypes.c_int]
+        self._libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+        self._libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+        self.fd = self._libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_init1 失败: {os.strerror(err)}")
+
+    def add_watch(self, path: str, mask: int) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), mask)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, f"inotify_add_watch 失败: {os.strerror(err)}", path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read_events(self, timeout: float) -> List[Tuple[int, int, int, str]]:
+        """读取事件，返回 (wd, mask, cookie, name) 列表"""
+        readable, _, _ = select.select([self.fd], [], [], timeout)
+        if not readable:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except OSError as e:
+            if e.errno == errno.EAGAIN:
+                return []
+            raise
+        events = []
+        offset = 0
+        header_size = _EVENT_HEADER.size
+        while offset + header_size <= len(data):
+            wd, mask, cookie, length = _EVENT_HEADER.unpack_from(data, offset)
+            offset += header_size
+            name = os.fsdecode(data[offset:offset + length].rstrip(b"\0"))
+            offset += length
+            events.append((wd, mask, cookie, name))
+        return events
+
+    def close(self):
+        if self.fd < 0:
+            return
+        try:
+            os.close(self.fd)
+        except OSError:
+            pass
+        self.fd = -1
+
+
+class IndexWatcher:
+    """
+    备份索引实时监听器
+    - 递归监听 roots 下的所有目录，新建目录自动加入监听
+    - 事件先合并到待处理集合，静默 debounce 秒或累计超过 max_delay 秒后一次性写入索引
+    - 队列溢出（IN_Q_OVERFLOW）时重建所有根目录的索引
+    """
+
+    def __init__(self, index: BackupIndex, roots: Iterable[Path],
+                 debounce: float = 0.3, max_delay: float = 2.0):
+        self.index = index
+        self.roots = tuple(os.path.abspath(str(root)) for root in roots)
+        self.debounce = debounce
+        self.max_delay = max_delay
+        self.extensions = index.extensions
+        self._inotify: Optional[_Inotify] = None
+        # wd -> (目录路径, 所属根目录, 相对根目录深度)
+        self._watches: Dict[int, Tuple[str, str, int]] = {}
+        self._wd_by_path: Dict[str, int] = {}
+        self._listeners: List[Callable[[Set[str], Set[str]], None]] = []
+        self._state_listeners: List[Callable[[bool], None]] = []
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._reset_pending()
+
+    @staticmethod
+    def is_supported() -> bool:
+        """当前平台是否支持 inotify"""
+        return sys.platform.startswith("linux")
+
+    def add_listener(self, callback: Callable[[Set[str], Set[str]], None]):
+        """
+        注册回调，每次写入索引后以 (发生变化的目录, 变化的目录树) 调用
+        目录树（被移动、删除或重新扫描的目录）下的所有子目录都应视为已变化
+        """
+        self._listeners.append(callback)
+
+    def add_state_listener(self, callback: Callable[[bool], None]):
+        """注册回调，监听线程就绪（索引已与磁盘一致）时以 True 调用，线程退出时以 False 调用"""
+        self._state_listeners.append(callback)
+
+    def start(self, rebuild: bool = True):
+        """
+        启动后台监听线程；rebuild 为 True 时先在监听线程中重建根目录索引，保证索引与磁盘一致
+        添加监听和重建索引都在后台线程完成，不阻塞调用方
+        """
+        if self._thread is not None:
+            return
+        self._inotify = _Inotify()
+        self._stop_event.clear()
+        self._thread = threading.Thread(
+            target=self._run, args=(rebuild,), name="baku-index-watcher", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self):
+        """停止监听并写入剩余的待处理事件"""
+        if self._thread is None:
+            return
+        self._stop_event.set()
+        self._thread.join()
+        self._thread = None
+        self._inotify.close()
+        self._inotify = None
+        self._watches.clear()
+        self._wd_by_path.clear()
+        logger.info("索引实时监听已停止")
+
+    def is_running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def _reset_pending(self):
+        self._pending_files: Dict[str, Tuple[str, int]] = {}
+        self._pending_rescans: Dict[str, Tuple[str, int]] = {}
+        self._pending_removed: Set[str] = set()
+        self._pending_dirs: Dict[str, str] = {}
+        self._first_event_at: Optional[float] = None
+        self._last_event_at = 0.0
+
+    def _add_tree_watches(self, start: str, root: str, depth: int):
+        """递归为目录树添加监听"""
+        stack = [(start, depth)]
+        while stack:
+            directory, level = stack.pop()
+            try:
+                wd = self._inotify.add_watch(directory, _WATCH_MASK)
+            except OSError as e:
+                logger.debug(f"无法监听目录 {directory}: {e}")
+                continue
+            self._watches[wd] = (directory, root, level)
+            self._wd_by_path[directory] = wd
+            try:
+                with os.scandir(directory) as entries:
+                    for entry in entries:
+                        if entry.is_dir(follow_symlinks=False):
+                            stack.append((entry.path, level + 1))
+            except OSError:
+                continue
+
+    def _drop_tree_watches(self, start: str, remove: bool = False):
+        """
+        移除目录树的监听记录
+        目录被删除时内核会自动移除监听；目录被移走时需 remove=True 主动移除
+        """
+        prefix = start + os.sep
+        for path in [p for p in self._wd_by_path if p == start or p.startswith(prefix)]:
+            wd = self._wd_by_path.pop(path)
+            self._watches.pop(wd, None)
+            if remove:
+                self._inotify.rm_watch(wd)
+
+    def _prepare(self, rebuild: bool):
+        """添加目录监听并按需重建索引；先添加监听，重建期间发生的变更也不会丢失"""
+        for root in self.roots:
+            self._add_tree_watches(root, root, 0)
+        if rebuild:
+            for root in self.roots:
+                if self._stop_event.is_set():
+                    return
+                self.index.build(Path(root))
+        logger.info(f"索引实时监听已启动: {', '.join(self.roots)}（{len(self._watches)} 个目录）")
+
+    def _run(self, rebuild: bool = True):
+        try:
+            self._prepare(rebuild)
+        except Exception as e:
+            logger.error(f"初始化索引实时监听失败: {e}")
+            self._notify_state(False)
+            return
+        if not self._stop_event.is_set():
+            self._notify_state(True)
+        try:
+            while not self._stop_event.is_set():
+                try:
+                    events = self._inotify.read_events(self.debounce / 2)
+                except OSError as e:
+                    logger.error(f"读取 inotify 事件失败，索引实时监听已停止: {e}")
+                    break
+                now = time.monotonic()
+                if events:
+                    self._handle_events(events)
+                    if self._first_event_at is None:
+                        self._first_event_at = now
+                    self._last_event_at = now
+                if self._first_event_at is not None and (
+                    now - self._last_event_at >= self.debounce
+                    or now - self._first_event_at >= self.max_delay
+                ):
+                    self._flush()
+            self._flush()
+        finally:
+            # 监听线程退出后索引不再实时更新，通知使用方恢复按 mtime 校验
+            self._notify_state(False)
+
+    def _notify_state(self, live: bool):
+        for callback in self._state_listeners:
+            try:
+                callback(live)
+            except Exception as e:
+                logger.warning(f"监听状态回调失败: {e}")
+
+    def _handle_events(self, events: List[Tuple[int, int, int, str]]):
+        """把原始事件合并到待处理集合"""
+        for wd, mask, _cookie, name in events:
+            if mask & IN_Q_OVERFLOW:
+                logger.warning("inotify 事件队列溢出，将重建索引")
+                for root in self.roots:
+                    self._add_tree_watches(root, root, 0)
+                    self._pending_rescans[root] = (root, 0)
+                continue
+            watch = self._watches.get(wd)
+            if watch is None:
+                continue
+            directory, root, depth = watch
+            if mask & IN_IGNORED:
+                self._watches.pop(wd, None)
+                if self._wd_by_path.get(directory) == wd:
+                    del self._wd_by_path[directory]
+                continue
+            if mask & (IN_DELETE_SELF | IN_MOVE_SELF):
+                continue
+            path = os.path.join(directory, name)
+            self._pending_dirs[directory] = root
+            if mask & IN_ISDIR:
+                if mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree_watches(path, root, depth + 1)
+                    self._pending_removed.discard(path)
+                    self._pending_rescans[path] = (root, depth + 1)
+                elif mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._drop_tree_watches(path, remove=bool(mask & IN_MOVED_FROM))
+                    self._pending_rescans.pop(path, None)
+                    self._pending_removed.add(path)
+                continue
+            if name.endswith(self.extensions) and name.rfind('.') > 0:
+                self._pending_files[path] = (directory, depth)
+
+    def _flush(self):
+        """把合并后的变更一次性写入索引"""
+        if not (self._pending_files or self._pending_rescans or self._pending_removed):
+            self._first_event_at = None
+            return
+        upserts = []
+        deletes = []
+        for path, (directory, depth) in self._pending_files.items():
+            try:
+                stat = os.stat(path, follow_symlinks=False)
+            except OSError:
+                deletes.append(path)
+                continue
+            if not S_ISREG(stat.st_mode):
+                deletes.append(path)
+                continue
+            name = os.path.basename(path)
+            upserts.append((
+                path, directory, name, os.path.splitext(name)[0],
+                stat.st_size, stat.st_mtime, depth
+            ))
+        dir_rows = []
+        for directory, root in self._pending_dirs.items():
+            try:
+                dir_rows.append((directory, root, os.stat(directory).st_mtime_ns))
+            except OSError:
+                continue
+        rescans = [(path, root, depth) for path, (root, depth) in self._pending_rescans.items()]
+        changed = set(self._pending_dirs)
+        trees = set(self._pending_rescans) | self._pending_removed
+        try:
+            self.index.apply_changes(
+                upserts=upserts, deletes=deletes, dir_rows=dir_rows,
+                removed_trees=self._pending_removed, rescans=rescans
+            )
+            logger.debug(
+                f"索引增量更新: 更新 {len(upserts)}，删除 {len(deletes)}，"
+                f"重扫目录 {len(rescans)}，移除目录 {len(self._pending_removed)}"
+            )
+        except Exception as e:
+            logger.error(f"写入索引增量更新失败: {e}")
+        self._reset_pending()
+        for callback in self._listeners:
+            try:
+                callback(changed, trees)
+            except Exception as e:
+                logger.warning(f"索引更新回调失败: {e}")
+
+
+def start_configured_watcher(backup_finder) -> Optional[IndexWatcher]:
+    """
+    按配置项 watch_roots 为 BackupFinder 启动索引实时监听
+    未配置或平台不支持时返回 None
+    """
+    roots = load_baku_config().get('watch_roots') or []
+    if not roots:
+        return None
+    if not IndexWatcher.is_supported():
+        logger.warning("当前平台不支持 inotify，已跳过索引实时监听")
+        return None
+    try:
+        watcher = backup_finder.attach_watcher([Path(root).expanduser() for root in roots])
+    except OSError as e:
+        logger.error(f"启动索引实时监听失败: {e}")
+        return None
+    return watcher
@@ -2,29 +2,50 @@
 多文件管理核心功能
 CLI和Web界面共用的多文件处理逻辑
 """
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import itertools
+import os
 from pathlib import Path
 from typing import List, Dict, Any, Optional, Callable
 from datetime import datetime
 import threading
 import time
+from baku.config.config import load_baku_config
 from .file_queue import FileQueue, FileQueueItem, FileStatus, BackupInfo
+from .sqlite_queue import create_file_queue
 from .backup_finder import BackupFinder
+from .backup_ranker import BackupCandidate
 from .backup_restorer import BackupRestorer
+from .restore_journal import RestoreJournal
+from .restore_plan import path_key
 from loguru import logger
 
 
 class MultiFileManager:
     """多文件管理核心类"""
     
+    # 批量扫描时每个任务最多处理的同目录文件数
+    SCAN_CHUNK_SIZE = 64
+    
     def __init__(self, backup_finder: Optional[BackupFinder] = None, 
-                 backup_restorer: Optional[BackupRestorer] = None):
+                 backup_restorer: Optional[BackupRestorer] = None,
+                 max_workers: Optional[int] = None,
+                 file_queue: Optional[FileQueue] = None):
         self.backup_finder = backup_finder or BackupFinder()
         self.backup_restorer = backup_restorer or BackupRestorer()
-        self.file_queue = FileQueue()
+        # FileQueue 或 SQLiteFileQueue；未指定时按配置项 queue_db 选择
+        self.file_queue = file_queue if file_queue is not None else create_file_queue()
         self.queue = self.file_queue  # 别名，为了兼容性
         self._is_processing = False
         self._cancel_requested = False
         self._progress_callback: Optional[Callable[[float, str], None]] = None
+        # 批量扫描的并发线程数，网络/FUSE 文件系统上元数据调用延迟高，并发可显著提速
+        if max_workers is None:
+            max_workers = load_baku_config().get('max_workers', 8)
+        self.max_workers = max(1, int(max_workers))
+        # 批量恢复：按设备的并发上限（首次使用时从配置解析）和最近一次的吞吐量统计
+        self._device_limits: Optional[Dict[int, int]] = None
+        self.last_batch_stats: Optional[Dict[str, Any]] = None
         
     def set_progress_callback(self, callback: Callable[[float, str], None]):
         """设置进度回调函数"""
@@ -116,23 +137,32 @@ class MultiFileManager:
             item.update_status(FileStatus.PROCESSING, "正在扫描备份文件...")
             self._report_progress(0.0, f"扫描 {item.name} 的备份文件...")
             
-            # 使用备份查找器 - backup_finder返回Path对象或None
-            backup_path = self.backup_finder.find_nearest_backup(item.path)
-            
-            if backup_path and backup_path.exists():
-                stat = backup_path.stat()
-                backup_info = BackupInfo(
-                    path=backup_path,
-                    name=backup_path.name,
-                    size=stat.st_size,
-                    size_str=self._format_file_size(stat.st_size),
-                    modified=datetime.fromtimestamp(stat.st_mtime),
-                    similarity=1.0,  # 默认相似度
-                    file_type=backup_path.suffix
-                )
-                
-                item.add_backup(backup_info)
-                item.update_status(FileStatus.COMPLETED, f"找到备份文件")
+            # 使用备份查找器 - 返回按评分排序的候选备份
+            candidates = self.backup_finder.find_candidates(item.path)
+        except Exception as ex:
+            item.update_status(FileStatus.ERROR, f"扫描失败: {str(ex)}")
+            self._report_progress(1.0, f"{item.name} 扫描失败")
+            return False
+        return self._apply_scan_result(item, candidates)
+    
+    def _apply_scan_result(self, item: FileQueueItem, candidates: List[BackupCandidate]) -> bool:
+        """根据查找结果更新文件项的备份信息和状态"""
+        try:
+            if candidates:
+                item.backup_files = []
+                for candidate in candidates:
+                    item.add_backup(BackupInfo(
+                        path=candidate.path,
+                        name=candidate.name,
+                        size=candidate.size,
+                        modified=candidate.mtime,
+                        similarity=round(
+                            candidate.score if candidate.content_score is None
+                            else candidate.content_score, 4
+                        ),
+                        file_type=candidate.path.suffix
+                    ))
+                item.update_status(FileStatus.COMPLETED, f"找到 {len(candidates)} 个备份文件")
                 self._report_progress(1.0, f"{item.name} 扫描完成")
                 return True
             else:
@@ -146,36 +176,92 @@ class MultiFileManager:
             self._report_progress(1.0, f"{item.name} 扫描失败")
             return False
     
-    def batch_scan_backups(self) -> bool:
-        """批量扫描所有文件的备份"""
+    def _scan_candidates(self, items: List[FileQueueItem], max_workers: Optional[int] = None):
+        """
+        并发收集候选备份，按 items 顺序逐个产出 (item, candidates)
+        - 按父目录分组并切块，每块在线程池中调用 find_candidates_many，同目录文件共享目录列表
+        - 结果统一在调用线程中按队列顺序产出，状态更新不会交错
+        - 请求取消后不再产出结果，并取消尚未开始的任务
+        """
+        workers = max(1, int(max_workers or self.max_workers))
+        groups: Dict[Path, List[int]] = {}
+        for index, item in enumerate(items):
+            groups.setdefault(item.path.parent, []).append(index)
+        chunks = [
+            indexes[start:start + self.SCAN_CHUNK_SIZE]
+            for indexes in groups.values()
+            for start in range(0, len(indexes), self.SCAN_CHUNK_SIZE)
+        ]
+        if workers == 1 or len(chunks) == 1:
+            found = self.backup_finder.find_candidates_many(item.path for item in items)
+            for item in items:
+                if self._cancel_requested:
+                    return
+                yield item, found.get(item.path, [])
+            return
+        
+        def scan_chunk(indexes: List[int]) -> Dict[int, List[BackupCandidate]]:
+            if self._cancel_requested:
+                return {}
+            found = self.backup_finder.find_candidates_many(items[i].path for i in indexes)
+            return {i: found.get(items[i].path, []) for i in indexes}
+        
+        results: Dict[int, List[BackupCandidate]] = {}
+        cursor = 0
+        executor = ThreadPoolExecutor(max_workers=min(workers, len(chunks)),
+                                      thread_name_prefix="baku-scan")
+        try:
+            futures = {executor.submit(scan_chunk, chunk) for chunk in chunks}
+            while futures and not self._cancel_requested:
+                done, futures = wait(futures, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    results.update(future.result())
+                # 按队列顺序产出已就绪的连续结果
+                while cursor < len(items) and cursor in results:
+                    if self._cancel_requested:
+                        return
+                    yield items[cursor], results.pop(cursor)
+                    cursor += 1
+        finally:
+            executor.shutdown(wait=True, cancel_futures=True)
+    
+    def batch_scan_backups(self, max_workers: Optional[int] = None) -> bool:
+        """
+        批量扫描所有文件的备份
+        max_workers 为并发线程数，默认使用初始化时的设置（配置项 max_workers）
+        """
         if self._is_processing:
             return False
-        # 获取所有需要扫描的文件（有路径且状态为PENDING）
-        pending_files = [
-            item for item in self.file_queue.items
-            if item.status == FileStatus.PENDING and item.path
-        ]
-        if not pending_files:
+        # 逐页取出需要扫描的文件（有路径且状态为PENDING），SQLite 队列不必整个载入内存
+        pages = (
+            [item for item in page if item.path]
+            for page in self.file_queue.iter_item_pages(FileStatus.PENDING)
+        )
+        pages = (page for page in pages if page)
+        first_page = next(pages, None)
+        if first_page is None:
             return False
         self._is_processing = True
         self._cancel_requested = False
         try:
-            total_files = len(pending_files)
+            total_files = max(len(first_page), self.file_queue.get_status_stats()[FileStatus.PENDING])
             self._report_progress(0.0, f"开始批量扫描 {total_files} 个文件...")
-            for i, item in enumerate(pending_files):
+            scanned = 0
+            for page in itertools.chain([first_page], pages):
+                for item, candidates in self._scan_candidates(page, max_workers):
+                    # 写入单个文件的扫描结果（只在调用线程中按队列顺序写入）
+                    self._apply_scan_result(item, candidates)
+                    scanned += 1
+                    # 更新总体进度
+                    progress = scanned / total_files
+                    self._report_progress(progress, f"已扫描 {scanned}/{total_files} 个文件")
                 if self._cancel_requested:
                     break
-                # 扫描单个文件
-                self.scan_file_backups(item.id)
-                # 更新总体进度
-                progress = (i + 1) / total_files
-                self._report_progress(progress, f"已扫描 {i + 1}/{total_files} 个文件")
-                # 短暂暂停
-                # time.sleep(0.1)
-            # 自动为有备份但未设置selected_backup的文件设置第一个备份
-            for item in self.file_queue.items:
-                if item.backup_files and not item.selected_backup:
-                    item.set_selected_backup(item.backup_files[0].path)
+            # 自动为有备份但未设置selected_backup的文件设置评分最高的备份
+            for page in self.file_queue.iter_item_pages():
+                for item in page:
+                    if item.backup_files and not item.selected_backup:
+                        item.set_selected_backup(item.backup_files[0].path)
             self._is_processing = False
             if self._cancel_requested:
                 self._report_progress(1.0, "批量扫描已取消")
@@ -204,7 +290,15 @@ class MultiFileManager:
             item.update_status(FileStatus.PROCESSING, "正在恢复文件...")
             self._report_progress(0.0, f"恢复 {item.name}...")
             logger.info(f"[restore_file] 开始恢复: {item.name}, 源: {item.path}, 备份: {backup_path}")
-            result = self.backup_restorer.restore_backup(item.path, backup_path)
+            
+            def on_bytes(copied: int, total: int):
+                item.progress = copied / total if total else 1.0
+                self._report_progress(
+                    item.progress,
+                    f"恢复 {item.name}: {self._format_file_size(copied)}/{self._format_file_size(total)}"
+                )
+            
+            result = self.backup_restorer.restore_backup(item.path, backup_path, progress=on_bytes)
             if result.get('success'):
                 item.update_status(FileStatus.COMPLETED, "文件恢复成功")
                 self._report_progress(1.0, f"{item.name} 恢复成功")
@@ -237,7 +331,15 @@ class MultiFileManager:
         return True
     
     def batch_restore_files(self, item_ids: Optional[List[str]] = None) -> bool:
-        """批量恢复文件"""
+        """
+        批量恢复文件
+        按目标所在设备（st_dev）分组并发恢复，每个设备的并发数由配置项 restore_concurrency 控制，
+        文件项状态和进度只在调用线程中更新；吞吐量统计保存在 last_batch_stats
+        配置项 restore_journal 为 True（默认关闭）时先按组把计划操作写入预写日志（每组一次 fsync），
+        进程中途崩溃可用 baku recover 继续或撤销
+        多个文件项选中同一备份时都以复制方式恢复（不重命名、不移入回收站），
+        全部成功后再把该备份移入回收站一次
+        """
         if self._is_processing:
             logger.warning("[batch_restore_files] 已有批处理在进行中，操作被拒绝")
             return False
@@ -257,35 +359,269 @@ class MultiFileManager:
             return False
         self._is_processing = True
         self._cancel_requested = False
+        executors: Dict[int, ThreadPoolExecutor] = {}
+        journal: Optional[RestoreJournal] = None
         try:
             total_files = len(restorable_items)
             success_count = 0
+            restored_bytes = 0
+            processed = 0
+            # 按字节加权的总体进度：已完成文件的字节 + 进行中文件已复制的字节
+            sizes = {item.id: self._selected_backup_size(item) for item in restorable_items}
+            items_by_id = {item.id: item for item in restorable_items}
+            # 被多个文件项共用的备份：键 -> 尚未完成的文件项数（失败时为 None，保留备份）
+            backup_keys = {item.id: path_key(item.selected_backup) for item in restorable_items}
+            shared: Dict[str, Optional[int]] = {}
+            for key in backup_keys.values():
+                shared[key] = shared.get(key, 0) + 1
+            shared = {key: count for key, count in shared.items() if count > 1}
+            if shared:
+                logger.info(f"[batch_restore_files] {len(shared)} 个备份被多个文件项共用，改为复制恢复")
+            total_bytes = sum(sizes.values())
+            finished_bytes = 0
+            in_flight: Dict[str, int] = {}
+            in_flight_lock = threading.Lock()
+            last_reported = None
+            started = time.perf_counter()
             self._report_progress(0.0, f"开始批量恢复 {total_files} 个文件...")
             logger.info(f"[batch_restore_files] 批量恢复开始，共 {total_files} 个文件")
-            for i, item in enumerate(restorable_items):
-                if self._cancel_requested:
-                    logger.warning(f"[batch_restore_files] 批量恢复被取消，已处理 {i} 个文件")
-                    break
-                # 恢复单个文件
-                if self.restore_file(item.id):
-                    success_count += 1
-                # 更新总体进度
-                progress = (i + 1) / total_files
-                self._report_progress(progress, f"已处理 {i + 1}/{total_files} 个文件")
-                # time.sleep(0.1)
+            if load_baku_config().get('restore_journal', False):
+                journal = RestoreJournal.create()
+            futures = {}
+            seqs: Dict[str, int] = {}
+            group_size = journal.group_size if journal else total_files
+            for start in range(0, total_files, group_size):
+                group = restorable_items[start:start + group_size]
+                new_files = {item.id: self.backup_restorer.planned_new_file(item.path) for item in group}
+                if journal:
+                    # 计划操作落盘后才提交这一组
+                    journal.plan(
+                        (start + offset, item.path, item.selected_backup,
+                         backup_keys[item.id] not in shared, new_files[item.id],
+                         backup_keys[item.id] if backup_keys[item.id] in shared else None)
+                        for offset, item in enumerate(group)
+                    )
+                for offset, item in enumerate(group):
+                    seqs[item.id] = start + offset
+                    item.update_status(FileStatus.PROCESSING, "正在恢复文件...")
+                    device = self._device_of(item.path)
+                    executor = executors.get(device)
+                    if executor is None:
+                        executor = ThreadPoolExecutor(
+                            max_workers=self._device_concurrency(device),
+                            thread_name_prefix=f"baku-restore-{device}"
+                        )
+                        executors[device] = executor
+                    future = executor.submit(self._restore_worker, item, new_files[item.id],
+                                             in_flight, in_flight_lock,
+                                             backup_keys[item.id] not in shared)
+                    futures[future] = item
+            pending = set(futures)
+            cancel_handled = False
+            while pending:
+                if self._cancel_requested and not cancel_handled:
+                    # 取消尚未开始的恢复，已开始的等待完成
+                    cancel_handled = True
+                    for future in pending:
+                        future.cancel()
+                    cancelled = [future for future in pending if future.cancelled()]
+                    pending = {future for future in pending if not future.cancelled()}
+                    if journal:
+                        journal.record_cancelled(seqs[futures[future].id] for future in cancelled)
+                    for future in cancelled:
+                        futures[future].update_status(FileStatus.CANCELLED, "恢复已取消")
+                        shared_key = backup_keys[futures[future].id]
+                        if shared_key in shared:
+                            shared[shared_key] = None
+                    logger.warning(f"[batch_restore_files] 批量恢复被取消，已处理 {processed} 个文件")
+                    continue
+                done, pending = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+                for future in done:
+                    item = futures[future]
+                    ok, message, size, details = future.result()
+                    if journal:
+                        if ok:
+                            journal.record_done(seqs[item.id], details)
+                        else:
+                            journal.record_failed(seqs[item.id], message)
+                    if ok:
+                        success_count += 1
+                        restored_bytes += size
+                        item.progress = 1.0
+                        item.update_status(FileStatus.COMPLETED, "文件恢复成功")
+                        logger.success(f"[restore_file] 恢复成功: {item.name}")
+                    else:
+                        item.update_status(FileStatus.ERROR, message)
+                        logger.error(f"[restore_file] {item.name}: {message}")
+                    self._release_shared_backup(shared, backup_keys[item.id], item, ok)
+                    processed += 1
+                    finished_bytes += sizes[item.id]
+                    with in_flight_lock:
+                        in_flight.pop(item.id, None)
+                # 更新总体进度和进行中文件的进度（每轮等待最多一次）
+                with in_flight_lock:
+                    copied = dict(in_flight)
+                for item_id, copied_item_bytes in copied.items():
+                    total = sizes[item_id]
+                    items_by_id[item_id].progress = copied_item_bytes / total if total else 1.0
+                copied_bytes = finished_bytes + sum(copied.values())
+                if (processed, copied_bytes) != last_reported:
+                    last_reported = (processed, copied_bytes)
+                    self._report_batch_progress(processed, total_files, copied_bytes, total_bytes,
+                                                time.perf_counter() - started)
+            stats = self._throughput_stats(processed, success_count, restored_bytes,
+                                           time.perf_counter() - started, len(executors))
+            self.last_batch_stats = stats
+            if journal:
+                journal.close()
+                # 已正常结束，finally 中不再保留日志
+                journal = None
+            summary = f"{stats['files_per_sec']:.1f} 文件/s，{stats['mb_per_sec']:.1f} MB/s"
             self._is_processing = False
             if self._cancel_requested:
-                self._report_progress(1.0, f"批量恢复已取消，已成功恢复 {success_count} 个文件")
-                logger.warning(f"[batch_restore_files] 批量恢复已取消，成功恢复 {success_count} 个文件")
+                self._report_progress(1.0, f"批量恢复已取消，已成功恢复 {success_count} 个文件（{summary}）")
+                logger.warning(f"[batch_restore_files] 批量恢复已取消，成功恢复 {success_count} 个文件（{summary}）")
             else:
-                self._report_progress(1.0, f"批量恢复完成，成功恢复 {success_count}/{total_files} 个文件")
-                logger.success(f"[batch_restore_files] 批量恢复完成，成功恢复 {success_count}/{total_files} 个文件")
+                self._report_progress(1.0, f"批量恢复完成，成功恢复 {success_count}/{total_files} 个文件（{summary}）")
+                logger.success(f"[batch_restore_files] 批量恢复完成，成功恢复 {success_count}/{total_files} 个文件（{summary}）")
             return not self._cancel_requested
         except Exception as ex:
             self._is_processing = False
             self._report_progress(1.0, f"批量恢复失败: {str(ex)}")
             logger.exception(f"[batch_restore_files] 批量恢复失败: {ex}")
             return False
+        finally:
+            for executor in executors.values():
+                executor.shutdown(wait=True, cancel_futures=True)
+            if journal:
+                # 异常退出时保留日志，由 baku recover 处理
+                journal.close(remove=False)
+            # 批量结束（包括取消）时处理完回收站队列
+            self.backup_restorer.flush_trash()
+    
+    def _release_shared_backup(self, shared: Dict[str, Optional[int]], key: str,
+                               item: FileQueueItem, ok: bool):
+        """共用的备份：所有文件项都恢复成功后移入回收站，有失败或取消时保留"""
+        if key not in shared or shared[key] is None:
+            return
+        if not ok:
+            shared[key] = None
+            return
+        shared[key] -= 1
+        if shared[key] == 0:
+            self.backup_restorer.trash_queue.put(item.selected_backup)
+            logger.info(f"共用的备份文件已加入回收站队列: {item.selected_backup}")
+    
+    def _restore_worker(self, item: FileQueueItem, new_file: Optional[Path],
+                        in_flight: Dict[str, int], in_flight_lock: threading.Lock,
+                        trash_backup: bool = True):
+        """
+        在工作线程中恢复单个文件，返回 (是否成功, 消息, 恢复字节数, 结果详情)
+        new_file 为预先写入日志的 .new 路径；trash_backup 为 False 时保留备份（以复制方式恢复）
+        工作线程不修改文件项，只把已复制字节数写入 in_flight；状态和进度由调用线程写入
+        """
+        backup_path = item.selected_backup
+        try:
+            size = os.stat(backup_path).st_size
+        except (OSError, TypeError):
+            return False, "没有可用的备份文件", 0, {}
+        logger.info(f"[restore_file] 开始恢复: {item.name}, 源: {item.path}, 备份: {backup_path}")
+        
+        def on_bytes(copied: int, total: int):
+            with in_flight_lock:
+                in_flight[item.id] = copied
+        
+        try:
+            result = self.backup_restorer.restore_backup(item.path, backup_path,
+                                                         trash_backup=trash_backup,
+                                                         progress=on_bytes, new_file=new_file)
+        except Exception as ex:
+            return False, f"恢复过程中发生错误: {str(ex)}", 0, {}
+        details = result.get('details', {})
+        if result.get('success'):
+            return True, result.get('message', ''), size, details
+        return False, f"恢复失败: {result.get('message', '未知错误')}", 0, details
+    
+    def _report_batch_progress(self, processed: int, total_files: int, copied_bytes: int,
+                               total_bytes: int, elapsed: float):
+        """按字节加权回报批量恢复进度和预计剩余时间"""
+        if total_bytes:
+            progress = min(copied_bytes / total_bytes, 1.0)
+        else:
+            progress = processed / total_files
+        message = f"已处理 {processed}/{total_files} 个文件"
+        if total_bytes:
+            message += f"，{self._format_file_size(copied_bytes)}/{self._format_file_size(total_bytes)}"
+        if 0 < progress < 1 and elapsed > 0:
+            message += f"，剩余约 {self._format_eta(elapsed * (1 - progress) / progress)}"
+        self._report_progress(progress, message)
+    
+    @staticmethod
+    def _format_eta(seconds: float) -> str:
+        """格式化剩余时间"""
+        seconds = int(seconds + 0.5)
+        if seconds < 60:
+            return f"{seconds}s"
+        minutes, seconds = divmod(seconds, 60)
+        if minutes < 60:
+            return f"{minutes}m{seconds:02d}s"
+        hours, minutes = divmod(minutes, 60)
+        return f"{hours}h{minutes:02d}m"
+    
+    @staticmethod
+    def _selected_backup_size(item: FileQueueItem) -> int:
+        """选中备份的大小，优先取扫描结果中的大小"""
+        for backup in item.backup_files:
+            if backup.path == item.selected_backup and backup.size is not None:
+                return backup.size
+        try:
+            return os.stat(item.selected_backup).st_size
+        except (OSError, TypeError):
+            return 0
+    
+    @staticmethod
+    def _device_of(path: Path) -> int:
+        """目标文件所在设备，目标不存在时取所在目录"""
+        for candidate in (path, path.parent):
+            try:
+                return os.stat(candidate).st_dev
+            except OSError:
+                continue
+        return -1
+    
+    def _device_concurrency(self, device: int) -> int:
+        """设备的恢复并发数：restore_concurrency 中按挂载路径或 st_dev 配置，未配置时用 default"""
+        if self._device_limits is None:
+            limits: Dict[int, int] = {}
+            config = load_baku_config().get('restore_concurrency') or {}
+            for key, value in config.items():
+                if key == 'default':
+                    continue
+                try:
+                    dev = int(key) if str(key).isdigit() else os.stat(os.path.expanduser(key)).st_dev
+                except OSError:
+                    logger.warning(f"restore_concurrency 中的路径不存在: {key}")
+                    continue
+                limits[dev] = max(1, int(value))
+            limits[-1] = max(1, int(config.get('default', 4)))
+            self._device_limits = limits
+        return self._device_limits.get(device, self._device_limits[-1])
+    
+    @staticmethod
+    def _throughput_stats(processed: int, success: int, restored_bytes: int,
+                          elapsed: float, devices: int) -> Dict[str, Any]:
+        """批量恢复吞吐量统计"""
+        elapsed = max(elapsed, 1e-9)
+        return {
+            'processed': processed,
+            'success': success,
+            'failed': processed - success,
+            'bytes': restored_bytes,
+            'elapsed': elapsed,
+            'devices': devices,
+            'files_per_sec': processed / elapsed,
+            'mb_per_sec': restored_bytes / elapsed / (1024 * 1024),
+        }
     
     def cancel_batch_operation(self):
         """取消批处理操作"""
@@ -309,7 +645,7 @@ class MultiFileManager:
     
     def get_all_items(self) -> List[FileQueueItem]:
         """获取所有队列项"""
-        return self.file_queue.items.copy()
+        return self.file_queue.items
     
     def get_items_by_status(self, status: FileStatus) -> List[FileQueueItem]:
         """按状态获取文件项"""
@@ -0,0 +1,121 @@
+"""
+文件队列日志持久化模块
+队列文件 <path> 是快照（与 FileQueue.to_json 相同的结构，另带 journal_id；
+.bakq 文件为二进制快照，journal_id 在头部），
+<path>.log 为追加写入的 NDJSON 变更记录；保存时只追加自上次保存以来的变更，
+日志记录数超过阈值时重新写快照并删除日志（压缩）。加载时读取快照再重放日志
+"""
+import json
+import os
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Dict, List, Optional
+from loguru import logger
+from baku.core.queue_snapshot import is_binary_path
+
+if TYPE_CHECKING:
+    from baku.core.file_queue import FileQueue
+
+
+LOG_SUFFIX = ".log"
+
+
+def log_path_for(snapshot_path: Path) -> Path:
+    return snapshot_path.with_name(snapshot_path.name + LOG_SUFFIX)
+
+
+class QueueJournal:
+    """
+    绑定到一个队列文件的日志
+    - write_snapshot: 原子写入快照（临时文件 + os.replace）并删除旧日志
+    - append: 追加一批变更记录并 fsync（每次保存一次）
+    - 日志首行记录所属快照的 journal_id，与快照不匹配的日志（压缩时崩溃残留）在加载时忽略
+    """
+
+    def __init__(self, path: Path, compact_records: int = 10000):
+        self.path = Path(path)
+        self.log_path = log_path_for(self.path)
+        self.compact_records = compact_records
+        self.journal_id: Optional[str] = None
+        self.log_records = 0
+
+    def write_snapshot(self, queue: 'FileQueue'):
+        """写入完整快照，开始新的日志"""
+        self.journal_id = uuid.uuid4().hex
+        if is_binary_path(self.path):
+            queue.write_binary_snapshot(self.path, {'journal_id': self.journal_id})
+            self._remove_log()
+            return
+        data = {
+            'items': [item.to_dict() for item in queue],
+            'stats': queue.get_stats(),
+            'exported_at': datetime.now().isoformat(),
+            'journal_id': self.journal_id,
+        }
+        temp_path = self.path.with_name(f".{self.path.name}.tmp-{os.getpid()}")
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._remove_log()
+
+    def _remove_log(self):
+        try:
+            os.unlink(self.log_path)
+        except FileNotFoundError:
+            pass
+        self.log_records = 0
+
+    def append(self, records: List[Dict[str, Any]]):
+        """追加变更记录"""
+        if not records:
+            return
+        # 新日志（或与快照不匹配的残留日志）从头写
+        new_log = self.log_records == 0
+        with open(self.log_path, 'w' if new_log else 'a', encoding='utf-8') as f:
+            if new_log:
+                f.write(json.dumps({'op': 'base', 'journal_id': self.journal_id}) + "\n")
+            f.write("".join(json.dumps(record, ensure_ascii=False) + "\n" for record in records))
+            f.flush()
+            os.fsync(f.fileno())
+        self.log_records += len(records)
+
+    def needs_compaction(self, queue_size: int) -> bool:
+        """日志记录数超过阈值（且不少于队列项数，保证压缩的均摊成本为 O(1)）时需要压缩"""
+        return self.log_records > max(self.compact_records, queue_size)
+
+    def load(self, queue: 'FileQueue', data: Dict[str, Any]) -> int:
+        """快照已载入 queue 后重放匹配的日志，返回重放的记录数"""
+        self.journal_id = data.get('journal_id')
+        self.log_records = 0
+        if self.journal_id is None or not self.log_path.exists():
+            return 0
+        records = _read_records(self.log_path)
+        if not records or records[0].get('op') != 'base' or records[0].get('journal_id') != self.journal_id:
+            logger.warning(f"队列日志与快照不匹配，已忽略: {self.log_path}")
+            return 0
+        for record in records[1:]:
+            queue._apply_record(record)
+        self.log_records = len(records) - 1
+        return self.log_records
+
+
+def _read_records(path: Path) -> List[Dict[str, Any]]:
+    """
+    读取日志记录
+    崩溃时最后一行可能不完整：忽略并截断，之后追加的记录不会与其粘连
+    """
+    with open(path, 'rb+') as f:
+        data = f.read()
+        end = data.rfind(b"\n") + 1
+        if end < len(data):
+            f.truncate(end)
+    records = []
+    for line in data[:end].splitlines():
+        try:
+            records.append(json.loads(line))
+        except ValueError:
+            continue
+    return records
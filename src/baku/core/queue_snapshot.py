@@ -0,0 +1,164 @@
+"""
+文件队列二进制快照模块
+布局（整数均为小端）:
+    magic "BAKQ" | version u8 | 3 字节填充 | count u64 | header_len u32 | index_pos u64
+    header (JSON)
+    records 块: 每项一条紧凑 JSON（FileQueueItem.to_dict），顺序写入
+    index 块（位于 index_pos）:
+        flags 列: count 个 u8（低 4 位为 FileStatus 序号，FLAG_BACKUPS / FLAG_SELECTED 标记备份信息）
+        ids: ids_len u32 | 以 \\0 分隔的 UTF-8 id
+        偏移表: (count + 1) 个 u64，记录在 records 块中的起止位置
+加载时 mmap 文件，只解析头部；统计来自头部，id 索引和文件项在第一次访问时解码
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+from array import array
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+MAGIC = b"BAKQ"
+VERSION = 1
+SNAPSHOT_SUFFIX = ".bakq"
+_PREFIX = struct.Struct("<4sB3xQIQ")
+_U32 = struct.Struct("<I")
+STATUS_MASK = 0x0F
+FLAG_BACKUPS = 0x10
+FLAG_SELECTED = 0x20
+
+
+def is_binary_path(path: Union[str, Path]) -> bool:
+    """按扩展名判断是否使用二进制快照"""
+    return str(path).lower().endswith(SNAPSHOT_SUFFIX)
+
+
+def is_binary_file(path: Union[str, Path]) -> bool:
+    """按文件头判断是否为二进制快照"""
+    try:
+        with open(path, 'rb') as f:
+            return f.read(len(MAGIC)) == MAGIC
+    except OSError:
+        return False
+
+
+def write_snapshot(path: Union[str, Path], header: Dict[str, Any],
+                   rows: Iterable[Tuple[str, int, bytes]]):
+    """
+    写入二进制快照（临时文件 + os.replace），单次顺序写入
+    rows 为 (id, flags, 记录字节)，已编码的记录可直接原样写入，无需解码
+    id 列以 NUL 分隔，含 NUL 的 id 会抛出 ValueError（不写入任何内容，原快照保持不变）
+    """
+    path = Path(path)
+    header_bytes = json.dumps(header, ensure_ascii=False).encode('utf-8')
+    temp_path = path.with_name(f".{path.name}.tmp-{os.getpid()}")
+    flags_column = bytearray()
+    ids: List[str] = []
+    offsets = array('Q', [0])
+    try:
+        with open(temp_path, 'wb') as f:
+            # 先写占位前缀，记录写完后回填项数和 index 块位置
+            f.write(_PREFIX.pack(MAGIC, VERSION, 0, len(header_bytes), 0))
+            f.write(header_bytes)
+            position = 0
+            for item_id, flags, record in rows:
+                if "\0" in item_id:
+                    raise ValueError(f"队列项 id 不能包含 NUL 字符: {item_id!r}")
+                ids.append(item_id)
+                flags_column.append(flags)
+                f.write(record)
+                position += len(record)
+                offsets.append(position)
+            index_pos = f.tell()
+            if sys.byteorder != 'little':
+                offsets.byteswap()
+            ids_bytes = "\0".join(ids).encode('utf-8')
+            f.write(flags_column)
+            f.write(_U32.pack(len(ids_bytes)))
+            f.write(ids_bytes)
+            f.write(offsets.tobytes())
+            f.seek(0)
+            f.write(_PREFIX.pack(MAGIC, VERSION, len(ids), len(header_bytes), index_pos))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+    finally:
+        try:
+            os.unlink(temp_path)
+        except FileNotFoundError:
+            pass
+
+
+class BinarySnapshot:
+    """
+    只读的快照视图（mmap）
+    - header / count / flags(i) 不解码记录
+    - ids() 一次解码全部 id
+    - record(i) 返回第 i 项的原始字节，decode(i) 返回字典
+    """
+
+    def __init__(self, path: Union[str, Path]):
+        self.path = Path(path)
+        with open(self.path, 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            magic, version, count, header_len, index_pos = _PREFIX.unpack_from(self._mmap, 0)
+            if magic != MAGIC or version != VERSION:
+                raise ValueError(f"不支持的队列快照格式: {self.path}")
+            self.header: Dict[str, Any] = json.loads(self._mmap[_PREFIX.size:_PREFIX.size + header_len])
+            self.count = count
+            self._records_start = _PREFIX.size + header_len
+            position = index_pos
+            self._flags_start = position
+            position += count
+            (ids_len,) = _U32.unpack_from(self._mmap, position)
+            position += _U32.size
+            self._ids_span = (position, position + ids_len)
+            position += ids_len
+            offsets_len = (count + 1) * 8
+            if position + offsets_len != len(self._mmap):
+                # 文件被截断或写入不完整
+                raise ValueError(f"队列快照已损坏: {self.path}")
+            if sys.byteorder == 'little':
+                self._offsets = memoryview(self._mmap)[position:position + offsets_len].cast('Q')
+            else:
+                offsets = array('Q')
+                offsets.frombytes(self._mmap[position:position + offsets_len])
+                offsets.byteswap()
+                self._offsets = offsets
+            if self._offsets[count] != index_pos - self._records_start:
+                raise ValueError(f"队列快照已损坏: {self.path}")
+        except Exception:
+            self.close()
+            raise
+
+    def ids(self) -> List[str]:
+        if not self.count:
+            return []
+        start, end = self._ids_span
+        return self._mmap[start:end].decode('utf-8').split("\0")
+
+    def flags(self, index: int) -> int:
+        return self._mmap[self._flags_start + index]
+
+    def record(self, index: int) -> bytes:
+        start = self._records_start + self._offsets[index]
+        end = self._records_start + self._offsets[index + 1]
+        return self._mmap[start:end]
+
+    def decode(self, index: int) -> Dict[str, Any]:
+        return json.loads(self.record(index))
+
+    def close(self):
+        offsets = getattr(self, '_offsets', None)
+        if isinstance(offsets, memoryview):
+            offsets.release()
+        self._mmap.close()
+
+
+def open_snapshot(path: Union[str, Path]) -> Optional[BinarySnapshot]:
+    """打开二进制快照，不是二进制快照时返回 None"""
+    if not is_binary_file(path):
+        return None
+    return BinarySnapshot(path)
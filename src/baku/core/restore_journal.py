@@ -0,0 +1,292 @@
+"""
+批量恢复预写日志模块
+batch_restore_files 在修改磁盘前按组写入计划操作并 fsync（每组一次），完成记录按组或时间窗口提交；
+进程崩溃后由 baku recover 读取残留日志，继续完成（roll forward）或撤销（roll back）整批操作
+"""
+import glob
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+from loguru import logger
+from baku.config.config import load_baku_config
+
+
+JOURNAL_SUFFIX = ".journal"
+
+
+def default_journal_dir() -> Path:
+    """获取日志目录（配置项 journal_dir，默认 ~/.baku/journal）"""
+    journal_dir = load_baku_config().get('journal_dir')
+    if journal_dir:
+        return Path(journal_dir).expanduser()
+    return Path.home() / ".baku" / "journal"
+
+
+class RestoreJournal:
+    """
+    批量恢复预写日志（每行一条 JSON 记录）
+    - begin: 批次开始
+    - plan: 计划的恢复操作（seq, target, backup, trash, new_file, group），必须在操作开始前落盘；
+      new_file 为预先确定的 .new 路径（目标不存在时为 null），恢复时据此判断操作进行到哪一步；
+      group 为多个操作共用的备份的标识（不共用时为 null），这些操作全部完成后才把备份移入回收站
+    - done / failed: 操作结果，按组提交（累计 group_size 条或距上次 fsync 超过 window 秒）
+    - end: 批次正常结束，随后删除日志文件
+    """
+
+    def __init__(self, path: Path, group_size: int = 64, window: float = 0.5):
+        self.path = Path(path)
+        self.group_size = max(1, int(group_size))
+        self.window = window
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._file = open(self.path, 'a', encoding='utf-8')
+        self._lock = threading.Lock()
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.fsync_count = 0
+
+    @classmethod
+    def create(cls, directory: Optional[Path] = None, group_size: Optional[int] = None,
+               window: Optional[float] = None) -> 'RestoreJournal':
+        """在日志目录中新建一个批次日志，未指定的参数取配置项 journal_group_size / journal_group_window"""
+        config = load_baku_config()
+        directory = Path(directory) if directory else default_journal_dir()
+        batch_id = f"{time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}"
+        journal = cls(
+            directory / f"{batch_id}{JOURNAL_SUFFIX}",
+            group_size=group_size or config.get('journal_group_size', 64),
+            window=window if window is not None else config.get('journal_group_window', 0.5),
+        )
+        journal._append({'op': 'begin', 'batch': batch_id, 'time': time.time()})
+        return journal
+
+    def plan(self, operations: Iterable[Tuple[int, Path, Path, bool, Optional[Path], Optional[str]]]):
+        """
+        写入一组计划操作 (seq, target, backup, trash, new_file, group) 并立即 fsync，
+        之后才能开始执行这些操作
+        """
+        with self._lock:
+            for seq, target, backup, trash, new_file, group in operations:
+                self._write({'op': 'plan', 'seq': seq, 'target': str(target),
+                             'backup': str(backup), 'trash': trash,
+                             'new_file': str(new_file) if new_file else None,
+                             'group': group})
+            self._sync()
+
+    def record_done(self, seq: int, details: Dict[str, Any]):
+        """记录操作完成（只保留恢复所需的字段）"""
+        self._append({'op': 'done', 'seq': seq, 'method': details.get('method')})
+
+    def record_failed(self, seq: int, message: str):
+        """记录操作失败（restore_backup 失败时目标文件保持原样）"""
+        self._append({'op': 'failed', 'seq': seq, 'message': message})
+
+    def record_cancelled(self, seqs: Iterable[int]):
+        """记录未开始即被取消的操作，并立即 fsync"""
+        with self._lock:
+            for seq in seqs:
+                self._write({'op': 'cancelled', 'seq': seq})
+            self._sync()
+
+    def close(self, remove: bool = True):
+        """
+        结束日志
+        remove 为 True 表示批次已正常结束：写入 end 记录后删除日志；否则保留日志供 baku recover 处理
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            if remove:
+                self._write({'op': 'end', 'time': time.time()})
+            self._sync()
+            self._file.close()
+        if remove:
+            try:
+                self.path.unlink()
+            except OSError as e:
+                logger.warning(f"删除恢复日志失败: {self.path}, 错误: {e}")
+
+    def _append(self, record: Dict[str, Any]):
+        """追加记录，按组提交"""
+        with self._lock:
+            self._write(record)
+            self._unsynced += 1
+            if (self._unsynced >= self.group_size
+                    or time.monotonic() - self._last_sync >= self.window):
+                self._sync()
+
+    def _write(self, record: Dict[str, Any]):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+    def _sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        self.fsync_count += 1
+
+
+def list_journals(directory: Optional[Path] = None) -> List[Path]:
+    """列出残留（未正常结束）的批次日志"""
+    directory = Path(directory) if directory else default_journal_dir()
+    if not directory.is_dir():
+        return []
+    return sorted(directory.glob(f"*{JOURNAL_SUFFIX}"))
+
+
+def load_journal(path: Path) -> Tuple[List[Dict[str, Any]], Dict[int, Dict[str, Any]]]:
+    """
+    读取日志，返回 (计划操作列表, seq -> 结果记录)
+    崩溃时最后一行可能不完整，忽略无法解析的行
+    """
+    plans: List[Dict[str, Any]] = []
+    outcomes: Dict[int, Dict[str, Any]] = {}
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            op = record.get('op')
+            if op == 'plan':
+                plans.append(record)
+            elif op in ('done', 'failed', 'cancelled'):
+                outcomes[record['seq']] = record
+    return plans, outcomes
+
+
+class JournalRecovery:
+    """
+    根据残留日志恢复一致状态
+    - roll forward: 完成所有未完成的计划操作（已完成/失败/取消的操作不动），
+      共用同一备份的操作全部完成后把该备份移入回收站
+    - roll back: 按相反顺序撤销所有已开始的操作，目标文件还原为 .new 中的原内容，备份放回原位置
+    """
+
+    def __init__(self, restorer=None):
+        from baku.core.backup_restorer import BackupRestorer
+        self.restorer = restorer or BackupRestorer()
+
+    def recover(self, path: Path, rollback: bool = False) -> Dict[str, int]:
+        """处理一个日志文件，成功后删除日志，返回统计"""
+        plans, outcomes = load_journal(path)
+        stats = {'planned': len(plans), 'completed': 0, 'reverted': 0, 'skipped': 0, 'errors': 0}
+        if rollback:
+            for plan in reversed(plans):
+                outcome = outcomes.get(plan['seq'])
+                if outcome and outcome['op'] in ('failed', 'cancelled'):
+                    stats['skipped'] += 1
+                    continue
+                self._count(stats, 'reverted', self._roll_back(plan))
+        else:
+            # 共用备份的分组 -> (备份路径, 是否全部完成)
+            groups: Dict[str, Tuple[Path, bool]] = {}
+            for plan in plans:
+                outcome = outcomes.get(plan['seq'])
+                if outcome is not None:
+                    stats['skipped'] += 1
+                    ok = outcome['op'] == 'done'
+                else:
+                    ok = self._roll_forward(plan)
+                    self._count(stats, 'completed', ok)
+                group = plan.get('group')
+                if group is not None:
+                    backup, all_ok = groups.get(group, (Path(plan['backup']), True))
+                    groups[group] = (backup, all_ok and ok)
+            self._trash_shared_backups(groups)
+        self.restorer.flush_trash()
+        if stats['errors'] == 0:
+            path.unlink()
+        return stats
+
+    def _trash_shared_backups(self, groups: Dict[str, Tuple[Path, bool]]):
+        """共用的备份：所有使用它的操作都已完成时移入回收站（批次崩溃前可能已移入）"""
+        for backup, all_ok in groups.values():
+            if all_ok and backup.exists():
+                self.restorer.trash_queue.put(backup)
+                logger.info(f"共用的备份文件已加入回收站队列: {backup}")
+
+    @staticmethod
+    def _count(stats: Dict[str, int], key: str, ok: bool):
+        stats[key if ok else 'errors'] += 1
+
+    def _roll_forward(self, plan: Dict[str, Any]) -> bool:
+        target = Path(plan['target'])
+        backup = Path(plan['backup'])
+        new_file = Path(plan['new_file']) if plan.get('new_file') else None
+        _remove_temp_files(target)
+        # 硬链接 .new 已创建但目标尚未替换：删除该 .new，重新执行时再创建
+        if new_file is not None and _same_file(new_file, target):
+            new_file.unlink()
+        if backup.exists():
+            result = self.restorer.restore_backup(
+                target, backup, trash_backup=plan.get('trash', True),
+                new_file=new_file if new_file is not None and not os.path.lexists(new_file) else None
+            )
+            if not result['success']:
+                logger.error(f"继续恢复失败: {target}: {result['message']}")
+            return result['success']
+        if target.exists():
+            # 备份已被重命名到目标位置，操作已完成
+            return True
+        logger.error(f"无法继续恢复 {target}：目标和备份都不存在")
+        return False
+
+    def _roll_back(self, plan: Dict[str, Any]) -> bool:
+        target = Path(plan['target'])
+        backup = Path(plan['backup'])
+        new_file = Path(plan['new_file']) if plan.get('new_file') else None
+        _remove_temp_files(target)
+        try:
+            if new_file is not None and os.path.lexists(new_file):
+                if _same_file(new_file, target):
+                    # .new 已创建但目标尚未替换：目标仍是原内容
+                    if self.restorer.safety_store is not None:
+                        self.restorer.safety_store.release(target, new_file)
+                    new_file.unlink()
+                    return True
+                # 目标已替换为备份内容（或 .new 为重命名、目标尚未放置）
+                self._return_backup(target, backup)
+                os.replace(new_file, target)
+                return True
+            if new_file is not None:
+                # 目标原本存在但没有 .new：操作尚未开始，或内容相同被跳过（备份可能已移入回收站）
+                if not backup.exists() and target.exists():
+                    shutil.copy2(target, backup)
+                return True
+            # 目标原本不存在
+            self._return_backup(target, backup)
+            return True
+        except OSError as e:
+            logger.error(f"撤销恢复失败: {target}: {e}")
+            return False
+
+    @staticmethod
+    def _return_backup(target: Path, backup: Path):
+        """撤销时处理目标位置上的备份内容：备份仍在则删除目标，否则放回备份位置"""
+        if not target.exists():
+            return
+        if backup.exists():
+            target.unlink()
+        else:
+            shutil.move(str(target), str(backup))
+
+
+def _remove_temp_files(target: Path):
+    """删除崩溃时残留的恢复临时文件"""
+    for temp_file in target.parent.glob(f"{glob.escape('.' + target.name)}.baku-tmp-*"):
+        try:
+            temp_file.unlink()
+        except OSError:
+            pass
+
+
+def _same_file(a: Path, b: Path) -> bool:
+    try:
+        return os.path.samefile(a, b)
+    except OSError:
+        return False
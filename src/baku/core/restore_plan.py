@@ -0,0 +1,150 @@
+"""
+批量恢复计划模块
+BackupRestorer.preview_many 的返回结构：每个文件一条紧凑记录，冲突在整个计划范围内一次检测
+"""
+import os
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+
+# 冲突类型
+DUPLICATE_TARGET = "duplicate_target"      # 多个文件项恢复到同一目标
+NEW_FILE_COLLISION = "new_file_collision"  # .new 路径与其他项的 .new / 目标 / 备份相同
+BACKUP_IS_TARGET = "backup_is_target"      # 某项的备份是另一项的目标，结果取决于恢复顺序
+SHARED_BACKUP = "shared_backup"            # 多个文件项使用同一备份，重命名恢复会被第一项消耗
+
+
+def path_key(path: Path) -> str:
+    """冲突检测用的路径键（绝对路径，Windows 下忽略大小写）"""
+    return os.path.normcase(os.path.abspath(path))
+
+
+@dataclass
+class RestorePlanEntry:
+    """单个文件的恢复预览"""
+    index: int
+    target: Path
+    backup: Path
+    target_exists: bool
+    target_size: int
+    backup_exists: bool
+    backup_size: int
+    backup_mtime: Optional[float]
+    new_file: Optional[Path]
+    # rename / copy，备份不存在时为 None
+    method: Optional[str]
+    conflicts: List[str] = field(default_factory=list)
+
+    @property
+    def can_restore(self) -> bool:
+        return self.backup_exists and not self.conflicts
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            'index': self.index,
+            'target': str(self.target),
+            'backup': str(self.backup),
+            'target_exists': self.target_exists,
+            'target_size': self.target_size,
+            'backup_exists': self.backup_exists,
+            'backup_size': self.backup_size,
+            'backup_mtime': self.backup_mtime,
+            'new_file': str(self.new_file) if self.new_file else None,
+            'method': self.method,
+            'conflicts': list(self.conflicts),
+            'can_restore': self.can_restore,
+        }
+
+
+@dataclass
+class RestorePlanConflict:
+    """计划中的一处冲突：类型、涉及的路径及文件项序号"""
+    kind: str
+    path: Path
+    indexes: List[int]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {'kind': self.kind, 'path': str(self.path), 'indexes': list(self.indexes)}
+
+
+@dataclass
+class RestorePlan:
+    """批量恢复计划"""
+    entries: List[RestorePlanEntry]
+    conflicts: List[RestorePlanConflict]
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.backup_size for entry in self.entries if entry.backup_exists)
+
+    @property
+    def missing_backups(self) -> List[RestorePlanEntry]:
+        return [entry for entry in self.entries if not entry.backup_exists]
+
+    @property
+    def ok(self) -> bool:
+        """没有冲突且所有备份都存在"""
+        return not self.conflicts and not self.missing_backups
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'entries': [entry.to_dict() for entry in self.entries],
+            'conflicts': [conflict.to_dict() for conflict in self.conflicts],
+            'total_bytes': self.total_bytes,
+            'ok': self.ok,
+        }
+
+
+def detect_conflicts(entries: List[RestorePlanEntry]) -> List[RestorePlanConflict]:
+    """
+    一次遍历检测整个计划的冲突，并把冲突类型写入相关条目
+    - 同一目标出现多次
+    - .new 路径与其他项的 .new、目标或备份相同
+    - 某项的备份同时是另一项的目标
+    - 多个文件项使用同一备份（batch_restore_files 对这些项改为复制，全部成功后才移入回收站）
+    """
+    targets: Dict[str, List[int]] = {}
+    backups: Dict[str, List[int]] = {}
+    new_files: Dict[str, List[int]] = {}
+    for entry in entries:
+        targets.setdefault(path_key(entry.target), []).append(entry.index)
+        backups.setdefault(path_key(entry.backup), []).append(entry.index)
+        if entry.new_file is not None:
+            new_files.setdefault(path_key(entry.new_file), []).append(entry.index)
+
+    by_index = {entry.index: entry for entry in entries}
+    conflicts: List[RestorePlanConflict] = []
+
+    def add(kind: str, indexes: List[int]):
+        entry = by_index[indexes[0]]
+        if kind == NEW_FILE_COLLISION:
+            path = entry.new_file
+        elif kind == SHARED_BACKUP:
+            path = entry.backup
+        else:
+            path = entry.target
+        conflicts.append(RestorePlanConflict(kind, path, indexes))
+        for index in indexes:
+            if kind not in by_index[index].conflicts:
+                by_index[index].conflicts.append(kind)
+
+    for key, indexes in targets.items():
+        if len(indexes) > 1:
+            add(DUPLICATE_TARGET, indexes)
+        backup_owners = [index for index in backups.get(key, ()) if index not in indexes]
+        if backup_owners:
+            add(BACKUP_IS_TARGET, indexes + backup_owners)
+    for indexes in backups.values():
+        if len(indexes) > 1 and len({path_key(by_index[index].target) for index in indexes}) > 1:
+            # 同一目标重复时已按 duplicate_target 报告
+            add(SHARED_BACKUP, indexes)
+    for key, indexes in new_files.items():
+        others = [index for index in targets.get(key, []) + backups.get(key, [])
+                  if index not in indexes]
+        if not others and len({path_key(by_index[index].target) for index in indexes}) == 1:
+            # 同一目标重复时 .new 必然相同，已按 duplicate_target 报告
+            continue
+        add(NEW_FILE_COLLISION, indexes + others)
+    return conflicts
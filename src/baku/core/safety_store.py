@@ -0,0 +1,223 @@
+"""
+.new 安全副本去重存储模块
+按内容哈希（sha256）保存原文件，.new 只是指向存储对象的硬链接（不支持时 reflink），
+反复恢复同一批文件时相同内容只占一份空间；baku dedup gc 删除不再被引用的对象
+"""
+import hashlib
+import os
+import threading
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+from loguru import logger
+from baku.config.config import load_baku_config
+from baku.core.copy_engine import CopyEngine
+
+
+class SafetyStore:
+    """
+    内容寻址的安全副本存储
+    - objects/<前 2 位>/<其余位>: 以 sha256 命名的对象
+    - refs/<前 2 位>/<其余位>: 以 reflink 引用对象的 .new 路径（硬链接由链接数体现，无需记录）
+    - 对象不存在时直接把原文件硬链接进存储（不复制数据）；以硬链接共享对象的 .new 不应原地修改
+    - 存储须与目标文件在同一文件系统，否则返回 None 由调用方按原方式创建 .new
+    """
+
+    HASH_CHUNK_SIZE = 1024 * 1024
+    # 哈希缓存条目上限（按 dev, ino, size, mtime_ns 缓存）
+    DIGEST_CACHE_SIZE = 4096
+
+    def __init__(self, root: Path, copy_engine: Optional[CopyEngine] = None):
+        self.root = Path(root).expanduser()
+        self.objects_dir = self.root / "objects"
+        self.refs_dir = self.root / "refs"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.copy_engine = copy_engine or CopyEngine()
+        self.device = os.stat(self.objects_dir).st_dev
+        self._digests: Dict[Tuple[int, int, int, int], str] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, copy_engine: Optional[CopyEngine] = None) -> Optional['SafetyStore']:
+        """按配置项 safety_store 创建，未配置时返回 None（不启用去重）"""
+        root = load_baku_config().get('safety_store')
+        if not root:
+            return None
+        try:
+            return cls(Path(root), copy_engine)
+        except OSError as e:
+            logger.warning(f"无法使用安全副本存储 {root}: {e}")
+            return None
+
+    def digest(self, path: Path, st: Optional[os.stat_result] = None) -> str:
+        """计算文件内容的 sha256，同一 inode 未修改时复用结果"""
+        st = st or os.stat(path)
+        key = (st.st_dev, st.st_ino, st.st_size, st.st_mtime_ns)
+        with self._lock:
+            cached = self._digests.get(key)
+        if cached is not None:
+            return cached
+        h = hashlib.sha256()
+        buf = memoryview(bytearray(self.HASH_CHUNK_SIZE))
+        with open(path, 'rb') as f:
+            while True:
+                n = f.readinto(buf)
+                if not n:
+                    break
+                h.update(buf[:n])
+        digest = h.hexdigest()
+        with self._lock:
+            if len(self._digests) >= self.DIGEST_CACHE_SIZE:
+                self._digests.clear()
+            self._digests[key] = digest
+        return digest
+
+    def object_path(self, digest: str) -> Path:
+        return self.objects_dir / digest[:2] / digest[2:]
+
+    def _ref_path(self, digest: str) -> Path:
+        return self.refs_dir / digest[:2] / digest[2:]
+
+    def link_new_file(self, target_file: Path, new_file: Path) -> Optional[str]:
+        """
+        将目标文件当前内容存入存储，并在 new_file 创建指向对象的链接
+        返回方式 dedup-link / dedup-reflink；不在同一文件系统或都不支持时返回 None
+        """
+        st = os.stat(target_file)
+        if st.st_dev != self.device:
+            return None
+        digest = self.digest(target_file, st)
+        obj = self.object_path(digest)
+        try:
+            if os.stat(obj).st_size != st.st_size:
+                # 对象被原地修改过，内容已与名称不符
+                logger.warning(f"存储对象已损坏，重新创建: {obj}")
+                obj.unlink()
+        except FileNotFoundError:
+            pass
+        if not obj.exists():
+            obj.parent.mkdir(exist_ok=True)
+            try:
+                os.link(target_file, obj)
+            except FileExistsError:
+                pass
+            except OSError:
+                if not self.copy_engine.clone(target_file, obj):
+                    return None
+        try:
+            os.link(obj, new_file)
+            return "dedup-link"
+        except FileExistsError:
+            raise
+        except OSError:
+            pass
+        if not self.copy_engine.clone(obj, new_file):
+            return None
+        ref = self._ref_path(digest)
+        ref.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, open(ref, 'a', encoding='utf-8') as f:
+            f.write(f"{os.path.abspath(new_file)}\n")
+        return "dedup-reflink"
+
+    def release(self, target_file: Path, new_file: Path):
+        """恢复失败：对象仍与目标共用 inode 时移除对象，避免目标后续修改破坏存储内容"""
+        try:
+            digest = self.digest(new_file)
+            obj = self.object_path(digest)
+            if os.path.samefile(obj, target_file):
+                obj.unlink()
+        except OSError:
+            pass
+
+    def gc(self, dry_run: bool = False) -> Dict[str, int]:
+        """
+        删除未被引用的对象：链接数为 1（只剩存储自身）且没有仍然存在的 reflink 引用
+        返回 {objects, removed, kept, freed_bytes}
+        """
+        stats = {'objects': 0, 'removed': 0, 'kept': 0, 'freed_bytes': 0}
+        for prefix in _scandir_dirs(self.objects_dir):
+            for entry in _scandir_files(prefix.path):
+                stats['objects'] += 1
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                digest = prefix.name + entry.name
+                if st.st_nlink > 1 or self._live_refs(digest, st, dry_run):
+                    stats['kept'] += 1
+                    continue
+                stats['removed'] += 1
+                stats['freed_bytes'] += st.st_size
+                if dry_run:
+                    continue
+                try:
+                    os.unlink(entry.path)
+                except OSError as e:
+                    logger.warning(f"删除存储对象失败: {entry.path}, 错误: {e}")
+            if not dry_run:
+                _remove_if_empty(prefix.path)
+        return stats
+
+    def _live_refs(self, digest: str, st: os.stat_result, dry_run: bool) -> bool:
+        """检查 reflink 引用是否仍然存在（大小和修改时间与对象一致），并清理失效记录"""
+        ref = self._ref_path(digest)
+        try:
+            with open(ref, 'r', encoding='utf-8') as f:
+                paths = [line.rstrip("\n") for line in f if line.strip()]
+        except OSError:
+            return False
+        live = []
+        for path in paths:
+            try:
+                ref_st = os.stat(path)
+            except OSError:
+                continue
+            if (ref_st.st_size, ref_st.st_mtime_ns) == (st.st_size, st.st_mtime_ns):
+                live.append(path)
+        if not dry_run:
+            try:
+                if live:
+                    if len(live) != len(paths):
+                        ref.write_text("".join(f"{path}\n" for path in live), encoding='utf-8')
+                else:
+                    ref.unlink()
+                    _remove_if_empty(ref.parent)
+            except OSError as e:
+                logger.warning(f"更新引用记录失败: {ref}, 错误: {e}")
+        return bool(live)
+
+    def get_stats(self) -> Dict[str, int]:
+        """对象数量、占用字节数及被引用次数（硬链接数减 1）"""
+        stats = {'objects': 0, 'bytes': 0, 'links': 0}
+        for prefix in _scandir_dirs(self.objects_dir):
+            for entry in _scandir_files(prefix.path):
+                try:
+                    st = entry.stat(follow_symlinks=False)
+                except OSError:
+                    continue
+                stats['objects'] += 1
+                stats['bytes'] += st.st_size
+                stats['links'] += st.st_nlink - 1
+        return stats
+
+
+def _scandir_dirs(path: Path):
+    try:
+        with os.scandir(path) as entries:
+            return [entry for entry in entries if entry.is_dir(follow_symlinks=False)]
+    except OSError:
+        return []
+
+
+def _scandir_files(path: str):
+    try:
+        with os.scandir(path) as entries:
+            return [entry for entry in entries if entry.is_file(follow_symlinks=False)]
+    except OSError:
+        return []
+
+
+def _remove_if_empty(path):
+    try:
+        os.rmdir(path)
+    except OSError:
+        pass
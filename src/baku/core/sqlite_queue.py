@@ -0,0 +1,346 @@
+"""
+SQLite 文件队列模块
+与 FileQueue 接口相同、文件项保存在 SQLite 数据库（WAL 模式）中的队列：
+队列不必整个载入内存，GUI、CLI 和 API 服务可以跨进程、跨重启共用同一个队列。
+配置项 queue_db 指定数据库路径后，MultiFileManager 默认使用该队列
+"""
+import atexit
+import json
+import sqlite3
+import threading
+import weakref
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+from loguru import logger
+from baku.config.config import load_baku_config
+from baku.core import queue_snapshot
+from baku.core.file_queue import FileQueue, FileQueueItem, FileStatus
+
+# seq 保持加入顺序（移除后重新加入的项排在末尾，与 FileQueue 一致）；
+# status / size / has_backups / selected_backup 为查询用的列，data 为完整的文件项 JSON
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS items (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    id TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    has_backups INTEGER NOT NULL,
+    selected_backup TEXT,
+    data TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS items_status ON items (status);
+CREATE INDEX IF NOT EXISTS items_selected_backup ON items (selected_backup);
+"""
+
+_INSERT = ("INSERT OR IGNORE INTO items (status, size, has_backups, selected_backup, data, id) "
+           "VALUES (?, ?, ?, ?, ?, ?)")
+_UPDATE = ("UPDATE items SET status = ?, size = ?, has_backups = ?, selected_backup = ?, data = ? "
+           "WHERE id = ?")
+
+# 从数据库刷新已缓存的文件项时复制的字段（progress 是本进程的瞬时状态，不覆盖）
+_ITEM_FIELDS = tuple(slot for slot in FileQueueItem.__slots__
+                     if slot not in ('id', 'progress', '_queue', '__weakref__'))
+
+
+def _row(item: FileQueueItem) -> Tuple[Any, ...]:
+    """文件项对应的数据库行（参数顺序与 _INSERT / _UPDATE 相同）"""
+    selected = item.selected_backup
+    return (
+        item.status.value,
+        item.size,
+        int(item.has_backups),
+        str(selected) if selected is not None else None,
+        json.dumps(item.to_dict(), ensure_ascii=False, separators=(',', ':')),
+        item.id,
+    )
+
+
+class SQLiteFileQueue(FileQueue):
+    """
+    SQLite 文件队列
+    - 查询（按状态、可恢复项、统计）由数据库索引完成，只解码返回的文件项
+    - 已取出的文件项按 id 缓存（弱引用），同一 id 返回同一对象，可像 FileQueue 的文件项一样直接修改
+    - 文件项的修改先记为待写回，最迟 FLUSH_INTERVAL 秒后（或下一次查询、flush()、进程退出时）
+      一次事务写回，连续的修改（如 update_status 的状态和消息）合并为一次写入；
+      progress 为瞬时状态，只随其他修改一起写回
+    - 其他进程写入的变化在下一次查询时同步到未修改的缓存文件项
+    """
+
+    FLUSH_INTERVAL = 0.5
+
+    def __init__(self, db_path: Path):
+        # 基类属性（_lock 等）照常初始化；数据库本身即持久化，不使用 FileQueue 的日志
+        super().__init__(journal=False)
+        self.db_path = Path(db_path).expanduser()
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        # 自动提交模式，批量写入时显式开启事务；多个线程共用连接，由基类的 _lock 串行化
+        self._conn = sqlite3.connect(str(self.db_path), timeout=30,
+                                     isolation_level=None, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+        self._live: 'weakref.WeakValueDictionary[str, FileQueueItem]' = weakref.WeakValueDictionary()
+        self._pending: Dict[str, FileQueueItem] = {}
+        self._flush_timer: Optional[threading.Timer] = None
+        atexit.register(_flush_at_exit, weakref.ref(self))
+
+    @classmethod
+    def from_config(cls) -> Optional['SQLiteFileQueue']:
+        """按配置项 queue_db 创建，未配置时返回 None"""
+        db_path = load_baku_config().get('queue_db')
+        if not db_path:
+            return None
+        try:
+            return cls(Path(db_path))
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"无法打开队列数据库 {db_path}: {e}")
+            return None
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    def _attach(self, item: FileQueueItem):
+        item._queue = self
+        self._live[item.id] = item
+
+    def _load(self, item_id: str, data: str) -> FileQueueItem:
+        """由数据库行得到文件项：已缓存的项直接返回（没有待写回的修改时先同步数据库中的内容）"""
+        item = self._live.get(item_id)
+        if item is None:
+            item = FileQueueItem.from_dict(json.loads(data))
+            self._attach(item)
+        elif item_id not in self._pending:
+            fresh = FileQueueItem.from_dict(json.loads(data))
+            for field in _ITEM_FIELDS:
+                setattr(item, field, getattr(fresh, field))
+        return item
+
+    def _query(self, sql: str, params: Tuple[Any, ...] = ()) -> List[FileQueueItem]:
+        """执行返回 (id, data) 的查询"""
+        self.flush()
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+            return [self._load(item_id, data) for item_id, data in rows]
+
+    def flush(self):
+        """写回待写回的文件项修改"""
+        with self._lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            if not self._pending:
+                return
+            pending, self._pending = self._pending, {}
+            with self._transaction() as conn:
+                conn.executemany(_UPDATE, [_row(item) for item in pending.values()])
+
+    def close(self):
+        """写回修改并关闭数据库"""
+        with self._lock:
+            if self._conn is None:
+                return
+            self.flush()
+            self._conn.close()
+            self._conn = None
+
+    @property
+    def items(self) -> List[FileQueueItem]:
+        """按加入顺序排列的文件项列表（快照）"""
+        return list(self)
+
+    @items.setter
+    def items(self, items: List[FileQueueItem]):
+        with self._transaction() as conn:
+            self._clear(conn)
+            for item in items:
+                if conn.execute(_INSERT, _row(item)).rowcount:
+                    self._attach(item)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM items").fetchone()[0]
+
+    def __iter__(self) -> Iterator[FileQueueItem]:
+        """按加入顺序分页遍历，不一次读入整个队列"""
+        for page in self.iter_item_pages():
+            yield from page
+
+    def iter_item_pages(self, status: Optional[FileStatus] = None,
+                        page_size: Optional[int] = None) -> Iterator[List[FileQueueItem]]:
+        """
+        按加入顺序分页读取（按 seq 续读），内存中只保留当前页
+        每页读取前先写回待写回的修改；遍历期间状态被改掉的项不影响后续分页
+        """
+        page_size = page_size or self.PAGE_SIZE
+        if status is None:
+            sql = "SELECT seq, id, data FROM items WHERE seq > ? ORDER BY seq LIMIT ?"
+            params: Tuple[Any, ...] = ()
+        else:
+            sql = "SELECT seq, id, data FROM items WHERE status = ? AND seq > ? ORDER BY seq LIMIT ?"
+            params = (status.value,)
+        last_seq = 0
+        while True:
+            self.flush()
+            with self._lock:
+                rows = self._conn.execute(sql, params + (last_seq, page_size)).fetchall()
+                page = [self._load(item_id, data) for _, item_id, data in rows]
+            if not rows:
+                return
+            last_seq = rows[-1][0]
+            yield page
+
+    def __contains__(self, item_id: str) -> bool:
+        with self._lock:
+            return self._conn.execute("SELECT 1 FROM items WHERE id = ?", (item_id,)).fetchone() is not None
+
+    def add_item(self, item: FileQueueItem) -> bool:
+        """添加文件项"""
+        with self._lock:
+            if not self._conn.execute(_INSERT, _row(item)).rowcount:
+                return False
+            self._attach(item)
+            return True
+
+    def get_item(self, item_id: str) -> Optional[FileQueueItem]:
+        """获取文件项"""
+        items = self._query("SELECT id, data FROM items WHERE id = ?", (item_id,))
+        return items[0] if items else None
+
+    def remove_item(self, item_id: str) -> bool:
+        """移除文件项"""
+        with self._lock:
+            if not self._conn.execute("DELETE FROM items WHERE id = ?", (item_id,)).rowcount:
+                return False
+            self._pending.pop(item_id, None)
+            item = self._live.pop(item_id, None)
+            if item is not None:
+                item._queue = None
+            return True
+
+    def clear(self):
+        """清空队列"""
+        with self._transaction() as conn:
+            self._clear(conn)
+
+    def _clear(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM items")
+        for item in list(self._live.values()):
+            item._queue = None
+        self._live = weakref.WeakValueDictionary()
+        self._pending = {}
+
+    def _on_status_change(self, item_id: str, old: Optional[FileStatus], new: FileStatus):
+        """文件项状态变化时记录待写回"""
+        if old is not new:
+            self._mark(item_id, 'status')
+
+    def _mark(self, item_id: str, kind: str):
+        """记录待写回的文件项（kind 仅用于与 FileQueue 接口一致，整行写回）"""
+        with self._lock:
+            item = self._live.get(item_id)
+            if item is None:
+                return
+            self._pending[item_id] = item
+            if self._flush_timer is None:
+                self._flush_timer = threading.Timer(self.FLUSH_INTERVAL, self._flush_pending)
+                self._flush_timer.daemon = True
+                self._flush_timer.start()
+
+    def _flush_pending(self):
+        try:
+            with self._lock:
+                if self._conn is not None:
+                    self.flush()
+        except sqlite3.Error as e:
+            logger.warning(f"写回队列数据库失败: {self.db_path}, 错误: {e}")
+
+    def get_items_by_status(self, status: FileStatus) -> List[FileQueueItem]:
+        """按状态获取文件项"""
+        return self._query("SELECT id, data FROM items WHERE status = ? ORDER BY seq", (status.value,))
+
+    def get_items_with_backups(self) -> List[FileQueueItem]:
+        """获取有备份文件的项"""
+        return self._query("SELECT id, data FROM items WHERE has_backups ORDER BY seq")
+
+    def get_restorable_items(self) -> List[FileQueueItem]:
+        """获取可恢复的文件项"""
+        return self._query(
+            "SELECT id, data FROM items WHERE selected_backup IS NOT NULL AND has_backups ORDER BY seq")
+
+    def get_status_stats(self) -> Dict[FileStatus, int]:
+        """获取状态统计 - 返回每个状态的文件数量"""
+        self.flush()
+        counts = {status: 0 for status in FileStatus}
+        with self._lock:
+            for value, count in self._conn.execute("SELECT status, COUNT(*) FROM items GROUP BY status"):
+                counts[FileStatus(value)] = count
+        return counts
+
+    def get_stats(self) -> Dict[str, int]:
+        """获取统计信息"""
+        counts = self.get_status_stats()
+        stats = {'total': sum(counts.values())}
+        for status in FileStatus:
+            stats[status.value] = counts[status]
+        return stats
+
+    def get_total_size(self) -> int:
+        """获取总文件大小"""
+        self.flush()
+        with self._lock:
+            return self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM items").fetchone()[0]
+
+    def save_to_file(self, file_path: Path) -> bool:
+        """导出到队列文件（JSON，.bakq 为二进制快照）"""
+        try:
+            if queue_snapshot.is_binary_path(file_path):
+                # 导出文件项的副本，不改变本队列中文件项的归属
+                export = FileQueue(journal=False)
+                export.items = [FileQueueItem.from_dict(item.to_dict()) for item in self]
+                export.write_binary_snapshot(Path(file_path), {})
+            else:
+                with open(file_path, 'w', encoding='utf-8') as f:
+                    f.write(self.to_json())
+            return True
+        except Exception as e:
+            logger.error(f"保存队列失败: {file_path}, 错误: {e}")
+            return False
+
+    def load_from_file(self, file_path: Path) -> bool:
+        """从队列文件导入，替换数据库中的全部文件项"""
+        source = FileQueue(journal=False)
+        if not source.load_from_file(file_path):
+            return False
+        try:
+            self.items = source.items
+            return True
+        except sqlite3.Error as e:
+            logger.error(f"加载队列失败: {file_path}, 错误: {e}")
+            return False
+
+
+def _flush_at_exit(ref: 'weakref.ReferenceType[SQLiteFileQueue]'):
+    queue = ref()
+    if queue is None:
+        return
+    try:
+        queue.close()
+    except sqlite3.Error as e:
+        logger.warning(f"写回队列数据库失败: {queue.db_path}, 错误: {e}")
+
+
+def create_file_queue() -> FileQueue:
+    """配置了 queue_db 时返回 SQLiteFileQueue，否则返回内存中的 FileQueue"""
+    queue = SQLiteFileQueue.from_config()
+    if queue is None:
+        return FileQueue()
+    return queue
@@ -0,0 +1,118 @@
+"""
+回收站队列模块
+恢复成功后的备份文件先加入队列，由后台线程批量调用 send2trash，
+写 .trashinfo、跨设备移动等耗时操作不再计入单个文件的恢复时间
+"""
+import atexit
+import threading
+from pathlib import Path
+from typing import List, Optional, Union
+from loguru import logger
+from send2trash import send2trash
+
+
+class TrashQueue:
+    """
+    后台回收站队列
+    - put() 只入队，立即返回
+    - 后台线程每次取出当前所有待处理路径，一次 send2trash 调用批量处理
+    - flush() 阻塞直到入队的路径全部处理完；close() 处理完剩余路径后停止线程
+    - 进程退出时自动 close()
+    """
+
+    def __init__(self, batch_size: int = 256):
+        self.batch_size = batch_size
+        self._pending: List[str] = []
+        self._in_flight = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self.trashed = 0
+        self.failed: List[str] = []
+        atexit.register(self.close)
+
+    def put(self, path: Union[str, Path]):
+        """将路径加入回收站队列"""
+        with self._cond:
+            if self._closed:
+                # 已关闭时直接同步处理，保证不丢失
+                self._trash_batch([str(path)])
+                return
+            self._pending.append(str(path))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="baku-trash", daemon=True)
+                self._thread.start()
+            self._cond.notify_all()
+
+    def pending_count(self) -> int:
+        """尚未处理完的路径数"""
+        with self._cond:
+            return len(self._pending) + self._in_flight
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """阻塞直到队列清空，超时返回 False"""
+        with self._cond:
+            self._cond.notify_all()
+            return self._cond.wait_for(
+                lambda: not self._pending and not self._in_flight, timeout=timeout
+            )
+
+    def close(self):
+        """处理完剩余路径并停止后台线程"""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                if not self._pending:
+                    return
+                batch = self._pending[:self.batch_size]
+                del self._pending[:self.batch_size]
+                self._in_flight = len(batch)
+            try:
+                self._trash_batch(batch)
+            finally:
+                with self._cond:
+                    self._in_flight = 0
+                    self._cond.notify_all()
+
+    def _trash_batch(self, batch: List[str]):
+        """批量移入回收站，整批失败时逐个重试以定位失败的文件"""
+        try:
+            send2trash(batch)
+            self.trashed += len(batch)
+            logger.info(f"已将 {len(batch)} 个备份文件移入回收站")
+            return
+        except Exception as e:
+            if len(batch) == 1:
+                self.failed.append(batch[0])
+                logger.warning(f"备份文件移入回收站失败: {batch[0]}, 错误: {e}")
+                return
+        for path in batch:
+            try:
+                send2trash(path)
+                self.trashed += 1
+            except Exception as e:
+                self.failed.append(path)
+                logger.warning(f"备份文件移入回收站失败: {path}, 错误: {e}")
+
+
+_default_queue: Optional[TrashQueue] = None
+_default_lock = threading.Lock()
+
+
+def get_trash_queue() -> TrashQueue:
+    """进程内共享的回收站队列"""
+    global _default_queue
+    with _default_lock:
+        if _default_queue is None:
+            _default_queue = TrashQueue()
+        return _default_queue
@@ -6,6 +6,8 @@ from baku.core.backup_finder import BackupFinder
 from baku.core.backup_restorer import BackupRestorer
 from baku.core.file_queue import FileQueueItem, FileStatus
 from baku.core.multi_file_manager import MultiFileManager
+from baku.core.index_watcher import start_configured_watcher
+from baku.cli.commands import run_command
 from loguru import logger
 import time, json, re, sys
 from pathlib import Path
@@ -25,6 +27,8 @@ class BakUGUI:
         self.backup_finder = BackupFinder()
         self.backup_restorer = BackupRestorer()
         self.file_manager = MultiFileManager(self.backup_finder, self.backup_restorer)
+        # 配置了 watch_roots 时由 inotify 实时维护备份索引
+        self.index_watcher = start_configured_watcher(self.backup_finder)
         
         self._setup_ui()
         self._setup_logging()
@@ -213,6 +217,10 @@ class BakUGUI:
 
 def main():
     """主函数"""
+    # 维护子命令（如 baku index build <root>）不启动界面
+    exit_code = run_command(sys.argv[1:])
+    if exit_code is not None:
+        sys.exit(exit_code)
     root = TkinterDnD.Tk()
     app = BakUGUI(root)
     root.mainloop()
@@ -15,7 +15,8 @@ sys.path.insert(0, str(project_root / "src"))
 
 from baku.core.backup_finder import BackupFinder
 from baku.core.backup_restorer import BackupRestorer
-from baku.core.file_queue import FileQueue, FileStatus
+from baku.core.file_queue import FileStatus
+from baku.core.sqlite_queue import create_file_queue
 
 
 class BakUAPI:
@@ -24,7 +25,7 @@ class BakUAPI:
     def __init__(self):
         self.backup_finder = BackupFinder()
         self.backup_restorer = BackupRestorer()
-        self.file_queue = FileQueue()
+        self.file_queue = create_file_queue()
         self.js_callback = None
         
     def set_js_callback(self, callback):
@@ -51,7 +52,8 @@ class BakUAPI:
         Returns:
             扫描结果列表，每个项目包含:
             - backup_found: bool 是否找到备份
-            - backup_path: str 备份路径（如果找到）
+            - backup_path: str 最新备份路径（如果找到）
+            - versions: list 所有备份版本（按时间从新到旧）
             - message: str 结果消息
         """
         results = []
@@ -59,26 +61,27 @@ class BakUAPI:
         try:
             self.log(f"开始扫描 {len(file_paths)} 个文件的备份...")
             
-            for i, file_path in enumerate(file_paths):
+            # 批量查找所有备份版本（本地 + 集中备份库），取最新版本
+            found = self.backup_finder.find_backups_many(Path(file_path) for file_path in file_paths)
+            
+            for file_path in file_paths:
                 try:
-                    self.log(f"扫描 {os.path.basename(file_path)}...")
+                    versions = found.get(Path(file_path))
                     
-                    # 查找备份
-                    backup_files = self.backup_finder.find_backups(file_path)
-                    
-                    if backup_files:
-                        # 找到备份，选择最新的
-                        latest_backup = max(backup_files, key=lambda x: x.get('timestamp', 0))
+                    if versions:
+                        backup_path = versions[0]['path']
                         results.append({
                             'backup_found': True,
-                            'backup_path': latest_backup['path'],
-                            'message': f"找到备份: {latest_backup['path']}"
+                            'backup_path': backup_path,
+                            'versions': versions,
+                            'message': f"找到备份: {backup_path}（共 {len(versions)} 个版本）"
                         })
                         self.log(f"✓ {os.path.basename(file_path)} 找到备份", 'success')
                     else:
                         results.append({
                             'backup_found': False,
                             'backup_path': None,
+                            'versions': [],
                             'message': '未找到备份文件'
                         })
                         self.log(f"⚠ {os.path.basename(file_path)} 未找到备份", 'warning')
@@ -88,6 +91,7 @@ class BakUAPI:
                     results.append({
                         'backup_found': False,
                         'backup_path': None,
+                        'versions': [],
                         'message': error_msg
                     })
                     self.log(f"✗ {os.path.basename(file_path)} 扫描失败: {error_msg}", 'error')
@@ -119,12 +123,15 @@ class BakUAPI:
         try:
             self.log(f"开始恢复 {len(file_paths)} 个文件...")
             
+            # 批量查找所有备份版本
+            found = self.backup_finder.find_backups_many(Path(file_path) for file_path in file_paths)
+            
             for i, file_path in enumerate(file_paths):
                 try:
                     self.log(f"恢复 {os.path.basename(file_path)}...")
                     
                     # 先查找备份
-                    backup_files = self.backup_finder.find_backups(file_path)
+                    backup_files = found.get(Path(file_path))
                     
                     if not backup_files:
                         error_msg = "未找到备份文件"
@@ -140,10 +147,13 @@ class BakUAPI:
                     latest_backup = max(backup_files, key=lambda x: x.get('timestamp', 0))
                     backup_path = latest_backup['path']
                     
-                    # 执行恢复
-                    success = self.backup_restorer.restore_file(backup_path, file_path)
+                    # 执行恢复，集中备份库中的版本恢复后保留
+                    result = self.backup_restorer.restore_backup(
+                        Path(file_path), Path(backup_path),
+                        trash_backup=latest_backup.get('source') != 'store'
+                    )
                     
-                    if success:
+                    if result['success']:
                         results.append({
                             'success': True,
                             'message': f"恢复成功 <- {backup_path}",
@@ -151,7 +161,7 @@ class BakUAPI:
                         })
                         self.log(f"✓ {os.path.basename(file_path)} 恢复成功", 'success')
                     else:
-                        error_msg = "恢复失败"
+                        error_msg = result['message']
                         results.append({
                             'success': False,
                             'message': error_msg,
@@ -229,7 +239,7 @@ class BakUAPI:
             return {
                 'backup_locations': self.backup_finder.backup_locations,
                 'file_patterns': self.backup_finder.file_patterns,
-                'max_depth': getattr(self.backup_finder, 'max_depth', 3)
+                'max_depth': self.backup_finder.max_depth
             }
         except Exception as e:
             self.log(f"获取配置失败: {str(e)}", 'error')
@@ -3,6 +3,7 @@ from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
 from typing import List, Optional
 from baku.core.multi_file_manager import MultiFileManager
+from baku.core.index_watcher import start_configured_watcher
 from pathlib import Path
 import uvicorn
 
@@ -16,6 +17,8 @@ app.add_middleware(
 )
 
 manager = MultiFileManager()
+# 配置了 watch_roots 时由 inotify 实时维护备份索引，查找不再访问磁盘
+index_watcher = start_configured_watcher(manager.backup_finder)
 
 class FileInfo(BaseModel):
     name: str
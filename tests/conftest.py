@@ -0,0 +1,65 @@
+"""
+测试公共夹具
+"""
+from pathlib import Path
+from typing import List, Optional, Union
+
+import pytest
+from loguru import logger
+
+from baku.core.backup_restorer import BackupRestorer
+
+
+class FakeTrashQueue:
+    """代替回收站队列：同步删除文件并记录路径，测试不会往系统回收站里放东西"""
+
+    def __init__(self):
+        self.trashed: List[Path] = []
+
+    def put(self, path: Union[str, Path]):
+        path = Path(path)
+        self.trashed.append(path)
+        path.unlink(missing_ok=True)
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        return True
+
+
+@pytest.fixture(autouse=True)
+def isolated_home(tmp_path_factory, monkeypatch):
+    """~/.baku（索引、恢复日志等默认位置）指向临时目录，测试不读写用户数据"""
+    home = tmp_path_factory.mktemp("home")
+    monkeypatch.setenv("HOME", str(home))
+    return home
+
+
+@pytest.fixture(autouse=True)
+def quiet_logger():
+    """测试期间不输出日志"""
+    logger.remove()
+    yield
+
+
+@pytest.fixture
+def trash_queue() -> FakeTrashQueue:
+    return FakeTrashQueue()
+
+
+@pytest.fixture
+def restorer(trash_queue) -> BackupRestorer:
+    return BackupRestorer(trash_queue=trash_queue, mode="full")
+
+
+@pytest.fixture
+def make_pair(tmp_path):
+    """在 tmp_path 下创建 (目标, 备份) 文件对"""
+
+    def make(name: str, target: Optional[bytes], backup: bytes):
+        target_file = tmp_path / name
+        backup_file = tmp_path / f"{name}.bak"
+        if target is not None:
+            target_file.write_bytes(target)
+        backup_file.write_bytes(backup)
+        return target_file, backup_file
+
+    return make
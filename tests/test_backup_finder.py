@@ -0,0 +1,38 @@
+"""
+BackupFinder 查找测试
+"""
+from baku.core.backup_finder import BackupFinder
+
+
+def test_find_many(tmp_path):
+    (tmp_path / "sub").mkdir()
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "a.txt.bak").write_text("a backup")
+    (tmp_path / "b.txt").write_text("b")
+    (tmp_path / "b.txt.old").write_text("b backup")
+    (tmp_path / "sub" / "c.txt").write_text("c")
+    (tmp_path / "lonely").mkdir()
+    (tmp_path / "lonely" / "d.txt").write_text("d")
+    targets = [tmp_path / "a.txt", tmp_path / "b.txt", tmp_path / "sub" / "c.txt",
+               tmp_path / "lonely" / "d.txt"]
+
+    found = BackupFinder().find_many(targets)
+
+    assert list(found) == targets
+    assert found[tmp_path / "a.txt"] == tmp_path / "a.txt.bak"
+    assert found[tmp_path / "b.txt"] == tmp_path / "b.txt.old"
+    # 子目录中没有备份时回溯到上级目录
+    assert found[tmp_path / "sub" / "c.txt"].parent == tmp_path
+    assert found[tmp_path / "lonely" / "d.txt"].parent == tmp_path
+
+
+def test_search_info_ignores_symlinked_backups(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "real.bak").write_text("backup")
+    (tmp_path / "a.txt.old").symlink_to(tmp_path / "real.bak")
+    (tmp_path / "a.txt.bak").write_text("a backup")
+
+    info = BackupFinder().get_search_info(tmp_path / "a.txt")
+
+    exists = {entry["path"] for entry in info["search_paths"] if entry["exists"]}
+    assert exists == {str(tmp_path / "a.txt.bak")}
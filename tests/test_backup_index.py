@@ -0,0 +1,122 @@
+"""
+备份文件 SQLite 索引测试
+"""
+import os
+
+import pytest
+
+from baku.core.backup_index import BackupIndex
+from baku.core.dir_cache import DirListingCache
+
+EXTENSIONS = (".bak", ".old")
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """root/{a.txt.bak, a.txt, sub/{b.old, deep/c.bak, link.bak -> ../a.txt.bak}, other/x.bak}"""
+    root = tmp_path / "root"
+    (root / "sub" / "deep").mkdir(parents=True)
+    (root / "a.txt").write_bytes(b"a")
+    (root / "a.txt.bak").write_bytes(b"a backup")
+    (root / "sub" / "b.old").write_bytes(b"b")
+    (root / "sub" / "deep" / "c.bak").write_bytes(b"c")
+    os.symlink(root / "a.txt.bak", root / "sub" / "link.bak")
+    (tmp_path / "other").mkdir()
+    (tmp_path / "other" / "x.bak").write_bytes(b"x")
+    return root
+
+
+@pytest.fixture
+def index(tmp_path):
+    index = BackupIndex(tmp_path / "index.db", EXTENSIONS)
+    yield index
+    index.close()
+
+
+def mtime(path) -> int:
+    return os.stat(path).st_mtime_ns
+
+
+def test_build_and_listing(tree, index):
+    assert index.build(tree) == {"dirs": 3, "backups": 3}
+
+    assert index.get_listing(str(tree), mtime(tree)) == ("a.txt.bak",)
+    assert index.get_listing(str(tree / "sub"), mtime(tree / "sub")) == ("b.old",)
+    assert index.get_listing(str(tree / "sub" / "deep")) == ("c.bak",)
+    assert index.get_roots() == [str(tree)]
+    # 未被索引的目录
+    assert index.get_listing(str(tree.parent / "other")) is None
+
+
+def test_listing_is_stale_when_mtime_differs(tree, index):
+    index.build(tree)
+    indexed = mtime(tree / "sub")
+
+    (tree / "sub" / "new.bak").write_bytes(b"new")
+    os.utime(tree / "sub", ns=(indexed + 10 ** 9, indexed + 10 ** 9))
+
+    assert index.get_listing(str(tree / "sub"), mtime(tree / "sub")) is None
+    # 不校验 mtime 时（实时监听维护）直接返回索引内容
+    assert index.get_listing(str(tree / "sub")) == ("b.old",)
+
+
+def test_rebuild_replaces_tree(tree, index):
+    index.build(tree)
+    (tree / "sub" / "deep" / "c.bak").unlink()
+    (tree / "sub" / "deep").rmdir()
+    (tree / "d.bak").write_bytes(b"d")
+
+    assert index.build(tree) == {"dirs": 2, "backups": 3}
+    assert index.get_listing(str(tree / "sub" / "deep")) is None
+    assert index.get_listing(str(tree), mtime(tree)) == ("a.txt.bak", "d.bak")
+
+
+def test_apply_changes(tree, index):
+    index.build(tree)
+    sub = str(tree / "sub")
+    (tree / "sub" / "e.bak").write_bytes(b"e")
+    (tree / "sub" / "b.old").unlink()
+
+    index.apply_changes(
+        upserts=[(str(tree / "sub" / "e.bak"), sub, "e.bak", "e", 1, 0.0, 1)],
+        deletes=[str(tree / "sub" / "b.old")],
+        dir_rows=[(sub, str(tree), mtime(sub))],
+        removed_trees=[str(tree / "sub" / "deep")],
+    )
+
+    assert index.get_listing(sub, mtime(sub)) == ("e.bak",)
+    assert index.get_listing(str(tree / "sub" / "deep")) is None
+    assert index.get_stats() == {"dirs": 2, "backups": 2}
+
+
+def test_apply_changes_rescan(tree, index):
+    index.build(tree)
+    (tree / "sub" / "deep" / "f.bak").write_bytes(b"f")
+
+    index.apply_changes(rescans=[(str(tree / "sub"), str(tree), 1)])
+
+    deep = tree / "sub" / "deep"
+    assert index.get_listing(str(deep), mtime(deep)) == ("c.bak", "f.bak")
+
+
+def test_removed_tree_does_not_match_sibling_prefix(tmp_path, index):
+    """按目录前缀删除时不误删名称以该目录名开头的兄弟目录"""
+    root = tmp_path / "root"
+    for name in ("sub", "sub_2", "sub%"):
+        (root / name).mkdir(parents=True)
+        (root / name / "a.bak").write_bytes(b"a")
+    index.build(root)
+
+    index.apply_changes(removed_trees=[str(root / "sub")])
+
+    assert index.get_listing(str(root / "sub")) is None
+    assert index.get_listing(str(root / "sub_2")) == ("a.bak",)
+    assert index.get_listing(str(root / "sub%")) == ("a.bak",)
+
+
+def test_dir_cache_uses_index_when_mtime_matches(tree, index, monkeypatch):
+    index.build(tree)
+    cache = DirListingCache(EXTENSIONS, index=index)
+    monkeypatch.setattr(cache, "_list_backup_names", lambda directory: pytest.fail("不应列目录"))
+
+    assert cache.get(tree / "sub").names == ("b.old",)
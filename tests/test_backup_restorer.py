@@ -0,0 +1,302 @@
+"""
+BackupRestorer 恢复路径测试
+"""
+import errno
+import os
+
+import pytest
+
+ORIGINAL = b"original content\n" * 64
+BACKUP = b"backup content\n" * 64
+
+
+def temp_files(directory):
+    return [p.name for p in directory.iterdir() if ".baku-tmp-" in p.name]
+
+
+def test_rename_consumes_backup(tmp_path, restorer, trash_queue, make_pair):
+    target, backup = make_pair("a.txt", ORIGINAL, BACKUP)
+    original_inode = os.stat(target).st_ino
+
+    result = restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    details = result["details"]
+    assert details["method"] == "rename"
+    assert details["new_file_method"] == "link"
+    assert details["bytes_written"] == 0
+    assert target.read_bytes() == BACKUP
+    new_file = tmp_path / "a.txt.new"
+    assert details["new_file"] == str(new_file)
+    assert new_file.read_bytes() == ORIGINAL
+    # .new 是原文件的硬链接，没有复制数据
+    assert os.stat(new_file).st_ino == original_inode
+    assert not backup.exists()
+    # 备份已被重命名到目标位置，不再放入回收站
+    assert trash_queue.trashed == []
+    assert temp_files(tmp_path) == []
+
+
+def test_kept_backup_is_copied(tmp_path, restorer, trash_queue, make_pair):
+    target, backup = make_pair("a.txt", ORIGINAL, BACKUP)
+
+    result = restorer.restore_backup(target, backup, trash_backup=False)
+
+    assert result["success"]
+    assert result["details"]["method"] == "copy"
+    assert result["details"]["bytes_written"] == len(BACKUP)
+    assert target.read_bytes() == BACKUP
+    assert backup.read_bytes() == BACKUP
+    assert (tmp_path / "a.txt.new").read_bytes() == ORIGINAL
+    assert trash_queue.trashed == []
+    assert temp_files(tmp_path) == []
+
+
+def test_missing_target_creates_no_new_file(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", None, BACKUP)
+
+    result = restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    assert result["details"]["new_file"] is None
+    assert target.read_bytes() == BACKUP
+    assert not backup.exists()
+    assert not (tmp_path / "a.txt.new").exists()
+
+
+def test_existing_new_file_is_not_overwritten(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", ORIGINAL, BACKUP)
+    old_new = tmp_path / "a.txt.new"
+    old_new.write_bytes(b"older safety copy")
+
+    result = restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    new_file = result["details"]["new_file"]
+    assert new_file != str(old_new)
+    assert os.path.basename(new_file).startswith("a.txt.new.")
+    assert old_new.read_bytes() == b"older safety copy"
+    assert (tmp_path / os.path.basename(new_file)).read_bytes() == ORIGINAL
+
+
+def test_rename_falls_back_to_copy_on_exdev(tmp_path, restorer, trash_queue, make_pair,
+                                            monkeypatch):
+    """st_dev 相同但 rename 返回 EXDEV（bind mount 等）时改为复制，备份按原设置放入回收站"""
+    target, backup = make_pair("a.txt", ORIGINAL, BACKUP)
+    real_replace = os.replace
+
+    def replace(src, dst, *args, **kwargs):
+        if os.fspath(src) == os.fspath(backup):
+            raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+        return real_replace(src, dst, *args, **kwargs)
+
+    monkeypatch.setattr(os, "replace", replace)
+    result = restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    assert result["details"]["method"] == "copy"
+    assert result["details"]["bytes_written"] == len(BACKUP)
+    assert target.read_bytes() == BACKUP
+    assert (tmp_path / "a.txt.new").read_bytes() == ORIGINAL
+    assert trash_queue.trashed == [backup]
+    assert temp_files(tmp_path) == []
+
+
+def test_failed_copy_keeps_target(tmp_path, restorer, make_pair, monkeypatch):
+    target, backup = make_pair("a.txt", ORIGINAL, BACKUP)
+
+    def fail(*args, **kwargs):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    monkeypatch.setattr(restorer.copy_engine, "copy", fail)
+    result = restorer.restore_backup(target, backup, trash_backup=False)
+
+    assert not result["success"]
+    assert target.read_bytes() == ORIGINAL
+    assert backup.read_bytes() == BACKUP
+    assert temp_files(tmp_path) == []
+
+
+def test_identical_target_is_skipped(tmp_path, restorer, trash_queue, make_pair):
+    target, backup = make_pair("a.txt", BACKUP, BACKUP)
+    target_inode = os.stat(target).st_ino
+
+    result = restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    assert result["details"]["method"] == "identical"
+    assert result["details"]["bytes_written"] == 0
+    assert result["details"]["new_file"] is None
+    assert os.stat(target).st_ino == target_inode
+    assert target.read_bytes() == BACKUP
+    assert not (tmp_path / "a.txt.new").exists()
+    assert trash_queue.trashed == [backup]
+
+
+def test_identical_kept_backup_is_not_trashed(tmp_path, restorer, trash_queue, make_pair):
+    target, backup = make_pair("a.txt", BACKUP, BACKUP)
+
+    result = restorer.restore_backup(target, backup, trash_backup=False)
+
+    assert result["details"]["method"] == "identical"
+    assert backup.read_bytes() == BACKUP
+    assert trash_queue.trashed == []
+
+
+def test_skip_identical_disabled(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", BACKUP, BACKUP)
+
+    result = restorer.restore_backup(target, backup, skip_identical=False)
+
+    assert result["details"]["method"] == "rename"
+    assert (tmp_path / "a.txt.new").read_bytes() == BACKUP
+
+
+def test_same_size_difference_is_detected(tmp_path, restorer, make_pair):
+    """大小相同、首尾块相同，只有中间不同的文件仍按不同处理"""
+    restorer.COMPARE_BLOCK_SIZE = 1024
+    restorer.COMPARE_CHUNK_SIZE = 4096
+    data = bytes(range(256)) * 64
+    changed = bytearray(data)
+    changed[len(data) // 2] ^= 0xFF
+    target, backup = make_pair("a.bin", data, bytes(changed))
+
+    result = restorer.restore_backup(target, backup)
+
+    assert result["details"]["method"] == "rename"
+    assert target.read_bytes() == bytes(changed)
+    assert (tmp_path / "a.bin.new").read_bytes() == data
+
+
+def fake_reflink(calls, supported=True):
+    """模拟 reflink：支持时整文件复制并返回 True，不支持时返回 False"""
+    import shutil
+
+    def clone(src, dst):
+        calls.append((src, dst))
+        if not supported:
+            return False
+        shutil.copyfile(src, dst)
+        shutil.copystat(src, dst)
+        return True
+
+    return clone
+
+
+def delta_pair(make_pair, restorer, changes, backup_size=None):
+    import random
+    restorer.DELTA_BLOCK_SIZE = 4096
+    restorer.COMPARE_CHUNK_SIZE = 16384
+    data = random.Random(0).randbytes(64 * 1024)
+    changed = bytearray(data)
+    for position in changes:
+        changed[position] ^= 0xFF
+    if backup_size is not None:
+        changed = changed[:backup_size] + random.Random(1).randbytes(
+            max(0, backup_size - len(changed)))
+    return make_pair("big.bin", data, bytes(changed)) + (data, bytes(changed))
+
+
+def test_delta_writes_only_changed_blocks(tmp_path, restorer, make_pair, monkeypatch):
+    calls = []
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink(calls))
+    # 第 5、6 块（相邻，合并写入）和第 12 块不同
+    target, backup, data, changed = delta_pair(
+        make_pair, restorer, [5 * 4096 + 10, 6 * 4096 + 20, 12 * 4096])
+
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+    assert result["success"]
+    details = result["details"]
+    assert details["method"] == "delta"
+    assert details["copy_method"] == "reflink"
+    assert details["bytes_written"] == 3 * 4096
+    assert len(calls) == 1
+    assert target.read_bytes() == changed
+    assert (tmp_path / "big.bin.new").read_bytes() == data
+    assert backup.read_bytes() == changed
+    assert temp_files(tmp_path) == []
+
+
+def test_delta_handles_size_change(tmp_path, restorer, make_pair, monkeypatch):
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink([]))
+    for size in (40 * 1024 + 7, 80 * 1024 + 3):
+        target, backup, data, changed = delta_pair(make_pair, restorer, [], backup_size=size)
+        (tmp_path / "big.bin.new").unlink(missing_ok=True)
+
+        result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+        assert result["details"]["method"] == "delta"
+        assert target.read_bytes() == changed
+        assert (tmp_path / "big.bin.new").read_bytes() == data
+
+
+def test_delta_without_reflink_copies_whole_file(tmp_path, restorer, make_pair, monkeypatch):
+    calls = []
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink(calls, supported=False))
+    target, backup, data, changed = delta_pair(make_pair, restorer, [100])
+
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+    assert result["success"]
+    assert result["details"]["method"] == "copy"
+    assert result["details"]["bytes_written"] == len(changed)
+    assert target.read_bytes() == changed
+    assert (tmp_path / "big.bin.new").read_bytes() == data
+    assert temp_files(tmp_path) == []
+
+    # 同一设备组合不再尝试克隆
+    target.write_bytes(data)
+    (tmp_path / "big.bin.new").unlink()
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+    assert result["details"]["method"] == "copy"
+    assert len(calls) == 1
+    assert target.read_bytes() == changed
+
+
+def no_full_compare(restorer, monkeypatch):
+    monkeypatch.setattr(restorer, "_compare_contents",
+                        lambda *args: pytest.fail("增量恢复时不应完整比较"))
+
+
+def test_delta_reports_identical_without_full_compare(tmp_path, restorer, make_pair, monkeypatch):
+    calls = []
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink(calls))
+    no_full_compare(restorer, monkeypatch)
+    target, backup, data, _ = delta_pair(make_pair, restorer, [])
+    restorer.COMPARE_BLOCK_SIZE = 1024
+
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+    assert result["success"]
+    assert result["details"]["method"] == "identical"
+    assert len(calls) == 1
+    assert target.read_bytes() == data
+    assert not (tmp_path / "big.bin.new").exists()
+    assert temp_files(tmp_path) == []
+
+
+def test_delta_same_size_change_skips_full_compare(tmp_path, restorer, make_pair, monkeypatch):
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink([]))
+    no_full_compare(restorer, monkeypatch)
+    target, backup, data, changed = delta_pair(make_pair, restorer, [8 * 4096])
+    restorer.COMPARE_BLOCK_SIZE = 1024
+
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+    assert result["details"]["method"] == "delta"
+    assert result["details"]["bytes_written"] == 4096
+    assert target.read_bytes() == changed
+    assert (tmp_path / "big.bin.new").read_bytes() == data
+
+
+def test_identical_detected_when_delta_unavailable(tmp_path, restorer, make_pair, monkeypatch):
+    monkeypatch.setattr(restorer.copy_engine, "clone", fake_reflink([], supported=False))
+    target, backup, data, _ = delta_pair(make_pair, restorer, [])
+    restorer.COMPARE_BLOCK_SIZE = 1024
+
+    result = restorer.restore_backup(target, backup, trash_backup=False, mode="delta")
+
+    assert result["details"]["method"] == "identical"
+    assert not (tmp_path / "big.bin.new").exists()
+    assert temp_files(tmp_path) == []
@@ -0,0 +1,75 @@
+"""
+内容相似度（MinHash）测试
+"""
+import random
+
+import pytest
+
+from baku.core import content_similarity
+from baku.core.content_similarity import ContentSimilarity
+
+
+@pytest.fixture(params=["numpy", "python"])
+def similarity(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(content_similarity, "np", None)
+    return ContentSimilarity()
+
+
+def test_files_without_shingles_are_unscored(tmp_path, similarity):
+    (tmp_path / "a").write_bytes(b"")
+    (tmp_path / "b").write_bytes(b"")
+    (tmp_path / "c").write_bytes(b"xyz")
+
+    assert similarity.similarities(tmp_path / "a", [tmp_path / "b", tmp_path / "c"]) == [None, None]
+    # 第二次命中缓存，结果不变
+    assert similarity.signature(tmp_path / "a") is None
+
+
+def test_tiny_files_are_not_equal(tmp_path):
+    """字节窗口分片下不足 8 字节的文件没有分片，不能得出相似度 1.0"""
+    pytest.importorskip("numpy")
+    (tmp_path / "a").write_bytes(b"abc")
+    (tmp_path / "b").write_bytes(b"xyz")
+
+    assert ContentSimilarity().similarities(tmp_path / "a", [tmp_path / "b"]) == [None]
+
+
+def test_similar_content_scores_higher(tmp_path, similarity):
+    rng = random.Random(0)
+    lines = [f"line {rng.getrandbits(64)}\n".encode() for _ in range(2000)]
+    (tmp_path / "target").write_bytes(b"".join(lines))
+    (tmp_path / "close").write_bytes(b"".join(lines[:1800]))
+    (tmp_path / "other").write_bytes(b"".join(
+        f"other {rng.getrandbits(64)}\n".encode() for _ in range(2000)))
+
+    close, other, missing = similarity.similarities(
+        tmp_path / "target", [tmp_path / "close", tmp_path / "other", tmp_path / "missing.bak"])
+
+    assert close > 0.7
+    assert other < 0.3
+    assert missing is None
+
+
+def test_max_bytes_is_bounded_by_default():
+    assert ContentSimilarity().max_bytes == content_similarity.DEFAULT_MAX_BYTES
+
+
+def test_python_fallback_keeps_bounded_shingles(tmp_path, monkeypatch):
+    """纯 Python 实现只读取文件开头部分，并只保留散列值最小的 max_shingles 个分片"""
+    monkeypatch.setattr(content_similarity, "np", None)
+    monkeypatch.setattr(content_similarity, "PYTHON_MAX_BYTES", 64 * 1024)
+    lines = [f"line {i}\n".encode() for i in range(20000)]
+    path = tmp_path / "big.txt"
+    path.write_bytes(b"".join(lines))
+    similarity = ContentSimilarity(max_shingles=100)
+
+    hashes = similarity._line_hashes(path)
+    full = ContentSimilarity(max_shingles=len(lines))._line_hashes(path)
+
+    assert len(hashes) == 100
+    assert len(full) < len(lines)
+    assert hashes == full[:100]
+    assert similarity.similarities(path, [path]) == [1.0]
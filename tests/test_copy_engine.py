@@ -0,0 +1,182 @@
+"""
+CopyEngine 复制方式回退测试和 ProgressThrottle 节流测试
+替换 os.copy_file_range / os.sendfile 模拟不支持、提前结束和不复制任何数据的情况
+"""
+import errno
+import os
+import sys
+
+import pytest
+
+from baku.core import copy_engine
+from baku.core.copy_engine import CopyEngine, ProgressThrottle
+
+DATA = bytes(range(256)) * 4096  # 1 MiB
+
+needs_linux = pytest.mark.skipif(not sys.platform.startswith("linux"), reason="仅 Linux 有 sendfile 回退")
+
+
+@pytest.fixture
+def engine(monkeypatch) -> CopyEngine:
+    # 不尝试 reflink，直接测试后面的方式
+    monkeypatch.setattr(copy_engine, "fcntl", None)
+    return CopyEngine(buffer_size=64 * 1024, chunk_size=256 * 1024)
+
+
+@pytest.fixture
+def src(tmp_path):
+    path = tmp_path / "src.bin"
+    path.write_bytes(DATA)
+    return path
+
+
+def unsupported(*args):
+    raise OSError(errno.EXDEV, "模拟不支持")
+
+
+def returns_zero(*args):
+    return 0
+
+
+def short_copy(limit: int):
+    """前 limit 字节正常复制，之后返回 0（提前结束）"""
+    real = os.copy_file_range
+    state = {"copied": 0}
+
+    def copy_file_range(src_fd, dst_fd, count, offset_src=None, offset_dst=None):
+        count = min(count, limit - state["copied"])
+        if count <= 0:
+            return 0
+        copied = real(src_fd, dst_fd, count, offset_src, offset_dst)
+        state["copied"] += copied
+        return copied
+
+    return copy_file_range
+
+
+@needs_linux
+def test_copy_file_range_unsupported_falls_back_to_sendfile(tmp_path, engine, src, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    dst = tmp_path / "dst.bin"
+
+    assert engine.copy(src, dst) == "sendfile"
+    assert dst.read_bytes() == DATA
+    # 记住该设备组合不支持，下次不再尝试
+    assert len(engine._no_copy_range) == 1
+
+
+def test_unsupported_kernel_copies_fall_back_to_buffer(tmp_path, engine, src, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    monkeypatch.setattr(os, "sendfile", unsupported, raising=False)
+    dst = tmp_path / "dst.bin"
+
+    assert engine.copy(src, dst) == "buffer"
+    assert dst.read_bytes() == DATA
+
+
+@needs_linux
+def test_copy_file_range_returning_zero_falls_back(tmp_path, engine, src, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", returns_zero, raising=False)
+    dst = tmp_path / "dst.bin"
+
+    assert engine.copy(src, dst) == "sendfile"
+    assert dst.read_bytes() == DATA
+
+
+@pytest.mark.parametrize("progress", [False, True])
+def test_short_copy_file_range_is_completed(tmp_path, engine, src, monkeypatch, progress):
+    if not hasattr(os, "copy_file_range"):
+        pytest.skip("没有 os.copy_file_range")
+    monkeypatch.setattr(os, "copy_file_range", short_copy(len(DATA) // 3))
+    dst = tmp_path / "dst.bin"
+    reports = []
+
+    method = engine.copy(src, dst, progress=(lambda copied, total: reports.append(copied))
+                         if progress else None)
+
+    assert method == "copy_file_range"
+    assert dst.read_bytes() == DATA
+    if progress:
+        assert reports[-1] == len(DATA)
+
+
+@needs_linux
+def test_short_sendfile_is_completed(tmp_path, engine, src, monkeypatch):
+    monkeypatch.setattr(os, "copy_file_range", unsupported, raising=False)
+    real = os.sendfile
+
+    def sendfile(out_fd, in_fd, offset, count):
+        # 只发送前 100 KiB
+        count = min(count, 100 * 1024 - offset)
+        return real(out_fd, in_fd, offset, count) if count > 0 else 0
+
+    monkeypatch.setattr(os, "sendfile", sendfile)
+    dst = tmp_path / "dst.bin"
+
+    assert engine.copy(src, dst) == "sendfile"
+    assert dst.read_bytes() == DATA
+
+
+def test_empty_file(tmp_path, engine):
+    src = tmp_path / "empty"
+    src.write_bytes(b"")
+    dst = tmp_path / "dst"
+
+    assert engine.copy(src, dst) == "buffer"
+    assert dst.read_bytes() == b""
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch) -> FakeClock:
+    clock = FakeClock()
+    monkeypatch.setattr(copy_engine.time, "monotonic", clock)
+    return clock
+
+
+def test_throttle_requires_interval_and_bytes(clock):
+    reports = []
+    throttle = ProgressThrottle(lambda copied, total: reports.append(copied), 100,
+                                min_interval=0.1, min_bytes=10)
+
+    clock.now += 1
+    throttle.update(5)     # 字节不足
+    clock.now += 0.01
+    throttle.update(20)    # 间隔足够（距上次回报）
+    throttle.update(40)    # 间隔不足
+    clock.now += 0.2
+    throttle.update(25)    # 距上次回报字节不足
+    throttle.update(60)
+
+    assert reports == [20, 60]
+
+
+def test_throttle_finish_reports_once(clock):
+    reports = []
+    throttle = ProgressThrottle(lambda copied, total: reports.append((copied, total)), 100,
+                                min_interval=0, min_bytes=0)
+
+    throttle.update(100)
+    throttle.finish(100)
+    empty = ProgressThrottle(lambda copied, total: reports.append((copied, total)), 0)
+    empty.finish(0)
+
+    # 已回报过最终字节数时 finish 不再重复；空文件也回报一次
+    assert reports == [(100, 100), (0, 0)]
+
+
+def test_copy_progress_is_throttled(tmp_path, engine, src):
+    reports = []
+
+    engine.copy(src, tmp_path / "dst.bin", progress=lambda copied, total: reports.append((copied, total)))
+
+    assert reports[-1] == (len(DATA), len(DATA))
+    # 1 MiB 小于 min_bytes（4 MiB），中间不回报
+    assert len(reports) == 1
@@ -0,0 +1,176 @@
+"""
+目录列表缓存测试
+"""
+import os
+
+from baku.core.dir_cache import _LIVE_MTIME, DirListingCache, NegativeCache
+
+EXTENSIONS = (".bak", ".old")
+
+
+def make_dir(path, *names):
+    path.mkdir()
+    for name in names:
+        (path / name).write_bytes(b"x")
+    return path
+
+
+def touch_dir(path, seconds: int):
+    """显式设置目录 mtime，不依赖文件系统时间精度"""
+    os.utime(path, ns=(seconds * 10 ** 9, seconds * 10 ** 9))
+
+
+def test_listing_filters_extensions(tmp_path):
+    directory = make_dir(tmp_path / "d", "a.txt.bak", "b.old", "c.txt")
+
+    listing = DirListingCache(EXTENSIONS).get(directory)
+
+    assert sorted(listing.names) == ["a.txt.bak", "b.old"]
+    assert "a.txt.bak" in listing
+    assert "c.txt" not in listing
+
+
+def test_hit_until_mtime_changes(tmp_path):
+    directory = make_dir(tmp_path / "d", "a.bak")
+    touch_dir(directory, 1_000_000)
+    cache = DirListingCache(EXTENSIONS)
+
+    first = cache.get(directory)
+    assert cache.get(directory) is first
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    (directory / "b.bak").write_bytes(b"x")
+    touch_dir(directory, 1_000_001)
+    second = cache.get(directory)
+
+    assert second is not first
+    assert sorted(second.names) == ["a.bak", "b.bak"]
+    assert cache.misses == 2
+
+
+def test_unchanged_mtime_serves_cached_listing(tmp_path):
+    """mtime 是唯一的失效依据：mtime 不变时不会重新列目录"""
+    directory = make_dir(tmp_path / "d", "a.bak")
+    touch_dir(directory, 1_000_000)
+    cache = DirListingCache(EXTENSIONS)
+    cache.get(directory)
+
+    (directory / "b.bak").write_bytes(b"x")
+    touch_dir(directory, 1_000_000)
+
+    assert cache.get(directory).names == ("a.bak",)
+
+
+def test_lru_eviction(tmp_path):
+    dirs = [make_dir(tmp_path / f"d{i}", "a.bak") for i in range(3)]
+    cache = DirListingCache(EXTENSIONS, max_entries=2)
+
+    cache.get(dirs[0])
+    cache.get(dirs[1])
+    cache.get(dirs[0])  # d0 变为最近使用
+    cache.get(dirs[2])  # 淘汰 d1
+
+    assert len(cache) == 2
+    hits = cache.hits
+    cache.get(dirs[0])
+    assert cache.hits == hits + 1
+    cache.get(dirs[1])
+    assert cache.hits == hits + 1
+
+
+def test_missing_directory_is_dropped(tmp_path):
+    directory = make_dir(tmp_path / "d", "a.bak")
+    cache = DirListingCache(EXTENSIONS)
+    cache.get(directory)
+
+    (directory / "a.bak").unlink()
+    directory.rmdir()
+
+    assert cache.get(directory) is None
+    assert len(cache) == 0
+
+
+def test_listing_skips_symlinks_directories_and_hidden(tmp_path):
+    """符号链接（包括失效链接）、目录和只有前导点的隐藏文件不算备份"""
+    directory = make_dir(tmp_path / "d", "a.bak", ".bak")
+    (directory / "sub.bak").mkdir()
+    os.symlink(directory / "a.bak", directory / "link.bak")
+    os.symlink(tmp_path / "missing", directory / "dangling.bak")
+
+    listing = DirListingCache(EXTENSIONS).get(directory)
+
+    assert listing.names == ("a.bak",)
+
+
+def searched(*dirs):
+    return [(str(d), os.stat(d).st_mtime_ns if d.exists() else None) for d in dirs]
+
+
+def test_negative_cache_valid_until_a_searched_dir_changes(tmp_path):
+    start = make_dir(tmp_path / "start")
+    touch_dir(start, 1_000_000)
+    cache = NegativeCache()
+    cache.add(start, searched(start, tmp_path))
+
+    assert cache.check(start)
+    assert cache.hits == 1
+
+    touch_dir(start, 1_000_001)
+    assert not cache.check(start)
+    # 失效的记录已移除
+    touch_dir(start, 1_000_000)
+    assert not cache.check(start)
+
+
+def test_negative_cache_directory_appearing_invalidates(tmp_path):
+    start = make_dir(tmp_path / "start")
+    missing = tmp_path / "later"
+    cache = NegativeCache()
+    cache.add(start, searched(start, missing))
+    assert cache.check(start)
+
+    missing.mkdir()
+
+    assert not cache.check(start)
+
+
+def test_negative_cache_live_dirs_are_not_statted(tmp_path):
+    start = make_dir(tmp_path / "start")
+    cache = NegativeCache()
+    cache.add(start, [(str(start), _LIVE_MTIME)])
+
+    touch_dir(start, 1_000_001)
+
+    assert cache.check(start)
+
+
+def test_negative_cache_invalidate_many(tmp_path):
+    cache = NegativeCache()
+    a = tmp_path / "a"
+    b = tmp_path / "b"
+    nested = tmp_path / "tree" / "x" / "y"
+    for start, dirs in ((a, [a, tmp_path]), (b, [b]), (nested, [nested])):
+        cache.add(start, [(str(d), _LIVE_MTIME) for d in dirs])
+
+    cache.invalidate_many([str(tmp_path)])
+    assert not cache.check(a)
+    assert cache.check(b)
+
+    # 按目录树前缀失效
+    cache.invalidate_many([], trees=[str(tmp_path / "tree")])
+    assert not cache.check(nested)
+    assert cache.check(b)
+
+    cache.invalidate()
+    assert not cache.check(b)
+
+
+def test_negative_cache_lru(tmp_path):
+    cache = NegativeCache(max_entries=2)
+    starts = [tmp_path / f"d{i}" for i in range(3)]
+    for start in starts[:2]:
+        cache.add(start, [(str(start), _LIVE_MTIME)])
+    cache.check(starts[0])
+    cache.add(starts[2], [(str(starts[2]), _LIVE_MTIME)])
+
+    assert [cache.check(start) for start in starts] == [True, False, True]
@@ -0,0 +1,98 @@
+"""
+索引实时监听测试（仅 Linux inotify）
+"""
+import shutil
+import time
+from pathlib import Path
+
+import pytest
+
+from baku.core.backup_finder import BackupFinder
+from baku.core.backup_index import BackupIndex
+from baku.core.index_watcher import IndexWatcher
+
+pytestmark = pytest.mark.skipif(not IndexWatcher.is_supported(), reason="需要 inotify")
+
+
+def wait_for(condition, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if condition():
+            return True
+        time.sleep(0.05)
+    return False
+
+
+@pytest.fixture
+def watched(tmp_path):
+    """已建立索引并处于实时监听状态的 (BackupFinder, 监听根目录)"""
+    root = tmp_path / "watched"
+    deep = root / "new" / "deep"
+    deep.mkdir(parents=True)
+    (deep / "r.txt").write_text("current")
+    (deep / "r.txt.bak").write_text("backup")
+    finder = BackupFinder()
+    finder.index = BackupIndex(tmp_path / "index.db", finder.search_extensions)
+    finder.dir_cache.index = finder.index
+    finder.index.build(root)
+    watcher = finder.attach_watcher([root])
+    assert wait_for(lambda: finder.dir_cache.live_roots == watcher.roots)
+    yield finder, root
+    finder.detach_watcher()
+    finder.index.close()
+
+
+def flushed(watcher: IndexWatcher, action):
+    """执行 action 并等待监听线程把变更写入索引"""
+    seen = []
+    watcher.add_listener(lambda changed, trees: seen.append(trees))
+    action()
+    assert wait_for(lambda: bool(seen))
+
+
+def test_moved_tree_drops_cached_subdirectories(watched):
+    finder, root = watched
+    target = root / "new" / "deep" / "r.txt"
+    assert finder.find_nearest_backup(target) == root / "new" / "deep" / "r.txt.bak"
+
+    flushed(finder.watcher, lambda: (root / "new").rename(root / "moved"))
+
+    assert finder.find_nearest_backup(target) is None
+    moved = root / "moved" / "deep" / "r.txt"
+    assert finder.find_nearest_backup(moved) == root / "moved" / "deep" / "r.txt.bak"
+
+
+def test_deleted_tree_drops_cached_subdirectories(watched):
+    finder, root = watched
+    target = root / "new" / "deep" / "r.txt"
+    assert finder.find_nearest_backup(target) is not None
+
+    flushed(finder.watcher, lambda: shutil.rmtree(root / "new"))
+
+    assert finder.find_nearest_backup(target) is None
+
+
+def test_negative_result_is_dropped_when_tree_moves_in(watched, tmp_path):
+    finder, root = watched
+    outside = tmp_path / "outside" / "deep"
+    outside.mkdir(parents=True)
+    (outside / "x.txt.bak").write_text("backup")
+    target = root / "incoming" / "deep" / "x.txt"
+    assert finder.find_nearest_backup(target) is None
+
+    flushed(finder.watcher, lambda: (tmp_path / "outside").rename(root / "incoming"))
+
+    assert finder.find_nearest_backup(target) == root / "incoming" / "deep" / "x.txt.bak"
+
+
+def test_dir_cache_invalidates_tree_by_prefix(tmp_path):
+    finder = BackupFinder()
+    cache = finder.dir_cache
+    for sub in ("a", "a/b", "a/b/c", "ab"):
+        (tmp_path / sub).mkdir(parents=True, exist_ok=True)
+        cache.get(tmp_path / sub)
+    assert len(cache) == 4
+
+    cache.invalidate_many([], trees=[str(tmp_path / "a")])
+
+    assert len(cache) == 1
@@ -0,0 +1,228 @@
+"""
+MultiFileManager 批量恢复测试
+"""
+import threading
+import time
+from pathlib import Path
+
+import pytest
+
+from baku.core.file_queue import BackupInfo, FileQueue, FileQueueItem, FileStatus
+from baku.core import multi_file_manager
+from baku.core.multi_file_manager import MultiFileManager
+from baku.core.restore_journal import RestoreJournal, default_journal_dir, list_journals
+
+
+@pytest.fixture
+def manager(restorer) -> MultiFileManager:
+    return MultiFileManager(backup_restorer=restorer, max_workers=1,
+                            file_queue=FileQueue(journal=False))
+
+
+def queue_restore(manager: MultiFileManager, target: Path, backup: Path) -> FileQueueItem:
+    """把 (目标, 备份) 加入队列并选中该备份"""
+    item = FileQueueItem(id=target.name, name=target.name, path=target, size=0,
+                         status=FileStatus.PENDING)
+    manager.file_queue.add_item(item)
+    item.add_backup(BackupInfo(path=backup, name=backup.name, size=backup.stat().st_size,
+                               modified=backup.stat().st_mtime, similarity=1.0,
+                               file_type=backup.suffix))
+    item.set_selected_backup(backup)
+    return item
+
+
+def fail_for(restorer, monkeypatch, failing: Path):
+    """让指定目标的恢复失败，其余照常"""
+    original = restorer.restore_backup
+
+    def restore_backup(target_file, backup_file, **kwargs):
+        if Path(target_file) == failing:
+            return {"success": False, "message": "模拟失败", "details": {}}
+        return original(target_file, backup_file, **kwargs)
+
+    monkeypatch.setattr(restorer, "restore_backup", restore_backup)
+
+
+def test_batch_restore_and_stats(tmp_path, manager, make_pair):
+    items = []
+    for i in range(5):
+        target, backup = make_pair(f"f{i}.txt", b"original", f"backup {i}".encode())
+        items.append(queue_restore(manager, target, backup))
+
+    assert manager.batch_restore_files()
+
+    for i, item in enumerate(items):
+        assert item.status == FileStatus.COMPLETED
+        assert item.progress == 1.0
+        assert item.path.read_bytes() == f"backup {i}".encode()
+    stats = manager.last_batch_stats
+    assert stats["processed"] == 5
+    assert stats["success"] == 5
+    assert stats["failed"] == 0
+    assert stats["bytes"] == sum(len(f"backup {i}") for i in range(5))
+    assert stats["devices"] == 1
+    assert stats["files_per_sec"] > 0
+    assert not manager.is_processing()
+
+
+def test_failed_item_is_counted(tmp_path, manager, restorer, make_pair, monkeypatch):
+    ok_target, ok_backup = make_pair("ok.txt", b"original", b"backup")
+    bad_target, bad_backup = make_pair("bad.txt", b"original", b"backup")
+    ok_item = queue_restore(manager, ok_target, ok_backup)
+    bad_item = queue_restore(manager, bad_target, bad_backup)
+    fail_for(restorer, monkeypatch, bad_target)
+
+    assert manager.batch_restore_files()
+
+    assert ok_item.status == FileStatus.COMPLETED
+    assert bad_item.status == FileStatus.ERROR
+    assert "模拟失败" in bad_item.message
+    assert bad_target.read_bytes() == b"original"
+    assert manager.last_batch_stats["failed"] == 1
+
+
+def test_shared_backup_is_trashed_once(tmp_path, manager, trash_queue):
+    backup = tmp_path / "shared.bak"
+    backup.write_bytes(b"shared backup")
+    targets = []
+    for i in range(4):
+        target = tmp_path / f"f{i}.txt"
+        target.write_bytes(f"original {i}".encode())
+        queue_restore(manager, target, backup)
+        targets.append(target)
+
+    assert manager.batch_restore_files()
+
+    assert manager.file_queue.get_stats()["completed"] == 4
+    for i, target in enumerate(targets):
+        assert target.read_bytes() == b"shared backup"
+        assert (tmp_path / f"f{i}.txt.new").read_bytes() == f"original {i}".encode()
+    assert trash_queue.trashed == [backup]
+
+
+def test_shared_backup_is_kept_when_one_fails(tmp_path, manager, restorer, trash_queue,
+                                              monkeypatch):
+    backup = tmp_path / "shared.bak"
+    backup.write_bytes(b"shared backup")
+    targets = []
+    for i in range(3):
+        target = tmp_path / f"f{i}.txt"
+        target.write_bytes(b"original")
+        queue_restore(manager, target, backup)
+        targets.append(target)
+    fail_for(restorer, monkeypatch, targets[1])
+
+    manager.batch_restore_files()
+
+    assert [manager.file_queue.get_item(t.name).status for t in targets] == [
+        FileStatus.COMPLETED, FileStatus.ERROR, FileStatus.COMPLETED]
+    assert backup.read_bytes() == b"shared backup"
+    assert trash_queue.trashed == []
+
+
+def test_cancel_mid_batch(tmp_path, manager, restorer, make_pair, monkeypatch):
+    monkeypatch.setattr(manager, "_device_concurrency", lambda device: 1)
+    original = restorer.restore_backup
+    calls = []
+
+    def restore_backup(target_file, backup_file, **kwargs):
+        calls.append(target_file)
+        if len(calls) == 1:
+            manager.cancel_batch_operation()
+            # 等调用线程处理取消，未开始的恢复不再执行
+            time.sleep(0.5)
+        return original(target_file, backup_file, **kwargs)
+
+    monkeypatch.setattr(restorer, "restore_backup", restore_backup)
+    pairs = [make_pair(f"f{i}.txt", b"original", b"backup") for i in range(10)]
+    items = [queue_restore(manager, target, backup) for target, backup in pairs]
+
+    assert not manager.batch_restore_files()
+
+    assert items[0].status == FileStatus.COMPLETED
+    cancelled = [item for item in items if item.status == FileStatus.CANCELLED]
+    assert len(cancelled) == len(items) - len(calls)
+    assert len(cancelled) >= 8
+    for item in cancelled:
+        assert item.path.read_bytes() == b"original"
+        assert item.selected_backup.exists()
+    assert manager.last_batch_stats["processed"] == len(calls)
+    assert not manager.is_processing()
+
+
+def test_journal_is_removed_after_batch(tmp_path, manager, make_pair, monkeypatch):
+    """开启 restore_journal 时批次正常结束后删除日志，且日志只关闭一次"""
+    config = multi_file_manager.load_baku_config()
+    monkeypatch.setattr(multi_file_manager, "load_baku_config",
+                        lambda: {**config, "restore_journal": True})
+    closes = []
+    original_close = RestoreJournal.close
+
+    def close(journal, remove=True):
+        closes.append(remove)
+        original_close(journal, remove)
+
+    monkeypatch.setattr(RestoreJournal, "close", close)
+    for i in range(3):
+        queue_restore(manager, *make_pair(f"f{i}.txt", b"original", b"backup"))
+
+    assert manager.batch_restore_files()
+
+    assert closes == [True]
+    assert list_journals(default_journal_dir()) == []
+
+
+class SlowFinder:
+    """按目录返回候选的假查找器：目录序号越小越慢，后提交的块先完成"""
+
+    def __init__(self, delays):
+        self.delays = delays
+        self.calls = []
+        self.lock = threading.Lock()
+
+    def find_candidates_many(self, target_files):
+        targets = list(target_files)
+        with self.lock:
+            self.calls.append(targets)
+        time.sleep(self.delays.get(targets[0].parent.name, 0))
+        return {target: [f"{target.name}.bak"] for target in targets}
+
+
+def queue_targets(manager, tmp_path, dirs: int, per_dir: int):
+    items = []
+    for d in range(dirs):
+        for i in range(per_dir):
+            path = tmp_path / f"d{d}" / f"f{i}.txt"
+            item = FileQueueItem(id=f"d{d}/f{i}", name=path.name, path=path, size=0,
+                                 status=FileStatus.PENDING)
+            manager.file_queue.add_item(item)
+            items.append(item)
+    return items
+
+
+def test_scan_candidates_in_queue_order(tmp_path, manager):
+    finder = SlowFinder({f"d{d}": 0.05 * (4 - d) for d in range(4)})
+    manager.backup_finder = finder
+    items = queue_targets(manager, tmp_path, dirs=4, per_dir=3)
+
+    results = list(manager._scan_candidates(items, max_workers=4))
+
+    assert [item for item, _ in results] == items
+    assert [candidates for _, candidates in results] == [[f"{item.name}.bak"] for item in items]
+    # 每个目录一块，同目录文件在一次调用中查找
+    assert sorted(len(call) for call in finder.calls) == [3, 3, 3, 3]
+
+
+def test_scan_candidates_stops_on_cancel(tmp_path, manager):
+    finder = SlowFinder({f"d{d}": 0.05 for d in range(8)})
+    manager.backup_finder = finder
+    items = queue_targets(manager, tmp_path, dirs=8, per_dir=2)
+    produced = []
+
+    for item, _ in manager._scan_candidates(items, max_workers=2):
+        produced.append(item)
+        manager.cancel_batch_operation()
+
+    assert produced == items[:1]
+    # 取消后尚未开始的块不再查找
+    assert len(finder.calls) < 8
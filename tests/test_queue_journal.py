@@ -0,0 +1,110 @@
+"""
+文件队列日志持久化测试
+"""
+from pathlib import Path
+
+import pytest
+
+from baku.core.file_queue import BackupInfo, FileQueue, FileQueueItem, FileStatus
+from baku.core.queue_journal import log_path_for
+
+
+def make_queue(count: int, journal: bool = True) -> FileQueue:
+    queue = FileQueue(journal=journal)
+    for i in range(count):
+        queue.add_item(FileQueueItem(id=f"f{i}", name=f"f{i}.txt", path=f"/data/f{i}.txt",
+                                     size=i, status=FileStatus.PENDING))
+    return queue
+
+
+def dump(queue: FileQueue):
+    return [item.to_dict() for item in queue]
+
+
+def change_some(queue: FileQueue):
+    item = queue.get_item("f1")
+    item.backup_files = [BackupInfo(path="/data/f1.txt.bak", name="f1.txt.bak", size=3,
+                                    modified=1.7e9, similarity=1.0, file_type=".bak")]
+    item.set_selected_backup(Path("/data/f1.txt.bak"))
+    item.update_status(FileStatus.COMPLETED, "找到 1 个备份文件")
+    queue.get_item("f2").status = FileStatus.ERROR
+    queue.get_item("f3").path = Path("/other/f3.txt")
+    queue.remove_item("f4")
+    queue.add_item(FileQueueItem(id="new", name="new.txt", path="/data/new.txt", size=1,
+                                 status=FileStatus.PENDING))
+
+
+@pytest.fixture
+def queue_file(tmp_path) -> Path:
+    return tmp_path / "queue.json"
+
+
+def test_incremental_save_round_trip(queue_file):
+    queue = make_queue(20)
+    assert queue.save_to_file(queue_file)
+    assert not log_path_for(queue_file).exists()
+
+    change_some(queue)
+    assert queue.save_to_file(queue_file)
+
+    assert log_path_for(queue_file).exists()
+    loaded = FileQueue(journal=True)
+    assert loaded.load_from_file(queue_file)
+    assert dump(loaded) == dump(queue)
+    assert loaded.get_stats() == queue.get_stats()
+
+
+def test_truncated_last_line_is_ignored(queue_file):
+    queue = make_queue(20)
+    queue.save_to_file(queue_file)
+    change_some(queue)
+    queue.save_to_file(queue_file)
+    log_path = log_path_for(queue_file)
+    # 模拟写入最后一条记录时崩溃
+    with open(log_path, 'a', encoding='utf-8') as f:
+        f.write('{"op": "remove", "id": "f5')
+
+    loaded = FileQueue(journal=True)
+    assert loaded.load_from_file(queue_file)
+    assert dump(loaded) == dump(queue)
+    assert log_path.read_bytes().endswith(b"\n")
+
+    # 截断后追加的记录不会与残缺的行粘连
+    loaded.get_item("f5").update_status(FileStatus.ERROR, "出错")
+    assert loaded.save_to_file(queue_file)
+    reloaded = FileQueue()
+    assert reloaded.load_from_file(queue_file)
+    assert reloaded.get_item("f5").status == FileStatus.ERROR
+    assert dump(reloaded) == dump(loaded)
+
+
+def test_mismatched_log_is_ignored(queue_file):
+    queue = make_queue(5)
+    queue.save_to_file(queue_file)
+    queue.get_item("f0").status = FileStatus.ERROR
+    queue.save_to_file(queue_file)
+    stale_log = log_path_for(queue_file).read_bytes()
+    # 压缩（重写快照）后残留旧快照的日志
+    queue.clear()
+    queue.save_to_file(queue_file)
+    log_path_for(queue_file).write_bytes(stale_log)
+
+    loaded = FileQueue(journal=True)
+    assert loaded.load_from_file(queue_file)
+    assert len(loaded) == 0
+
+
+def test_log_is_compacted(queue_file):
+    queue = make_queue(10)
+    queue.journal_compact_records = 25
+    queue.save_to_file(queue_file)
+    for round_ in range(6):
+        status = FileStatus.PROCESSING if round_ % 2 else FileStatus.COMPLETED
+        for item in queue:
+            item.update_status(status)
+        queue.save_to_file(queue_file)
+        assert queue._journal.log_records <= 25
+
+    loaded = FileQueue()
+    assert loaded.load_from_file(queue_file)
+    assert dump(loaded) == dump(queue)
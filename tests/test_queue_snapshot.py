@@ -0,0 +1,132 @@
+"""
+文件队列二进制快照测试
+"""
+from pathlib import Path
+
+import pytest
+
+from baku.core.file_queue import BackupInfo, FileQueue, FileQueueItem, FileStatus
+from baku.core.queue_snapshot import MAGIC, open_snapshot, write_snapshot
+
+
+def make_queue(count: int, journal: bool = False) -> FileQueue:
+    queue = FileQueue(journal=journal)
+    for i in range(count):
+        queue.add_item(FileQueueItem(id=f"f{i}", name=f"文件{i}.txt", path=f"/data/文件{i}.txt",
+                                     size=i, status=FileStatus.PENDING))
+    item = queue.get_item("f3")
+    item.add_backup(BackupInfo(path="/data/文件3.txt.bak", name="文件3.txt.bak", size=3,
+                               modified=1.7e9, similarity=1.0, file_type=".bak"))
+    item.set_selected_backup(Path("/data/文件3.txt.bak"))
+    item.update_status(FileStatus.COMPLETED, "已恢复")
+    queue.get_item("f5").status = FileStatus.ERROR
+    return queue
+
+
+def dump(queue: FileQueue):
+    return [item.to_dict() for item in queue]
+
+
+def decoded_count(queue: FileQueue) -> int:
+    return sum(1 for value in queue._index.values() if value.__class__ is not int)
+
+
+@pytest.fixture
+def snapshot_file(tmp_path) -> Path:
+    return tmp_path / "queue.bakq"
+
+
+def test_round_trip(snapshot_file):
+    queue = make_queue(50)
+    assert queue.save_to_file(snapshot_file)
+    assert snapshot_file.read_bytes().startswith(MAGIC)
+
+    loaded = FileQueue()
+    assert loaded.load_from_file(snapshot_file)
+    assert dump(loaded) == dump(queue)
+
+
+def test_loading_is_lazy(snapshot_file):
+    queue = make_queue(50)
+    queue.save_to_file(snapshot_file)
+
+    loaded = FileQueue()
+    assert loaded.load_from_file(snapshot_file)
+    # 统计来自头部，不建立索引、不解码记录
+    assert loaded.get_stats() == queue.get_stats()
+    assert loaded._index_pending
+
+    assert loaded.get_item("f10").to_dict() == queue.get_item("f10").to_dict()
+    assert len(loaded) == 50
+    assert decoded_count(loaded) == 1
+
+    # 按状态筛选先看 flags 列，只解码匹配的记录
+    assert [item.id for item in loaded.get_items_with_backups()] == ["f3"]
+    assert [item.id for item in loaded.get_items_by_status(FileStatus.ERROR)] == ["f5"]
+    assert decoded_count(loaded) == 3
+
+
+def test_resave_copies_undecoded_records(tmp_path, snapshot_file):
+    queue = make_queue(30)
+    queue.save_to_file(snapshot_file)
+    loaded = FileQueue()
+    loaded.load_from_file(snapshot_file)
+    loaded.get_item("f7").update_status(FileStatus.PROCESSING, "处理中")
+    loaded.remove_item("f8")
+
+    copy_file = tmp_path / "copy.bakq"
+    assert loaded.save_to_file(copy_file)
+
+    reloaded = FileQueue()
+    assert reloaded.load_from_file(copy_file)
+    assert reloaded.get_stats() == loaded.get_stats()
+    assert dump(reloaded) == dump(loaded)
+    assert reloaded.get_item("f7").message == "处理中"
+    assert "f8" not in reloaded
+
+
+def test_journal_with_binary_snapshot(snapshot_file):
+    queue = make_queue(20, journal=True)
+    queue.save_to_file(snapshot_file)
+    queue.get_item("f1").update_status(FileStatus.CANCELLED, "已取消")
+    queue.save_to_file(snapshot_file)
+
+    loaded = FileQueue(journal=True)
+    assert loaded.load_from_file(snapshot_file)
+    assert loaded.get_stats() == queue.get_stats()
+    assert dump(loaded) == dump(queue)
+
+
+@pytest.mark.parametrize("keep", [0, 3, 10, 40, -1, -8, -3])
+def test_truncated_snapshot_is_rejected(snapshot_file, keep):
+    make_queue(20).save_to_file(snapshot_file)
+    data = snapshot_file.read_bytes()
+    snapshot_file.write_bytes(data[:keep] if keep >= 0 else data[:len(data) + keep])
+
+    queue = FileQueue()
+    assert not queue.load_from_file(snapshot_file)
+    assert len(queue) == 0
+
+
+def test_corrupt_snapshot_is_rejected(snapshot_file):
+    snapshot_file.write_bytes(MAGIC + b"\x07" + b"\xff" * 64)
+
+    assert not FileQueue().load_from_file(snapshot_file)
+    with pytest.raises(ValueError):
+        open_snapshot(snapshot_file)
+
+
+def test_id_with_nul_is_rejected(tmp_path, snapshot_file):
+    queue = make_queue(10)
+    assert queue.save_to_file(snapshot_file)
+    before = snapshot_file.read_bytes()
+
+    with pytest.raises(ValueError):
+        write_snapshot(snapshot_file, {}, [("a", 0, b"{}"), ("b\0c", 0, b"{}")])
+
+    queue.add_item(FileQueueItem(id="bad\0id", name="x", path="/data/x", size=0,
+                                 status=FileStatus.PENDING))
+    assert not queue.save_to_file(snapshot_file)
+    # 原快照不变，也没有残留的临时文件
+    assert snapshot_file.read_bytes() == before
+    assert [p.name for p in tmp_path.iterdir()] == [snapshot_file.name]
@@ -0,0 +1,163 @@
+"""
+恢复预写日志的崩溃恢复测试
+在计划写入后、.new 硬链接创建后、目标替换后三个位置模拟进程崩溃，
+检查 JournalRecovery 继续完成（roll forward）和撤销（roll back）后的文件状态
+"""
+import os
+
+import pytest
+
+from baku.core.restore_journal import JournalRecovery, RestoreJournal, list_journals, load_journal
+
+ORIGINAL = b"original content\n" * 64
+BACKUP = b"backup content\n" * 64
+
+STAGES = ("planned", "new_linked", "replaced")
+
+
+def crash(journal: RestoreJournal):
+    """模拟进程崩溃：不写 end 记录、不删除日志，直接关闭文件"""
+    journal._file.close()
+
+
+def start_batch(tmp_path, restorer, make_pair, stage: str, count: int = 3):
+    """写入计划后执行到 stage 为止，返回 (日志目录, 文件对列表, .new 路径列表)"""
+    journal_dir = tmp_path / "journal"
+    pairs = [make_pair(f"file{i}.txt", ORIGINAL + bytes([i]), BACKUP + bytes([i]))
+             for i in range(count)]
+    new_files = [restorer.planned_new_file(target) for target, _ in pairs]
+    journal = RestoreJournal.create(journal_dir, group_size=64, window=60)
+    journal.plan((seq, target, backup, True, new_file, None)
+                 for seq, ((target, backup), new_file) in enumerate(zip(pairs, new_files)))
+    for (target, backup), new_file in zip(pairs, new_files):
+        if stage == "new_linked":
+            os.link(target, new_file)
+        elif stage == "replaced":
+            result = restorer.restore_backup(target, backup, new_file=new_file)
+            assert result["success"]
+    crash(journal)
+    return journal_dir, pairs, new_files
+
+
+def assert_restored(pairs, new_files):
+    for i, ((target, backup), new_file) in enumerate(zip(pairs, new_files)):
+        assert target.read_bytes() == BACKUP + bytes([i])
+        assert new_file.read_bytes() == ORIGINAL + bytes([i])
+        assert not backup.exists()
+
+
+def assert_rolled_back(pairs, new_files):
+    for i, ((target, backup), new_file) in enumerate(zip(pairs, new_files)):
+        assert target.read_bytes() == ORIGINAL + bytes([i])
+        assert backup.read_bytes() == BACKUP + bytes([i])
+        assert not os.path.lexists(new_file)
+
+
+def assert_no_temp_files(tmp_path):
+    assert not [p.name for p in tmp_path.iterdir() if ".baku-tmp-" in p.name]
+
+
+def test_plan_is_durable_before_crash(tmp_path, restorer, make_pair):
+    journal_dir, pairs, _ = start_batch(tmp_path, restorer, make_pair, "planned")
+    journals = list_journals(journal_dir)
+    assert len(journals) == 1
+    plans, outcomes = load_journal(journals[0])
+    assert [plan["target"] for plan in plans] == [str(target) for target, _ in pairs]
+    assert outcomes == {}
+
+
+@pytest.mark.parametrize("stage", STAGES)
+def test_roll_forward(tmp_path, restorer, make_pair, stage):
+    journal_dir, pairs, new_files = start_batch(tmp_path, restorer, make_pair, stage)
+    (tmp_path / f".{pairs[0][0].name}.baku-tmp-crashed").write_bytes(b"partial")
+
+    stats = JournalRecovery(restorer).recover(list_journals(journal_dir)[0])
+
+    assert stats["errors"] == 0
+    assert stats["completed"] == len(pairs)
+    assert_restored(pairs, new_files)
+    assert_no_temp_files(tmp_path)
+    assert list_journals(journal_dir) == []
+
+
+@pytest.mark.parametrize("stage", STAGES)
+def test_roll_back(tmp_path, restorer, make_pair, stage):
+    journal_dir, pairs, new_files = start_batch(tmp_path, restorer, make_pair, stage)
+    (tmp_path / f".{pairs[0][0].name}.baku-tmp-crashed").write_bytes(b"partial")
+
+    stats = JournalRecovery(restorer).recover(list_journals(journal_dir)[0], rollback=True)
+
+    assert stats["errors"] == 0
+    assert stats["reverted"] == len(pairs)
+    assert_rolled_back(pairs, new_files)
+    assert_no_temp_files(tmp_path)
+    assert list_journals(journal_dir) == []
+
+
+def test_recorded_outcomes_are_skipped(tmp_path, restorer, make_pair):
+    """已记录完成或失败的操作在恢复时不再处理"""
+    journal_dir = tmp_path / "journal"
+    (done_target, done_backup) = make_pair("done.txt", ORIGINAL, BACKUP)
+    (failed_target, failed_backup) = make_pair("failed.txt", ORIGINAL, BACKUP)
+    done_new = restorer.planned_new_file(done_target)
+    journal = RestoreJournal.create(journal_dir, group_size=1)
+    journal.plan([(0, done_target, done_backup, True, done_new, None),
+                  (1, failed_target, failed_backup, True, restorer.planned_new_file(failed_target),
+                   None)])
+    journal.record_done(0, restorer.restore_backup(done_target, done_backup,
+                                                   new_file=done_new)["details"])
+    journal.record_failed(1, "模拟失败")
+    crash(journal)
+
+    stats = JournalRecovery(restorer).recover(list_journals(journal_dir)[0])
+
+    assert stats["skipped"] == 2
+    assert done_target.read_bytes() == BACKUP
+    assert failed_target.read_bytes() == ORIGINAL
+    assert failed_backup.read_bytes() == BACKUP
+
+
+def start_shared_batch(tmp_path, restorer, count: int = 3):
+    """多个目标共用一个备份（计划中 trash=False、带分组），写入计划后崩溃"""
+    journal_dir = tmp_path / "journal"
+    backup = tmp_path / "shared.bak"
+    backup.write_bytes(BACKUP)
+    targets = []
+    for i in range(count):
+        target = tmp_path / f"file{i}.txt"
+        target.write_bytes(ORIGINAL + bytes([i]))
+        targets.append(target)
+    journal = RestoreJournal.create(journal_dir, group_size=64, window=60)
+    journal.plan((seq, target, backup, False, restorer.planned_new_file(target), "shared")
+                 for seq, target in enumerate(targets))
+    return journal, journal_dir, backup, targets
+
+
+def test_roll_forward_trashes_shared_backup(tmp_path, restorer, trash_queue):
+    journal, journal_dir, backup, targets = start_shared_batch(tmp_path, restorer)
+    journal.record_done(0, restorer.restore_backup(
+        targets[0], backup, trash_backup=False,
+        new_file=restorer.planned_new_file(targets[0]))["details"])
+    crash(journal)
+
+    stats = JournalRecovery(restorer).recover(list_journals(journal_dir)[0])
+
+    assert stats["errors"] == 0
+    assert stats["skipped"] == 1
+    assert stats["completed"] == 2
+    assert all(target.read_bytes() == BACKUP for target in targets)
+    assert trash_queue.trashed == [backup]
+    assert not backup.exists()
+
+
+def test_roll_forward_keeps_shared_backup_when_one_failed(tmp_path, restorer, trash_queue):
+    journal, journal_dir, backup, targets = start_shared_batch(tmp_path, restorer)
+    journal.record_failed(1, "模拟失败")
+    crash(journal)
+
+    stats = JournalRecovery(restorer).recover(list_journals(journal_dir)[0])
+
+    assert stats["errors"] == 0
+    assert targets[1].read_bytes() == ORIGINAL + bytes([1])
+    assert backup.read_bytes() == BACKUP
+    assert trash_queue.trashed == []
@@ -0,0 +1,102 @@
+"""
+批量恢复预览（preview_many）和计划冲突检测测试
+"""
+
+from baku.core.backup_restorer import BackupRestorer
+from baku.core.restore_plan import (
+    BACKUP_IS_TARGET, DUPLICATE_TARGET, NEW_FILE_COLLISION, SHARED_BACKUP,
+)
+
+
+def kinds(plan):
+    return sorted((conflict.kind, tuple(conflict.indexes)) for conflict in plan.conflicts)
+
+
+def test_preview_entries(tmp_path, restorer, make_pair):
+    rename_target, rename_backup = make_pair("a.txt", b"old", b"backup a")
+    copy_target, copy_backup = make_pair("b.txt", b"old", b"backup bb")
+    missing = tmp_path / "c.txt"
+    (tmp_path / "new.txt.bak").write_bytes(b"created")
+
+    plan = restorer.preview_many([
+        (rename_target, rename_backup),
+        (copy_target, copy_backup, False),
+        (missing, tmp_path / "c.txt.bak"),
+        (tmp_path / "new.txt", tmp_path / "new.txt.bak"),
+    ])
+
+    rename, copy, no_backup, created = plan.entries
+    assert (rename.method, rename.new_file) == ("rename", tmp_path / "a.txt.new")
+    assert (copy.method, copy.backup_size, copy.target_size) == ("copy", 9, 3)
+    assert no_backup.method is None
+    assert not no_backup.can_restore
+    assert not created.target_exists
+    assert created.new_file is None
+    assert plan.conflicts == []
+    assert plan.missing_backups == [no_backup]
+    assert not plan.ok
+    assert plan.total_bytes == len(b"backup a") + len(b"backup bb") + len(b"created")
+
+
+def test_existing_new_file_gets_timestamp(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", b"old", b"backup")
+    (tmp_path / "a.txt.new").write_bytes(b"earlier restore")
+
+    entry = restorer.preview_many([(target, backup)]).entries[0]
+
+    assert entry.new_file.name.startswith("a.txt.new.")
+
+
+def test_duplicate_target(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", b"old", b"backup")
+    other = tmp_path / "a.txt.orig"
+    other.write_bytes(b"other backup")
+
+    plan = restorer.preview_many([(target, backup), (target, other)])
+
+    assert kinds(plan) == [(DUPLICATE_TARGET, (0, 1))]
+    assert all(DUPLICATE_TARGET in entry.conflicts for entry in plan.entries)
+    assert not any(entry.can_restore for entry in plan.entries)
+
+
+def test_backup_is_target(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", b"old", b"backup")
+    chained, chained_backup = make_pair("a.txt.bak", None, b"older backup")
+
+    plan = restorer.preview_many([(target, backup), (chained, chained_backup)])
+
+    assert kinds(plan) == [(BACKUP_IS_TARGET, (1, 0))]
+
+
+def test_shared_backup(tmp_path, restorer):
+    backup = tmp_path / "shared.bak"
+    backup.write_bytes(b"shared")
+    targets = [tmp_path / f"f{i}.txt" for i in range(3)]
+    for target in targets:
+        target.write_bytes(b"old")
+
+    plan = restorer.preview_many([(target, backup) for target in targets])
+
+    assert kinds(plan) == [(SHARED_BACKUP, (0, 1, 2))]
+    assert plan.conflicts[0].path == backup
+
+
+def test_new_file_collision(tmp_path, restorer, make_pair):
+    target, backup = make_pair("a.txt", b"old", b"backup")
+    other_backup = tmp_path / "other.bak"
+    other_backup.write_bytes(b"other")
+
+    plan = restorer.preview_many([(target, backup), (tmp_path / "a.txt.new", other_backup)])
+
+    assert kinds(plan) == [(NEW_FILE_COLLISION, (0, 1))]
+    assert plan.conflicts[0].path == tmp_path / "a.txt.new"
+
+
+def test_parallel_stat_matches_serial(tmp_path, restorer, make_pair, monkeypatch):
+    items = [make_pair(f"f{i}.txt", b"old" if i % 2 else None, b"backup") for i in range(20)]
+    serial = restorer.preview_many(items).to_dict()
+
+    monkeypatch.setattr(BackupRestorer, "PREVIEW_PARALLEL_THRESHOLD", 1)
+    parallel = restorer.preview_many(items, max_workers=4).to_dict()
+
+    assert parallel == serial
@@ -0,0 +1,85 @@
+"""
+.new 去重存储测试
+"""
+import errno
+import os
+
+import pytest
+
+from baku.core.backup_restorer import BackupRestorer
+from baku.core.safety_store import SafetyStore
+
+ORIGINAL = b"shared original content\n" * 64
+
+
+@pytest.fixture
+def store(tmp_path) -> SafetyStore:
+    return SafetyStore(tmp_path / "store")
+
+
+@pytest.fixture
+def store_restorer(store, trash_queue) -> BackupRestorer:
+    return BackupRestorer(trash_queue=trash_queue, mode="full", safety_store=store)
+
+
+def test_identical_originals_share_one_object(tmp_path, store, store_restorer, make_pair):
+    pairs = [make_pair(f"file{i}.txt", ORIGINAL, f"backup {i}".encode()) for i in range(3)]
+
+    results = [store_restorer.restore_backup(target, backup) for target, backup in pairs]
+
+    obj = store.object_path(store.digest(tmp_path / "file0.txt.new"))
+    for i, (result, (target, backup)) in enumerate(zip(results, pairs)):
+        assert result["success"]
+        assert result["details"]["new_file_method"] == "dedup-link"
+        new_file = tmp_path / f"file{i}.txt.new"
+        assert new_file.read_bytes() == ORIGINAL
+        assert os.path.samefile(new_file, obj)
+        assert target.read_bytes() == f"backup {i}".encode()
+        assert not backup.exists()
+    assert store.get_stats() == {'objects': 1, 'bytes': len(ORIGINAL), 'links': 3}
+
+
+def test_gc_removes_unreferenced_objects(tmp_path, store, store_restorer, make_pair):
+    kept_target, kept_backup = make_pair("kept.txt", b"kept original", b"kept backup")
+    gone_target, gone_backup = make_pair("gone.txt", b"gone original", b"gone backup")
+    store_restorer.restore_backup(kept_target, kept_backup)
+    store_restorer.restore_backup(gone_target, gone_backup)
+    (tmp_path / "gone.txt.new").unlink()
+
+    assert store.gc(dry_run=True)['removed'] == 1
+    assert store.get_stats()['objects'] == 2
+
+    stats = store.gc()
+
+    assert stats == {'objects': 2, 'removed': 1, 'kept': 1, 'freed_bytes': len(b"gone original")}
+    assert store.get_stats()['objects'] == 1
+    assert (tmp_path / "kept.txt.new").read_bytes() == b"kept original"
+
+
+def test_failed_restore_releases_object(tmp_path, store, store_restorer, make_pair, monkeypatch):
+    """恢复失败时目标保持原样，存储中不再保留与目标共用 inode 的对象"""
+    target, backup = make_pair("a.txt", ORIGINAL, b"backup")
+
+    def fail(*args, **kwargs):
+        raise OSError(errno.ENOSPC, os.strerror(errno.ENOSPC))
+
+    monkeypatch.setattr(store_restorer.copy_engine, "copy", fail)
+    result = store_restorer.restore_backup(target, backup, trash_backup=False)
+
+    assert not result["success"]
+    assert target.read_bytes() == ORIGINAL
+    obj = store.object_path(store.digest(target))
+    assert not (obj.exists() and os.path.samefile(obj, target))
+
+
+def test_modified_object_is_recreated(tmp_path, store, store_restorer, make_pair):
+    target, backup = make_pair("a.txt", ORIGINAL, b"backup")
+    obj = store.object_path(store.digest(target))
+    obj.parent.mkdir(parents=True)
+    obj.write_bytes(b"truncated")
+
+    result = store_restorer.restore_backup(target, backup)
+
+    assert result["success"]
+    assert (tmp_path / "a.txt.new").read_bytes() == ORIGINAL
+    assert obj.read_bytes() == ORIGINAL
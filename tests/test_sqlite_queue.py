@@ -0,0 +1,187 @@
+"""
+SQLite 文件队列测试
+"""
+import gc
+import time
+from pathlib import Path
+
+import pytest
+
+from baku.core.file_queue import BackupInfo, FileQueue, FileQueueItem, FileStatus
+from baku.core.multi_file_manager import MultiFileManager
+from baku.core.sqlite_queue import SQLiteFileQueue
+
+
+def make_item(i: int, status: FileStatus = FileStatus.PENDING) -> FileQueueItem:
+    return FileQueueItem(id=f"f{i}", name=f"f{i}.txt", path=f"/data/f{i}.txt", size=i,
+                         status=status, added_time=1.7e9 + i, last_modified=1.7e9 + i)
+
+
+def apply_operations(queue: FileQueue):
+    """在 FileQueue 与 SQLiteFileQueue 上执行相同的一组操作"""
+    for i in range(10):
+        assert queue.add_item(make_item(i))
+    assert not queue.add_item(make_item(3))
+    item = queue.get_item("f1")
+    item.add_backup(BackupInfo(path="/data/f1.txt.bak", name="f1.txt.bak", size=3,
+                               modified=1.7e9, similarity=1.0, file_type=".bak"))
+    item.set_selected_backup(Path("/data/f1.txt.bak"))
+    item.update_status(FileStatus.COMPLETED, "找到 1 个备份文件")
+    queue.get_item("f2").status = FileStatus.ERROR
+    queue.remove_item("f4")
+    queue.add_item(make_item(4, FileStatus.CANCELLED))
+
+
+def dump(queue: FileQueue):
+    """文件项内容（last_modified 为修改时的当前时间，不参与比较）"""
+    return [dict(item.to_dict(), last_modified=None) for item in queue]
+
+
+@pytest.fixture
+def db_path(tmp_path) -> Path:
+    return tmp_path / "queue.db"
+
+
+@pytest.fixture
+def queue(db_path):
+    queue = SQLiteFileQueue(db_path)
+    yield queue
+    queue.close()
+
+
+def test_same_results_as_file_queue(queue):
+    memory = FileQueue(journal=False)
+    apply_operations(memory)
+    apply_operations(queue)
+
+    assert dump(queue) == dump(memory)
+    assert len(queue) == len(memory) == 10
+    assert queue.get_stats() == memory.get_stats()
+    assert queue.get_total_size() == memory.get_total_size()
+    for status in FileStatus:
+        assert ([item.id for item in queue.get_items_by_status(status)]
+                == [item.id for item in memory.get_items_by_status(status)])
+    assert [item.id for item in queue.get_restorable_items()] == ["f1"]
+    assert [item.id for item in queue.get_items_with_backups()] == ["f1"]
+    assert "f4" in queue and "missing" not in queue
+
+
+def test_duplicate_add_is_ignored(queue):
+    assert queue.add_item(make_item(1))
+    duplicate = make_item(1, FileStatus.ERROR)
+
+    assert not queue.add_item(duplicate)
+
+    assert len(queue) == 1
+    assert queue.get_item("f1").status == FileStatus.PENDING
+    assert duplicate._queue is None
+
+
+def test_cached_item_is_shared_and_released(queue):
+    queue.add_item(make_item(1))
+    first = queue.get_item("f1")
+    assert queue.get_item("f1") is first
+
+    # 缓存只持有弱引用，调用方不再使用后释放
+    del first
+    gc.collect()
+
+    assert "f1" not in queue._live
+    assert queue.get_item("f1").id == "f1"
+
+
+def test_round_trip_through_reopen(db_path):
+    queue = SQLiteFileQueue(db_path)
+    apply_operations(queue)
+    expected = dump(queue)
+    queue.close()
+
+    reopened = SQLiteFileQueue(db_path)
+    try:
+        assert dump(reopened) == expected
+        assert reopened.get_item("f1").selected_backup == Path("/data/f1.txt.bak")
+    finally:
+        reopened.close()
+
+
+def test_changes_are_flushed_by_timer(queue, db_path):
+    queue.FLUSH_INTERVAL = 0.1
+    queue.add_item(make_item(1))
+    queue.get_item("f1").update_status(FileStatus.ERROR, "出错")
+    other = SQLiteFileQueue(db_path)
+    try:
+        # 修改尚未写回时其他连接仍看到旧内容
+        assert other.get_item("f1").status == FileStatus.PENDING
+        deadline = time.monotonic() + 5
+        while queue._pending and time.monotonic() < deadline:
+            time.sleep(0.05)
+        assert not queue._pending
+
+        item = other.get_item("f1")
+        assert item.status == FileStatus.ERROR
+        assert item.message == "出错"
+    finally:
+        other.close()
+
+
+def test_cached_items_see_other_connection(queue, db_path):
+    queue.add_item(make_item(1))
+    queue.add_item(make_item(2))
+    clean = queue.get_item("f1")
+    dirty = queue.get_item("f2")
+    queue.FLUSH_INTERVAL = 60
+    dirty.message = "本进程的修改"
+
+    other = SQLiteFileQueue(db_path)
+    try:
+        other.get_item("f1").update_status(FileStatus.COMPLETED, "其他进程")
+        other.get_item("f2").update_status(FileStatus.ERROR, "其他进程")
+        other.flush()
+    finally:
+        other.close()
+
+    # 未修改的缓存项在下一次查询时同步；有待写回修改的项保持本进程的内容
+    assert queue.get_item("f1") is clean
+    assert clean.status == FileStatus.COMPLETED and clean.message == "其他进程"
+    assert queue.get_item("f2") is dirty
+    assert dirty.message == "本进程的修改"
+
+
+def test_pages_follow_insertion_order(queue):
+    for i in range(25):
+        queue.add_item(make_item(i))
+    queue.get_item("f3").status = FileStatus.ERROR
+
+    pages = list(queue.iter_item_pages(page_size=10))
+    assert [len(page) for page in pages] == [10, 10, 5]
+    assert [item.id for page in pages for item in page] == [f"f{i}" for i in range(25)]
+
+    pending = [item.id for page in queue.iter_item_pages(FileStatus.PENDING, page_size=7)
+               for item in page]
+    assert pending == [f"f{i}" for i in range(25) if i != 3]
+
+    # 遍历期间修改状态不影响后续分页
+    seen = []
+    for page in queue.iter_item_pages(FileStatus.PENDING, page_size=4):
+        for item in page:
+            seen.append(item.id)
+            item.status = FileStatus.COMPLETED
+    assert seen == pending
+    assert queue.get_stats()["completed"] == 24
+
+
+def test_batch_scan_pages_through_queue(tmp_path, queue, restorer):
+    queue.PAGE_SIZE = 4
+    for i in range(10):
+        target = tmp_path / f"f{i}.txt"
+        target.write_text("current")
+        (tmp_path / f"f{i}.txt.bak").write_text("backup")
+        queue.add_item(FileQueueItem(id=f"f{i}", name=target.name, path=target, size=7,
+                                     status=FileStatus.PENDING))
+    manager = MultiFileManager(backup_restorer=restorer, max_workers=1, file_queue=queue)
+
+    assert manager.batch_scan_backups()
+
+    assert queue.get_stats()["completed"] == 10
+    for i in range(10):
+        assert queue.get_item(f"f{i}").selected_backup == tmp_path / f"f{i}.txt.bak"
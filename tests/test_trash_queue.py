@@ -0,0 +1,100 @@
+"""
+TrashQueue 后台批量回收站队列测试
+替换 send2trash，不会往系统回收站里放东西
+"""
+import threading
+
+import pytest
+
+from baku.core import trash_queue
+from baku.core.trash_queue import TrashQueue
+
+
+class FakeSend2Trash:
+    """记录每次调用；包含 bad 中路径的调用整体失败"""
+
+    def __init__(self, bad=()):
+        self.bad = set(bad)
+        self.calls = []
+        self.entered = threading.Event()
+        self.release = threading.Event()
+        self.release.set()
+
+    def __call__(self, paths):
+        self.entered.set()
+        self.release.wait()
+        batch = [paths] if isinstance(paths, str) else list(paths)
+        self.calls.append(batch)
+        if self.bad.intersection(batch):
+            raise OSError("模拟失败")
+
+
+@pytest.fixture
+def fake(monkeypatch):
+    fake = FakeSend2Trash()
+    monkeypatch.setattr(trash_queue, "send2trash", fake)
+    return fake
+
+
+@pytest.fixture
+def queue():
+    queue = TrashQueue(batch_size=4)
+    yield queue
+    queue.close()
+
+
+def hold(fake, queue):
+    """让后台线程阻塞在第一个路径上，之后入队的路径在队列中积累"""
+    fake.release.clear()
+    queue.put("/backups/first.bak")
+    assert fake.entered.wait(5)
+
+
+def test_paths_are_trashed_in_batches(fake, queue):
+    hold(fake, queue)
+    paths = [f"/backups/f{i}.bak" for i in range(10)]
+    for path in paths:
+        queue.put(path)
+    assert queue.pending_count() == 11
+    fake.release.set()
+
+    assert queue.flush(timeout=5)
+
+    assert queue.pending_count() == 0
+    assert queue.trashed == 11
+    assert fake.calls == [["/backups/first.bak"], paths[:4], paths[4:8], paths[8:]]
+
+
+def test_failed_batch_is_retried_per_item(fake, queue):
+    hold(fake, queue)
+    paths = [f"/backups/f{i}.bak" for i in range(4)]
+    fake.bad = {paths[2]}
+    for path in paths:
+        queue.put(path)
+    fake.release.set()
+
+    assert queue.flush(timeout=5)
+
+    assert fake.calls[1] == paths
+    assert fake.calls[2:] == [[path] for path in paths]
+    assert queue.trashed == 4
+    assert queue.failed == [paths[2]]
+
+
+def test_flush_times_out_while_busy(fake, queue):
+    hold(fake, queue)
+
+    assert not queue.flush(timeout=0.05)
+
+    fake.release.set()
+    assert queue.flush(timeout=5)
+    assert queue.trashed == 1
+
+
+def test_put_after_close_is_synchronous(fake, queue):
+    queue.close()
+
+    queue.put("/backups/late.bak")
+
+    assert fake.calls == [["/backups/late.bak"]]
+    assert queue.trashed == 1